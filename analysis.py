@@ -1,36 +1,33 @@
 
-import pandas as pd
+import numpy as np
 import os
+import argparse
+
+from table_io import write_table, add_format_arguments
+from transaction_aggregation import (aggregate_transactions, aggregate_transaction_chunks, encode_patients, to_day,
+                                     SortedRuns)
+from labeling import (read_appointments, read_transactions, label_appointments, transaction_id_hashes,
+                      APPOINTMENT_FILE, TRANSACTION_FILE, AGGREGATES_FILE, TRANSACTION_IDS_FILE)
+from profiling import Profiler, add_profile_arguments
+
+parser = argparse.ArgumentParser(description="Merge appointments with transactions and create the NO_SHOW label.")
+parser.add_argument('--chunksize', type=int, default=None,
+                    help="Stream Transaction_clean.csv in chunks of this many rows instead of loading it whole. "
+                         "Memory then grows with the number of patient-days and distinct transactions "
+                         "(a few bytes each), not with the file size.")
+add_format_arguments(parser)
+add_profile_arguments(parser)
+args = parser.parse_args()
+profiler = Profiler.from_args(args, 'analysis.py', 'analysis_results.profile.json')
 
 # Step 1 — Memory-saving preliminaries
 print("Step 1: Reading data with memory optimization...")
-
-appt_cols = [
- 'APPOINTMENT_ODU_ID','PATIENT_ODU_ID','APPOINTMENT_DATE','APPOINTMENT_DATETIME',
- 'DURATION','PIMS_SOURCE','PIMS_SCHEDULE_TYPE','PIMS_STATUS','NOTES',
- 'APPOINTMENT_TYPE','IS_CANCELED_APPOINTMENT','ODU_IS_DELETED',
- 'CREATED_DATE', 'RESOURCE_ODU_ID', 'PRACTICE_ODU_ID', 'PRACTICE_NAME'
-]
-txn_cols = [
- 'TRANSACTION_ODU_ID','PATIENT_ODU_ID','REPORTING_DATE','REPORTING_DATETIME',
- 'REPORTING_AMOUNT','QUANTITY','IS_INCLINIC','IS_REVENUE','PIMS_TRANSACTION_TYPE',
- 'IS_ONLINE','IS_PAYMENT','TOP_REVENUE_CATEGORY_NAME'
-]
-
-dtype_appt = {'APPOINTMENT_ODU_ID': 'string', 'PATIENT_ODU_ID': 'string',
-             'PIMS_SOURCE':'category','PIMS_SCHEDULE_TYPE':'category',
-             'PIMS_STATUS':'category','APPOINTMENT_TYPE':'category',
-             'ODU_IS_DELETED': 'boolean'} # Explicitly set ODU_IS_DELETED to boolean
-dtype_txn = {'TRANSACTION_ODU_ID':'string','PATIENT_ODU_ID':'string',
-            'IS_INCLINIC':'boolean','IS_REVENUE':'boolean',
-            'IS_ONLINE':'boolean','IS_PAYMENT':'boolean',
-            'TOP_REVENUE_CATEGORY_NAME':'category'}
+profiler.start('load')
 
 try:
-    appts = pd.read_csv('Apointment_clean.csv', usecols=appt_cols, dtype=dtype_appt,
-                        parse_dates=['APPOINTMENT_DATE','APPOINTMENT_DATETIME'])
-    txns = pd.read_csv('Transaction_clean.csv', usecols=txn_cols, dtype=dtype_txn,
-                       parse_dates=['REPORTING_DATE','REPORTING_DATETIME'])
+    appts = read_appointments(APPOINTMENT_FILE)
+    # With --chunksize this is a lazy reader; the chunks are aggregated in Step 2
+    txns = read_transactions(TRANSACTION_FILE, chunksize=args.chunksize)
     print("CSVs loaded successfully.")
 except FileNotFoundError as e:
     print(f"Error loading CSVs: {e}")
@@ -43,55 +40,57 @@ initial_rows = len(appts)
 appts.dropna(subset=['PATIENT_ODU_ID'], inplace=True)
 final_rows = len(appts)
 print(f"{initial_rows - final_rows} rows with missing PATIENT_ODU_ID were removed.")
+profiler.stop(appts=appts, txns=txns)
 
 
 # Step 2 — Aggregate transactions
 print("\nStep 2: Aggregating transactions...")
-
-appts['APPT_DATE'] = pd.to_datetime(appts['APPOINTMENT_DATE']).dt.date
-txns['TXN_DATE'] = pd.to_datetime(txns['REPORTING_DATE']).dt.date
-
-agg_txn = (
-    txns
-    .groupby(['PATIENT_ODU_ID','TXN_DATE'], as_index=False)
-    .agg(
-        total_amount=('REPORTING_AMOUNT', 'sum'),
-        total_qty=('QUANTITY','sum'),
-        any_inclinic=('IS_INCLINIC','max'),
-        any_revenue=('IS_REVENUE','max'),
-        txn_count=('TRANSACTION_ODU_ID','nunique')
-    )
-)
-agg_txn['any_inclinic'] = agg_txn['any_inclinic'].astype(bool)
-agg_txn['any_revenue'] = agg_txn['any_revenue'].astype(bool)
+profiler.start('aggregate')
+
+if args.chunksize:
+    print(f"Streaming transactions in chunks of {args.chunksize} rows...")
+    # Only the distinct id hashes are kept, deduplicated as the chunks stream
+    seen_ids = SortedRuns(np.uint64)
+
+    def remember_ids(chunks):
+        for chunk in chunks:
+            hashes = transaction_id_hashes(chunk['TRANSACTION_ODU_ID'])
+            seen_ids.add(hashes[seen_ids.lookup(hashes) < 0])
+            yield chunk
+
+    agg_txn = aggregate_transaction_chunks(remember_ids(txns))
+    txn_ids = seen_ids.keys()
+    appt_codes = None
+else:
+    txns['TXN_DATE'] = to_day(txns['REPORTING_DATE'])
+    # One dictionary of patient ids for both files: the aggregation and the
+    # join below run on integer patient-day keys instead of strings and dates
+    (appt_codes, txn_codes), patients = encode_patients(appts['PATIENT_ODU_ID'], txns['PATIENT_ODU_ID'])
+    agg_txn = aggregate_transactions(txns, txn_codes, patients)
+    txn_ids = transaction_id_hashes(txns['TRANSACTION_ODU_ID'])
 print("Transactions aggregated.")
 print("Aggregated transactions head:")
 print(agg_txn.head())
+profiler.stop(agg_txn=agg_txn)
 
 # Step 3 — Create the no_show label
 print("\nStep 3: Creating the no_show label...")
+profiler.start('merge')
 
-agg_txn.rename(columns={'TXN_DATE':'APPT_DATE'}, inplace=True)
-
-merged = appts.merge(agg_txn, how='left',
-                     left_on=['PATIENT_ODU_ID','APPT_DATE'],
-                     right_on=['PATIENT_ODU_ID','APPT_DATE'])
-
-merged['any_revenue'] = merged['any_revenue'].fillna(False).astype(bool)
-merged['any_inclinic'] = merged['any_inclinic'].fillna(False).astype(bool)
-merged['total_amount'] = merged['total_amount'].fillna(0.0)
-merged['ODU_IS_DELETED'] = merged['ODU_IS_DELETED'].fillna(False).astype(bool)
-
-merged['no_show'] = ~( (merged['any_revenue']) & (merged['any_inclinic']) & (~merged['ODU_IS_DELETED']) )
+merged = label_appointments(appts, agg_txn, appt_codes)
 print("no_show label created.")
+profiler.stop(merged=merged)
 print("Resulting DataFrame head:")
 print(merged.head())
 
-# Capitalize all column names before saving
-print("\nCapitalizing all column names...")
-merged.columns = [col.upper() for col in merged.columns]
-
 # Final step: Save the result
-output_file = 'analysis_results.csv'
-merged.to_csv(output_file, index=False)
-print(f"\nAnalysis complete. Results saved to '{output_file}'")
+profiler.start('save')
+# Binary formats keep the category/boolean dtypes set above
+output_files = write_table(merged, 'analysis_results', fmt=args.format, csv_copy=args.csv)
+# Kept for incremental_update.py, which folds new transactions into them
+os.makedirs(os.path.dirname(AGGREGATES_FILE), exist_ok=True)
+write_table(agg_txn, AGGREGATES_FILE, fmt=args.format)
+np.save(TRANSACTION_IDS_FILE, txn_ids)
+profiler.stop()
+print(f"\nAnalysis complete. Results saved to {', '.join(repr(f) for f in output_files)}")
+profiler.save()
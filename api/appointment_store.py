@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from table_io import find_table, read_table
+
+
+def read_sorted(data_file, columns=None):
+    """The feature dataset sorted by APPOINTMENT_DATETIME, with an APPOINTMENT_DATE column."""
+    df = read_table(data_file, columns=columns)
+
+    df['APPOINTMENT_DATETIME'] = pd.to_datetime(df['APPOINTMENT_DATETIME'])
+    df = df.sort_values(by='APPOINTMENT_DATETIME', kind='stable').reset_index(drop=True)
+    df['APPOINTMENT_DATE'] = df['APPOINTMENT_DATETIME'].dt.date
+    return df
+
+
+class AppointmentStore:
+    """
+    In-memory copy of the feature dataset, indexed by appointment date.
+
+    The table (CSV, Feather or Parquet, whichever was written last) is read
+    once and split into one DataFrame per day, already sorted by
+    APPOINTMENT_DATETIME, so a lookup only touches that day's rows. Only
+    `columns` are loaded when given. The table is re-read automatically when
+    its file, size or modification time changes on disk.
+    """
+
+    def __init__(self, data_file, columns=None):
+        self.data_file = data_file
+        self.columns = columns
+        self._lock = threading.Lock()
+        self._days = {}
+        self._signature = None
+        self._empty = pd.DataFrame()
+        # Load statistics, reported by the API's /metrics
+        self.loads = 0
+        self.rows = 0
+        self.last_load_seconds = None
+        self.loaded_at = None
+
+        # Load eagerly when the table is already there; a missing table is
+        # only reported when a request actually needs the data.
+        try:
+            self.refresh()
+        except FileNotFoundError:
+            pass
+
+    def _file_signature(self):
+        path = find_table(self.data_file)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, signature):
+        """Returns ({date: day frame}, an empty frame with the same columns, number of rows)."""
+        df = read_sorted(self.data_file, self.columns)
+        days = {
+            day: rows.reset_index(drop=True)
+            for day, rows in df.groupby('APPOINTMENT_DATE', sort=False)
+        }
+        return days, df.iloc[0:0].copy(), len(df)
+
+    def refresh(self):
+        """Reload the dataset if the file changed since the last load. Returns True on reload."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+
+        with self._lock:
+            if signature == self._signature:
+                return False
+            start = time.perf_counter()
+            days, empty, rows = self._load(signature)
+            self._days, self._empty = days, empty
+            self._signature = signature
+            self.loads += 1
+            self.rows = rows
+            self.last_load_seconds = time.perf_counter() - start
+            self.loaded_at = time.time()
+        return True
+
+    @property
+    def signature(self):
+        return self._signature
+
+    def dates(self):
+        return sorted(self._days)
+
+    def get_day(self, selected_date: date) -> pd.DataFrame:
+        """
+        Returns the appointments for one day, sorted by time. The frame is
+        shared with the store, so callers must copy it before modifying it.
+        Raises FileNotFoundError if the data file does not exist.
+        """
+        self.refresh()
+        return self._days.get(selected_date, self._empty)
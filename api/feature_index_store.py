@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+
+from feature_index import FeatureIndex
+
+
+class FeatureIndexStore:
+    """
+    The feature index (see feature_index.py) used to hydrate prediction
+    requests from ids. It is loaded on first use and reloaded when
+    feature_engineering_eda.py or incremental_update.py rewrites the file;
+    requests keep using the previous index while the new one loads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = None
+        self._signature = None
+        # Load statistics, reported by the API's /metrics
+        self.loads = 0
+        self.patients = 0
+        self.last_load_seconds = None
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def available(self):
+        return self._index is not None or os.path.exists(self.path)
+
+    def get(self):
+        """The current index, or None if it was never built."""
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return self._index
+        # Another request loading the new version keeps this one on the old
+        if not self._lock.acquire(blocking=self._index is None):
+            return self._index
+        try:
+            if signature != self._signature:
+                start = time.perf_counter()
+                self._index = FeatureIndex.load(self.path)
+                self._signature = signature
+                self.loads += 1
+                self.patients = len(self._index)
+                self.last_load_seconds = time.perf_counter() - start
+        finally:
+            self._lock.release()
+        return self._index
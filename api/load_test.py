@@ -0,0 +1,369 @@
+"""
+Load test for the No-Show Prediction API.
+
+Starts the app under uvicorn (or targets a running server with --url) and
+sends a mix of day lookups, single predictions and batch predictions from
+`--concurrency` concurrent clients. Dates and prediction payloads are drawn
+from the feature dataset, busy days being picked more often. With
+`--id-payloads`, that share of the predictions only sends the patient,
+resource and practice ids, so the API looks the history features up in its
+feature index. Reports
+throughput, error rate, latency percentiles and a latency histogram per
+endpoint, and compares two saved reports.
+
+    python load_test.py --concurrency 16 --duration 30 --report run.json
+    python load_test.py --compare base.json run.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+PROJECT_DIR = os.path.join(SCRIPT_DIR, '..')
+DATA_FILE = os.path.join(PROJECT_DIR, 'output', 'final_features_and_eda')
+
+sys.path.insert(0, PROJECT_DIR)
+
+from table_io import read_table
+
+ENDPOINTS = ['day', 'predict', 'batch']
+DEFAULT_MIX = 'day=0.4,predict=0.5,batch=0.1'
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, math.inf]
+
+PAYLOAD_COLUMNS = {
+    'DURATION_MIN': 'duration_min',
+    'LEAD_TIME_HOURS': 'lead_time_hours',
+    'DAYS_SINCE_LAST_APPT': 'days_since_last_appt',
+    'PAST_NOSHOW_RATE': 'past_noshow_rate',
+    'RESOURCE_NOSHOW_RATE': 'resource_noshow_rate',
+    'PRACTICE_NOSHOW_RATE': 'practice_noshow_rate',
+}
+# The raw-id payload: ids instead of the history features, which the API hydrates
+ID_PAYLOAD_COLUMNS = {
+    'PATIENT_ODU_ID': 'patient_id',
+    'RESOURCE_ODU_ID': 'resource_id',
+    'PRACTICE_ODU_ID': 'practice_id',
+}
+
+
+class Workload:
+    """
+    Request generator: dates weighted by their number of appointments,
+    payloads from real rows. `id_payloads` is the share of predictions sent
+    as raw ids without history features.
+    """
+
+    def __init__(self, data_file=DATA_FILE, mix=DEFAULT_MIX, batch_size=50, seed=0, id_payloads=0.0):
+        if not 0 <= id_payloads <= 1:
+            raise ValueError("--id-payloads must be between 0 and 1.")
+        columns = ['APPOINTMENT_DATETIME', 'APPOINTMENT_TYPE'] + list(PAYLOAD_COLUMNS)
+        if id_payloads > 0:
+            columns += ['CREATED_DATE'] + list(ID_PAYLOAD_COLUMNS)
+        df = read_table(data_file, columns=columns)
+        df['APPOINTMENT_DATETIME'] = pd.to_datetime(df['APPOINTMENT_DATETIME'])
+
+        days = df['APPOINTMENT_DATETIME'].dt.strftime('%Y-%m-%d').value_counts()
+        self.dates = days.index.tolist()
+        self.date_weights = days.to_numpy().tolist()
+        self.payloads = self._payloads(df)
+        self.id_payloads = self._id_payloads(df) if id_payloads > 0 else []
+        self.id_share = id_payloads
+
+        self.mix = parse_mix(mix)
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+
+    @staticmethod
+    def _appointments(df):
+        return pd.DataFrame({
+            'appointment_date': df['APPOINTMENT_DATETIME'].dt.strftime('%Y-%m-%d'),
+            'appointment_time': df['APPOINTMENT_DATETIME'].dt.strftime('%H:%M:%S'),
+            'appointment_type': df['APPOINTMENT_TYPE'].astype(str),
+        })
+
+    @classmethod
+    def _payloads(cls, df):
+        payloads = cls._appointments(df)
+        for column, field in PAYLOAD_COLUMNS.items():
+            payloads[field] = df[column].astype(float)
+        return payloads.astype(object).where(payloads.notna(), None).to_dict('records')
+
+    @classmethod
+    def _id_payloads(cls, df):
+        payloads = cls._appointments(df)
+        for column, field in ID_PAYLOAD_COLUMNS.items():
+            payloads[field] = df[column].astype(str).where(df[column].notna())
+        created = pd.to_datetime(df['CREATED_DATE'], errors='coerce')
+        payloads['created_at'] = created.dt.strftime('%Y-%m-%dT%H:%M:%S').where(created.notna())
+        payloads['duration_min'] = df['DURATION_MIN'].astype(float)
+        return payloads.astype(object).where(payloads.notna(), None).to_dict('records')
+
+    def payload(self):
+        if self.id_payloads and self.rng.random() < self.id_share:
+            return self.rng.choice(self.id_payloads)
+        return self.rng.choice(self.payloads)
+
+    def next_request(self):
+        """Returns (endpoint, method, path, params, json body) for the next request."""
+        endpoint = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if endpoint == 'day':
+            date = self.rng.choices(self.dates, weights=self.date_weights)[0]
+            return endpoint, 'GET', '/get_appointments_by_date/', {'date': date}, None
+        if endpoint == 'predict':
+            return endpoint, 'POST', '/predict/', None, self.payload()
+        appointments = [self.payload() for _ in range(self.batch_size)]
+        return endpoint, 'POST', '/predict/batch', None, {'appointments': appointments}
+
+
+def parse_mix(mix):
+    """'day=0.4,predict=0.5,batch=0.1' -> {'day': 0.4, ...}, dropping zero weights."""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' in --mix. Choose from: {', '.join(ENDPOINTS)}")
+        if float(weight) > 0:
+            weights[name.strip()] = float(weight)
+    if not weights:
+        raise ValueError("--mix needs at least one endpoint with a positive weight.")
+    return weights
+
+
+async def run_load(base_url, workload, concurrency, duration, warmup, timeout):
+    """
+    Closed-loop load: `concurrency` clients each send their next request as
+    soon as the previous one finishes. Requests that start during the first
+    `warmup` seconds are not recorded. Returns {endpoint: [(latency_s, ok)]}
+    and the measured duration in seconds.
+    """
+    samples = {endpoint: [] for endpoint in workload.mix}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop_at = measure_from + duration
+
+        async def user():
+            while True:
+                sent = time.perf_counter()
+                if sent >= stop_at:
+                    return
+                endpoint, method, path, params, body = workload.next_request()
+                try:
+                    response = await client.request(method, path, params=params, json=body)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if sent >= measure_from:
+                    samples[endpoint].append((time.perf_counter() - sent, ok))
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - measure_from
+    return samples, elapsed
+
+
+def summarize(samples, elapsed):
+    """Throughput, error rate, latency percentiles (ms) and histogram for one set of samples."""
+    latencies = np.array([latency for latency, _ in samples]) * 1000
+    errors = sum(not ok for _, ok in samples)
+    counts, _ = np.histogram(latencies, bins=[0] + HISTOGRAM_BUCKETS_MS)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'throughput_rps': len(samples) / elapsed if elapsed > 0 else 0.0,
+        'histogram_ms': {
+            ('+Inf' if math.isinf(bound) else str(bound)): int(count)
+            for bound, count in zip(HISTOGRAM_BUCKETS_MS, counts)
+        },
+    }
+    if len(latencies):
+        summary['latency_ms'] = {
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p90': float(np.percentile(latencies, 90)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max()),
+        }
+    return summary
+
+
+def print_summary(name, summary):
+    latency = summary.get('latency_ms')
+    print(f"\n{name}: {summary['requests']} requests, {summary['throughput_rps']:.1f} req/s, "
+          f"{summary['error_rate']:.2%} errors")
+    if not latency:
+        return
+    print(f"  latency ms: mean {latency['mean']:.1f}  p50 {latency['p50']:.1f}  "
+          f"p90 {latency['p90']:.1f}  p99 {latency['p99']:.1f}  max {latency['max']:.1f}")
+    widest = max(summary['histogram_ms'].values()) or 1
+    for bound, count in summary['histogram_ms'].items():
+        if count:
+            print(f"  <= {bound:>5} ms {count:>8}  {'#' * max(1, round(40 * count / widest))}")
+
+
+def start_server(port, workers, env):
+    """Starts the API under uvicorn and waits until it answers."""
+    command = [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(workers), '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=SCRIPT_DIR, env={**os.environ, **env})
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode} during startup")
+        try:
+            if httpx.get(base_url + '/', timeout=1).status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("The API did not start within 60 seconds")
+
+
+def process_tree_memory(pid):
+    """
+    Resident memory of a process and all its descendants (e.g. uvicorn and
+    its workers), in MB. RSS counts shared pages once per process; PSS
+    splits them between the processes sharing them, so its total is the
+    real footprint. Linux only; returns None elsewhere.
+    """
+    pids = [pid]
+    try:
+        for current in pids:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pids += [int(child) for child in f.read().split()]
+        totals = {'processes': len(pids), 'rss_mb': 0.0, 'pss_mb': 0.0}
+        for current in pids:
+            with open(f'/proc/{current}/smaps_rollup') as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if name in ('Rss', 'Pss'):
+                        totals[name.lower() + '_mb'] += int(value.split()[0]) / 1024
+    except OSError:
+        return None
+    return {name: round(value, 1) for name, value in totals.items()}
+
+
+def compare_reports(base_file, new_file, threshold):
+    """
+    Prints throughput and latency changes per endpoint. Returns False if any
+    endpoint lost more than `threshold` of its throughput, got more than
+    `threshold` slower at p50 or p99, or started returning more errors.
+    """
+    with open(base_file) as f:
+        base = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+
+    ok = True
+    print(f"{'endpoint':<10} {'req/s':>24} {'p50 ms':>24} {'p99 ms':>24} {'errors':>16}")
+    base_results = {**base['endpoints'], 'overall': base['overall']}
+    for name, current in {**new['endpoints'], 'overall': new['overall']}.items():
+        previous = base_results.get(name)
+        if previous is None or 'latency_ms' not in previous or 'latency_ms' not in current:
+            continue
+        changes = {
+            'throughput': current['throughput_rps'] / previous['throughput_rps'] - 1,
+            'p50': current['latency_ms']['p50'] / previous['latency_ms']['p50'] - 1,
+            'p99': current['latency_ms']['p99'] / previous['latency_ms']['p99'] - 1,
+        }
+        regressed = (changes['throughput'] < -threshold or changes['p50'] > threshold
+                     or changes['p99'] > threshold or current['error_rate'] > previous['error_rate'])
+        ok &= not regressed
+        print(f"{name:<10} "
+              f"{previous['throughput_rps']:>8.1f} -> {current['throughput_rps']:>6.1f} ({changes['throughput']:+.0%}) "
+              f"{previous['latency_ms']['p50']:>8.1f} -> {current['latency_ms']['p50']:>6.1f} ({changes['p50']:+.0%}) "
+              f"{previous['latency_ms']['p99']:>8.1f} -> {current['latency_ms']['p99']:>6.1f} ({changes['p99']:+.0%}) "
+              f"{previous['error_rate']:>6.2%} -> {current['error_rate']:.2%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the No-Show Prediction API.")
+    parser.add_argument('--url', help="Target an already running server instead of starting one.")
+    parser.add_argument('--port', type=int, default=8765, help="Port for the server started by the load test.")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn workers for the started server.")
+    parser.add_argument('--server-env', nargs='*', default=[], metavar='KEY=VALUE',
+                        help="Extra environment variables for the started server, e.g. NOSHOW_CACHE_SIZE=0.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Number of concurrent clients.")
+    parser.add_argument('--duration', type=float, default=20, help="Measured seconds of load.")
+    parser.add_argument('--warmup', type=float, default=2, help="Seconds of load before measuring starts.")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX}).")
+    parser.add_argument('--batch-size', type=int, default=50, help="Appointments per /predict/batch request.")
+    parser.add_argument('--id-payloads', type=float, default=0.0,
+                        help="Share of predictions sent as patient/resource/practice ids without history "
+                             "features, which the API hydrates from its feature index (default: 0).")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', default=DATA_FILE, help="Feature dataset the requests are drawn from.")
+    parser.add_argument('--report', help="Write the results to this JSON file.")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Compare two reports and exit.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change counted as a regression by --compare (default: 0.1).")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare_reports(*args.compare, threshold=args.threshold) else 1)
+
+    workload = Workload(args.data, mix=args.mix, batch_size=args.batch_size, seed=args.seed,
+                        id_payloads=args.id_payloads)
+    server = None
+    base_url = args.url
+    if base_url is None:
+        env = dict(item.split('=', 1) for item in args.server_env)
+        server, base_url = start_server(args.port, args.workers, env)
+
+    try:
+        print(f"Load testing {base_url}: {args.concurrency} clients, {args.duration:g}s "
+              f"(+{args.warmup:g}s warm-up), mix {args.mix}, {args.id_payloads:.0%} id payloads")
+        samples, elapsed = asyncio.run(run_load(
+            base_url, workload, args.concurrency, args.duration, args.warmup, args.timeout))
+        server_memory = process_tree_memory(server.pid) if server is not None else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    endpoints = {name: summarize(endpoint_samples, elapsed) for name, endpoint_samples in samples.items()}
+    overall = summarize([sample for endpoint_samples in samples.values() for sample in endpoint_samples], elapsed)
+    for name, summary in endpoints.items():
+        print_summary(name, summary)
+    print_summary('overall', overall)
+    if server_memory:
+        print(f"\nServer memory ({server_memory['processes']} processes): "
+              f"RSS {server_memory['rss_mb']:,.0f} MB, PSS {server_memory['pss_mb']:,.0f} MB")
+
+    if args.report:
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'options': {key: getattr(args, key) for key in
+                        ['url', 'workers', 'server_env', 'concurrency', 'duration', 'warmup', 'mix', 'batch_size',
+                         'id_payloads', 'seed']},
+            'endpoints': endpoints,
+            'overall': overall,
+            'server_memory': server_memory,
+        }
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,397 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import List, Optional
 import joblib
-import pandas as pd
-from datetime import datetime
+from datetime import date as Date, time as Time, datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import numpy as np
+import sys
+import time
+from contextvars import ContextVar
+from zoneinfo import ZoneInfo
 
 # --- 1. SETUP & MODEL LOADING ---
 
 # Define paths relative to the current script
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
-MODEL_DIR = os.path.join(SCRIPT_DIR, '..', 'output')
-DATA_FILE = os.path.join(MODEL_DIR, 'final_features_and_eda.csv')
+PROJECT_DIR = os.path.join(SCRIPT_DIR, '..')
+MODEL_DIR = os.path.join(PROJECT_DIR, 'output')
+# CSV, Feather or Parquet, whichever feature_engineering_eda.py wrote last
+DATA_FILE = os.path.join(MODEL_DIR, 'final_features_and_eda')
+
+# Shared modules (feature encoding, ...) live in the project root
+sys.path.insert(0, PROJECT_DIR)
+
+from feature_encoder import FeatureEncoder, NUMERICAL_FEATURES, CATEGORICAL_FEATURES
+from forest_engine import FlatForest
+from model_bundle import bundle_model, list_versions, read_current, set_current
+from model_manager import ModelManager, ModelVersion
+from table_io import table_paths
+from appointment_store import AppointmentStore
+from feature_index import appointment_record
+from feature_index_store import FeatureIndexStore
+from shared_data import SharedAppointmentStore, file_lock
+from prediction_cache import PredictionCache
+from micro_batcher import MicroBatcher
+from metrics import (
+    Registry, CONTENT_TYPE, timed, start_request_timings, add_request_timing, server_timing_header,
+)
+from risk_engine import (
+    HIGH_RISK, RISK_FACTORS, risk_levels, risk_factor_flags, risk_factor_lists, top_risk_factor,
+    risk_factor_labels, contribution_risk_factors,
+)
 
 MODEL_FILE = os.path.join(MODEL_DIR, 'noshow_model_rf.joblib')
+FLAT_MODEL_FILE = os.path.join(MODEL_DIR, 'noshow_model_rf_flat.npz')
+# Versioned model bundles published by model_training_rf.py (see model_bundle.py)
+MODELS_DIR = os.path.join(MODEL_DIR, 'models')
 SCALER_FILE = os.path.join(MODEL_DIR, 'scaler.joblib')
 COLUMNS_FILE = os.path.join(MODEL_DIR, 'model_columns.joblib')
+# Latest patient/resource/practice statistics, written by feature_engineering_eda.py
+FEATURE_INDEX_FILE = os.path.join(MODEL_DIR, 'feature_index.joblib')
+# Appointment and creation times in the data are the clinic's local time, without
+# a time zone. A created_at sent with an offset is converted to this zone.
+CLINIC_TIMEZONE = ZoneInfo(os.environ.get('NOSHOW_CLINIC_TIMEZONE', 'UTC'))
+
+# Prediction cache settings
+CACHE_SIZE = int(os.environ.get('NOSHOW_CACHE_SIZE', 128))
+# Optional date range (YYYY-MM-DD) to score at startup, e.g. the coming week
+WARMUP_START = os.environ.get('NOSHOW_WARMUP_START')
+WARMUP_END = os.environ.get('NOSHOW_WARMUP_END')
+
+# Risk buckets: probability above HIGH is High Risk, from MEDIUM up to HIGH is Medium Risk
+HIGH_RISK_THRESHOLD = float(os.environ.get('NOSHOW_HIGH_RISK_THRESHOLD', 0.6))
+MEDIUM_RISK_THRESHOLD = float(os.environ.get('NOSHOW_MEDIUM_RISK_THRESHOLD', 0.3))
+
+# How the day endpoint picks each appointment's risk factors:
+# 'model' reports the features that raised the predicted probability the most,
+# 'rules' applies the fixed history / lead time / appointment type rules.
+RISK_FACTOR_MODE = os.environ.get('NOSHOW_RISK_FACTOR_MODE', 'model')
+RISK_FACTOR_TOP_K = int(os.environ.get('NOSHOW_RISK_FACTOR_TOP_K', 3))
+
+# Micro-batching of concurrent /predict/ requests
+BATCH_MAX_SIZE = int(os.environ.get('NOSHOW_BATCH_MAX_SIZE', 64))
+BATCH_MAX_WAIT_MS = float(os.environ.get('NOSHOW_BATCH_MAX_WAIT_MS', 5))
+
+# How often (seconds) the API checks output/models/CURRENT for another model version
+MODEL_POLL_SECONDS = float(os.environ.get('NOSHOW_MODEL_POLL_SECONDS', 2))
+
+# Shared-memory serving for several uvicorn workers: the model is always
+# served from a memory-mapped bundle (published by the first worker if none
+# was) and the feature dataset from a memory-mapped snapshot in
+# SNAPSHOT_DIR, so every worker attaches to one copy instead of loading its own.
+SHARED_MEMORY = os.environ.get('NOSHOW_SHARED_MEMORY', '0').lower() in ('1', 'true', 'yes')
+SNAPSHOT_DIR = os.path.join(MODEL_DIR, 'appointment_snapshot')
+
+# Add a Server-Timing header with the per-stage durations to every response.
+# Clients can also ask for it on a single request with an `X-Server-Timing: 1` header.
+SERVER_TIMING = os.environ.get('NOSHOW_SERVER_TIMING', '0').lower() in ('1', 'true', 'yes')
+
+# --- Metrics (exposed at /metrics in the Prometheus text format) ---
+metrics = Registry()
+REQUESTS = metrics.counter('noshow_http_requests', 'HTTP requests by route, method and status.',
+                           ['route', 'method', 'status'])
+REQUEST_SECONDS = metrics.histogram('noshow_http_request_duration_seconds', 'HTTP request latency by route.',
+                                    ['route'])
+STAGE_SECONDS = metrics.histogram('noshow_stage_duration_seconds',
+                                  'Time spent in each step of building a response.', ['stage'])
+BATCH_SIZE = metrics.histogram('noshow_prediction_batch_size', 'Appointments scored per model call.',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+CACHE_LOOKUPS = metrics.counter('noshow_prediction_cache_lookups', 'Day cache lookups since startup.', ['result'])
+CACHE_HIT_RATIO = metrics.gauge('noshow_prediction_cache_hit_ratio', 'Share of day lookups served from the cache.')
+CACHE_ENTRIES = metrics.gauge('noshow_prediction_cache_entries', 'Days currently cached.')
+MODEL_INFO = metrics.gauge('noshow_model_info', 'The active model (value is always 1).',
+                           ['version', 'previous_version', 'source', 'trees', 'columns', 'risk_factor_mode'])
+MODEL_LOADS = metrics.counter('noshow_model_loads', 'Model version switches by reason (load, reload, swap, rollback).',
+                              ['reason'])
+MODEL_LOAD_SECONDS = metrics.gauge('noshow_model_load_duration_seconds', 'Duration of the last model load.')
+MODEL_LOADED_AT = metrics.gauge('noshow_model_loaded_timestamp_seconds', 'Unix time of the last model load.')
+DATA_LOADS = metrics.counter('noshow_data_loads', 'Feature dataset (re)loads since startup.')
+DATA_ROWS = metrics.gauge('noshow_data_rows', 'Appointments in the loaded feature dataset.')
+DATA_DAYS = metrics.gauge('noshow_data_days', 'Distinct appointment days in the loaded feature dataset.')
+DATA_LOAD_SECONDS = metrics.gauge('noshow_data_load_duration_seconds', 'Duration of the last feature dataset load.')
+DATA_LOADED_AT = metrics.gauge('noshow_data_loaded_timestamp_seconds', 'Unix time of the last feature dataset load.')
+INDEX_LOADS = metrics.counter('noshow_feature_index_loads', 'Feature index (re)loads since startup.')
+INDEX_PATIENTS = metrics.gauge('noshow_feature_index_patients', 'Patients in the loaded feature index.')
+
+def is_current(export_file):
+    """True if an export of the model exists and is not older than the sklearn model."""
+    if not os.path.exists(export_file):
+        return False
+    return not os.path.exists(MODEL_FILE) or os.path.getmtime(export_file) >= os.path.getmtime(MODEL_FILE)
+
+def load_file_model():
+    """
+    Loads the model from the flat export or the sklearn model, for
+    deployments without published model versions.
+    """
+    start = time.perf_counter()
+    # Fall back to flattening the sklearn model on the fly if the flat
+    # export is missing or older than the model.
+    if is_current(FLAT_MODEL_FILE):
+        model_file = FLAT_MODEL_FILE
+        model = FlatForest.load(FLAT_MODEL_FILE)
+    else:
+        model_file = MODEL_FILE
+        model = FlatForest.from_sklearn(joblib.load(MODEL_FILE))
+    encoder = FeatureEncoder.from_files(COLUMNS_FILE, SCALER_FILE)
+    modified = datetime.fromtimestamp(os.path.getmtime(model_file)).strftime('%Y%m%d%H%M%S')
+    return ModelVersion(f'file-{modified}', model, encoder, source=os.path.basename(model_file),
+                        load_seconds=time.perf_counter() - start)
+
+def record_model_switch(loaded, reason):
+    """Updates the model metrics whenever another version becomes active."""
+    MODEL_LOADS.inc(reason=reason)
+    MODEL_LOADED_AT.set(loaded.loaded_at)
+    if loaded.load_seconds is not None:
+        MODEL_LOAD_SECONDS.set(loaded.load_seconds)
+    previous = models.previous.version if models.previous is not None else ''
+    MODEL_INFO.clear()
+    MODEL_INFO.set(1, version=loaded.version, previous_version=previous, source=loaded.source,
+                   trees=len(loaded.model.roots), columns=len(loaded.encoder.column_features),
+                   risk_factor_mode=RISK_FACTOR_MODE)
+    print(f"Model version {loaded.version} active ({reason}).")
+
+def prescore_days(loaded):
+    """Scores the NOSHOW_WARMUP_* days with a newly loaded version before it becomes active."""
+    prediction_cache.warm_up([(loaded.version, day) for day in warmup_days()],
+                             lambda key: build_day_payload(key[1], loaded))
+
+# The active model version. A background thread switches to the version named
+# in output/models/CURRENT, loading and warming it before the switch.
+models = ModelManager(MODELS_DIR, poll_interval=MODEL_POLL_SECONDS, on_swap=record_model_switch)
+
+def load_initial_model():
+    if SHARED_MEMORY and not models.uses_registry():
+        # Publish the saved model once so all workers map the same bundle
+        with file_lock(os.path.join(MODELS_DIR, '.lock')):
+            if not models.uses_registry():
+                bundle_model(MODEL_FILE, COLUMNS_FILE, SCALER_FILE, MODELS_DIR)
+    current = read_current(MODELS_DIR)
+    if current is not None:
+        models.activate(current['version'], reason='load')
+    else:
+        models.set_active(load_file_model(), reason='load')
+
+def reload_file_model():
+    """Reloads a file-based model when its files change; published versions are switched by `models`."""
+    if not models.uses_registry():
+        models.set_active(load_file_model(), reason='reload')
 
-# Load artifacts
-model = joblib.load(MODEL_FILE)
-scaler = joblib.load(SCALER_FILE)
-model_columns = joblib.load(COLUMNS_FILE)
+load_initial_model()
 
-# These are the original numerical features the scaler was trained on
-numerical_features = [
-    'LEAD_TIME_HOURS',
-    'DURATION_MIN',
-    'DAYS_SINCE_LAST_APPT',
-    'PAST_NOSHOW_RATE',
-    'RESOURCE_NOSHOW_RATE',
-    'PRACTICE_NOSHOW_RATE'
-]
+# Columns of the feature dataset the API uses
+DATA_COLUMNS = list(dict.fromkeys(
+    ['APPOINTMENT_ODU_ID', 'PATIENT_ODU_ID', 'APPOINTMENT_DATETIME', 'APPOINTMENT_TYPE']
+    + NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+))
 
-# --- 2. API CREATION ---
+# Feature dataset, parsed once and indexed by appointment date.
+# It reloads itself when the file on disk changes.
+if SHARED_MEMORY:
+    appointment_store = SharedAppointmentStore(DATA_FILE, SNAPSHOT_DIR, columns=DATA_COLUMNS)
+else:
+    appointment_store = AppointmentStore(DATA_FILE, columns=DATA_COLUMNS)
+
+# Scored day payloads, keyed by (model version, date). Dropped whenever the
+# feature dataset changes on disk. Without published model versions the model
+# files are watched too, and a change reloads the model.
+file_model_paths = [] if models.uses_registry() else [MODEL_FILE, FLAT_MODEL_FILE, SCALER_FILE, COLUMNS_FILE]
+prediction_cache = PredictionCache(
+    file_model_paths + table_paths(DATA_FILE),
+    max_entries=CACHE_SIZE,
+    on_invalidate=reload_file_model if file_model_paths else None,
+)
+# New versions pre-score the warm-up days into the cache before the switch
+models.on_loaded = prescore_days
+
+# Fills in the history features of /predict/ requests that send ids
+feature_index = FeatureIndexStore(FEATURE_INDEX_FILE)
+
+def collect_state_metrics():
+    """Copies the cache and dataset statistics into their gauges when /metrics is scraped."""
+    hits, misses = prediction_cache.hits, prediction_cache.misses
+    CACHE_LOOKUPS.set(hits, result='hit')
+    CACHE_LOOKUPS.set(misses, result='miss')
+    CACHE_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0)
+    CACHE_ENTRIES.set(len(prediction_cache))
+    DATA_LOADS.set(appointment_store.loads)
+    DATA_ROWS.set(appointment_store.rows)
+    DATA_DAYS.set(len(appointment_store.dates()))
+    if appointment_store.loaded_at is not None:
+        DATA_LOAD_SECONDS.set(appointment_store.last_load_seconds)
+        DATA_LOADED_AT.set(appointment_store.loaded_at)
+    INDEX_LOADS.set(feature_index.loads)
+    INDEX_PATIENTS.set(feature_index.patients)
+
+metrics.collectors.append(collect_state_metrics)
+
+# --- 2. SINGLE & BATCH PREDICTION ---
+
+class AppointmentRequest(BaseModel):
+    """
+    One appointment to score. Rates are fractions between 0 and 1.
+
+    With patient_id, resource_id and/or practice_id, the history features
+    (days since the last appointment, past/resource/practice no-show rates)
+    are looked up in the feature index, the lead time is derived from
+    created_at and a missing duration defaults to the median of the
+    appointment type. Values sent explicitly take precedence. Missing
+    history features (e.g. for a new patient) are treated as 0, as in training.
+    """
+    appointment_date: Date
+    appointment_time: Time
+    appointment_type: str
+    patient_id: Optional[str] = None
+    resource_id: Optional[str] = None
+    practice_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    duration_min: Optional[float] = None
+    lead_time_hours: Optional[float] = None
+    days_since_last_appt: Optional[float] = None
+    past_noshow_rate: Optional[float] = None
+    resource_noshow_rate: Optional[float] = None
+    practice_noshow_rate: Optional[float] = None
+
+    def uses_ids(self):
+        return any(value is not None for value in (self.patient_id, self.resource_id, self.practice_id))
+
+class BatchPredictionRequest(BaseModel):
+    appointments: List[AppointmentRequest]
+
+def request_to_features(appointment: AppointmentRequest, index=None):
+    """Derives the model's raw features from an API request, hydrated from `index` when given."""
+    appointment_datetime = datetime.combine(appointment.appointment_date, appointment.appointment_time)
+    appointment_datetime = appointment_datetime.replace(tzinfo=None)
+    created_at = appointment.created_at
+    if created_at is not None and created_at.tzinfo is not None:
+        # Appointment times are clinic-local, without a time zone
+        created_at = created_at.astimezone(CLINIC_TIMEZONE).replace(tzinfo=None)
+
+    if index is not None and appointment.uses_ids():
+        record = index.features(appointment_datetime, appointment.appointment_type, appointment.patient_id,
+                                appointment.resource_id, appointment.practice_id, created_at,
+                                appointment.duration_min)
+    else:
+        record = appointment_record(appointment_datetime, appointment.appointment_type, created_at,
+                                    appointment.duration_min)
+    explicit = {
+        'LEAD_TIME_HOURS': appointment.lead_time_hours,
+        'DAYS_SINCE_LAST_APPT': appointment.days_since_last_appt,
+        'PAST_NOSHOW_RATE': appointment.past_noshow_rate,
+        'RESOURCE_NOSHOW_RATE': appointment.resource_noshow_rate,
+        'PRACTICE_NOSHOW_RATE': appointment.practice_noshow_rate,
+    }
+    record.update({feature: value for feature, value in explicit.items() if value is not None})
+    return record
+
+def check_feature_index(appointments):
+    """Rejects requests that send ids with a 503 if the feature index was never built."""
+    if any(appointment.uses_ids() for appointment in appointments) and not feature_index.available():
+        raise HTTPException(status_code=503, detail=f"Feature index not found at {FEATURE_INDEX_FILE}. "
+                                                    "Run feature_engineering_eda.py to build it.")
+
+def predict_appointments(appointments):
+    """Scores a list of AppointmentRequest with one predict_proba call."""
+    # Pick up a retrained model before scoring, like the day endpoint does
+    prediction_cache.refresh()
+    loaded = models.active
+    use_model_version(loaded.version)
+
+    BATCH_SIZE.observe(len(appointments))
+    with timed(STAGE_SECONDS, 'hydrate'):
+        index = feature_index.get() if any(a.uses_ids() for a in appointments) else None
+        records = [request_to_features(a, index) for a in appointments]
+    with timed(STAGE_SECONDS, 'encode'):
+        X = loaded.encoder.transform_records(records)
+    with timed(STAGE_SECONDS, 'predict'):
+        probabilities = loaded.model.predict_proba(X)
+    no_show_probabilities = probabilities[:, 1]
+    predicted_classes = loaded.model.classes_[probabilities.argmax(axis=1)]
+    return [
+        {
+            "prediction": "No-Show" if predicted_class == 1 else "Show",
+            "no_show_probability": float(probability),
+            "model_version": loaded.version,
+        }
+        for predicted_class, probability in zip(predicted_classes, no_show_probabilities)
+    ]
+
+# Concurrent single predictions are scored together in one predict_proba call
+predict_batcher = MicroBatcher(
+    predict_appointments,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait=BATCH_MAX_WAIT_MS / 1000,
+)
 
-app = FastAPI()
+# --- 3. API CREATION ---
+
+def warmup_days():
+    """The days between NOSHOW_WARMUP_START and NOSHOW_WARMUP_END."""
+    if not WARMUP_START:
+        return []
+    start = datetime.strptime(WARMUP_START, "%Y-%m-%d").date()
+    end = datetime.strptime(WARMUP_END, "%Y-%m-%d").date() if WARMUP_END else start
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+def warm_up_cache():
+    """Scores every day between NOSHOW_WARMUP_START and NOSHOW_WARMUP_END."""
+    days = warmup_days()
+    if not days:
+        return
+    try:
+        prescore_days(models.active)
+    except FileNotFoundError:
+        print(f"Skipping cache warm-up: data file not found at {DATA_FILE}.")
+        return
+    print(f"Prediction cache warmed for {len(days)} day(s) from {days[0]} to {days[-1]}.")
+
+@asynccontextmanager
+async def lifespan(app):
+    warm_up_cache()
+    # Loaded now rather than by the first request that sends ids
+    feature_index.get()
+    models.start()
+    yield
+    models.stop()
+    await predict_batcher.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# The model version that served the current request, for the X-Model-Version
+# header. A dict so that handlers running in the thread pool can fill it in.
+_response_model = ContextVar('response_model', default=None)
+
+def use_model_version(version):
+    state = _response_model.get()
+    if state is not None:
+        state['version'] = version
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Counts and times every request and reports the model version that served
+    it; adds the Server-Timing header when enabled or asked for.
+    """
+    timings = start_request_timings()
+    model_state = {}
+    _response_model.set(model_state)
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # The route template, so /get_appointments_by_date/?date=... is one series
+    route = request.scope.get('route')
+    route = route.path if route is not None else 'unmatched'
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    REQUEST_SECONDS.observe(elapsed, route=route)
+    response.headers['X-Model-Version'] = model_state.get('version', models.active.version)
+
+    if SERVER_TIMING or request.headers.get('x-server-timing') == '1':
+        response.headers['Server-Timing'] = server_timing_header(timings + [('total', elapsed, None)])
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
 
 # Add CORS middleware to allow requests from our frontend
 app.add_middleware(
@@ -44,6 +400,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],   # Allows all headers
+    expose_headers=["Server-Timing", "X-Model-Version"],
 )
 
 
@@ -52,24 +409,110 @@ app.add_middleware(
 def read_root():
     return {"message": "Welcome to the No-Show Prediction API"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Request, stage, cache, model and dataset metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+def describe_version(loaded):
+    if loaded is None:
+        return None
+    return {"version": loaded.version, "source": loaded.source,
+            "loaded_at": datetime.fromtimestamp(loaded.loaded_at).isoformat(timespec='seconds')}
+
+@app.get("/model")
+def get_model():
+    """The active and previous model versions and the published ones."""
+    return {
+        "active": describe_version(models.active),
+        "previous": describe_version(models.previous),
+        "current": read_current(MODELS_DIR),
+        "versions": [{"version": m["version"], "created": m["created"], "trees": m["model"]["trees"]}
+                     for m in list_versions(MODELS_DIR)],
+    }
+
+@app.post("/model/rollback")
+def rollback_model():
+    """
+    Switches back to the previous model version, which is still in memory.
+    Other workers follow through output/models/CURRENT.
+    """
+    try:
+        loaded = models.rollback()
+    except LookupError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    use_model_version(loaded.version)
+    return {"active": describe_version(loaded), "previous": describe_version(models.previous)}
+
+@app.post("/model/activate/{version}")
+def activate_model(version: str):
+    """Makes a published model version current and switches to it."""
+    try:
+        set_current(version, MODELS_DIR)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Model version {version} is not published.")
+    loaded = models.activate(version)
+    use_model_version(loaded.version)
+    return {"active": describe_version(loaded), "previous": describe_version(models.previous)}
+
+@app.post("/predict/")
+async def predict(appointment: AppointmentRequest):
+    """
+    Predicts the no-show risk of a single appointment. Concurrent requests
+    are coalesced by the micro-batcher into one model call.
+    """
+    check_feature_index([appointment])
+    start = time.perf_counter()
+    result = await predict_batcher.submit(appointment)
+    # Queueing plus the shared model call of the micro-batch
+    add_request_timing('batch', time.perf_counter() - start)
+    use_model_version(result['model_version'])
+    return result
+
+@app.post("/predict/batch")
+def predict_batch(request: BatchPredictionRequest):
+    """Predicts the no-show risk of a list of appointments in one model call."""
+    if not request.appointments:
+        return {"predictions": []}
+    check_feature_index(request.appointments)
+    return {"predictions": predict_appointments(request.appointments)}
+
 @app.get("/get_appointments_by_date/")
 def get_appointments_by_date(date: str):
     """
-    Receives a date, loads the feature-engineered data, and returns a list of
-    appointments for that day with no-show predictions and risk factors.
+    Receives a date and returns that day's appointments with no-show
+    predictions and risk factors. Scored days are served from the prediction cache.
     """
-    # --- Load Data ---
+    selected_date = datetime.strptime(date, "%Y-%m-%d").date()
+    loaded = models.active
+    use_model_version(loaded.version)
+    computed = []
+
+    def compute():
+        computed.append(True)
+        return build_day_payload(selected_date, loaded)
+
+    start = time.perf_counter()
     try:
-        df = pd.read_csv(DATA_FILE)
+        payload = prediction_cache.get_or_compute((loaded.version, selected_date), compute)
+        if not computed:
+            add_request_timing('cache', time.perf_counter() - start, 'hit')
+        return payload
     except FileNotFoundError:
         raise HTTPException(status_code=500, detail=f"Data file not found at {DATA_FILE}. Please run the data processing scripts first.")
 
-    # --- Filter by Date and Sort ---
-    df['APPOINTMENT_DATETIME'] = pd.to_datetime(df['APPOINTMENT_DATETIME'])
-    df['APPOINTMENT_DATE'] = df['APPOINTMENT_DATETIME'].dt.date
-    selected_date = datetime.strptime(date, "%Y-%m-%d").date()
-    day_appointments = df[df['APPOINTMENT_DATE'] == selected_date].copy()
-    day_appointments = day_appointments.sort_values(by='APPOINTMENT_DATETIME').copy()
+def build_day_payload(selected_date, loaded=None):
+    """
+    Looks up the appointments for `selected_date` in the preloaded feature
+    dataset and scores them with the model version `loaded` (default: the
+    active one). Raises FileNotFoundError if the data file is missing.
+    """
+    loaded = loaded or models.active
+    # --- Look Up the Day ---
+    with timed(STAGE_SECONDS, 'data_refresh'):
+        appointment_store.refresh()
+    with timed(STAGE_SECONDS, 'lookup'):
+        day_appointments = appointment_store.get_day(selected_date)
 
     if day_appointments.empty:
         return {
@@ -77,84 +520,69 @@ def get_appointments_by_date(date: str):
                 "total_appointments": 0,
                 "predicted_noshows": 0,
                 "noshow_rate": 0,
-                "top_risk_factors": "N/A"
+                "top_risk_factors": "N/A",
+                "model_version": loaded.version,
             },
             "appointments": []
         }
 
     # --- Data Preparation for Model ---
-    # Convert boolean 'IS_WEEKEND' to object type for consistent encoding
-    day_appointments['IS_WEEKEND'] = day_appointments['IS_WEEKEND'].astype(str)
-
-    # One-Hot Encode categorical features
-    X_day = pd.get_dummies(day_appointments, columns=['DAY_OF_WEEK', 'HOUR_OF_DAY', 'APPOINTMENT_TYPE', 'IS_WEEKEND'])
-
-    # Align columns with the model's training columns
-    X_day = X_day.reindex(columns=model_columns, fill_value=0)
-
-    # --- Feature Scaling ---
-    X_day_scaled = X_day.copy()
-    X_day_scaled[numerical_features] = scaler.transform(X_day[numerical_features])
+    # One-hot encoding, column alignment and scaling in a single pass
+    with timed(STAGE_SECONDS, 'encode'):
+        X_day_scaled = loaded.encoder.transform_frame(day_appointments)
 
     # --- Prediction and Risk Analysis ---
-    appointments_list = []
-    high_risk_count = 0
-    all_risk_factors = []
-
-    # Get predictions for all appointments for the day
-    probabilities = model.predict_proba(X_day_scaled)
+    # Get predictions (and, in model mode, per-feature contributions) for all
+    # appointments for the day in one pass over the forest
+    if RISK_FACTOR_MODE == 'model':
+        with timed(STAGE_SECONDS, 'predict'):
+            probabilities, _, contributions = loaded.model.predict_contributions(X_day_scaled)
+        with timed(STAGE_SECONDS, 'risk_factors'):
+            factor_names = loaded.risk_factor_names
+            labels = risk_factor_labels(day_appointments, loaded.risk_factor_features, factor_names)
+            flags, factor_lists = contribution_risk_factors(
+                contributions, loaded.risk_factor_groups, labels, factor_names, RISK_FACTOR_TOP_K)
+    else:
+        with timed(STAGE_SECONDS, 'predict'):
+            probabilities = loaded.model.predict_proba(X_day_scaled)
+        with timed(STAGE_SECONDS, 'risk_factors'):
+            factor_names = RISK_FACTORS
+            flags = risk_factor_flags(day_appointments)
+            factor_lists = risk_factor_lists(flags)
     no_show_probabilities = probabilities[:, 1]
 
-    day_appointments['NO_SHOW_PROBABILITY'] = no_show_probabilities
-
-    for index, row in day_appointments.iterrows():
-        probability = row['NO_SHOW_PROBABILITY']
-        risk_factors = []
-
-        # Categorize Risk
-        if probability > 0.6:
-            risk_level = "High Risk"
-            high_risk_count += 1
-        elif 0.3 <= probability <= 0.6:
-            risk_level = "Medium Risk"
-        else:
-            risk_level = "Low Risk"
-
-        # Identify Risk Factors
-        if row['PAST_NOSHOW_RATE'] > 0.5:
-            risk_factors.append("History of No-Shows")
-        if row['LEAD_TIME_HOURS'] > 72:
-            risk_factors.append("Booked Far in Advance")
-        if row['APPOINTMENT_TYPE'] in ["Boarding", "Grooming"]:
-            risk_factors.append("High-Risk Appointment Type")
-        if risk_level == "High Risk":
-            all_risk_factors.extend(risk_factors)
-
-        appointments_list.append({
-            "id": row['APPOINTMENT_ODU_ID'],
-            "patient_id": row['PATIENT_ODU_ID'],
-            "time": row['APPOINTMENT_DATETIME'].strftime("%I:%M %p"),
-            "reason": row['APPOINTMENT_TYPE'],
-            "probability_score": row['NO_SHOW_PROBABILITY'],
-            "prediction": risk_level
-        })
+    # Risk levels are computed for all rows at once
+    levels = risk_levels(no_show_probabilities, HIGH_RISK_THRESHOLD, MEDIUM_RISK_THRESHOLD)
+    is_high_risk = levels == HIGH_RISK
+
+    # --- Build the Response from Columns ---
+    with timed(STAGE_SECONDS, 'serialize'):
+        columns = {
+            "id": day_appointments['APPOINTMENT_ODU_ID'].tolist(),
+            "patient_id": day_appointments['PATIENT_ODU_ID'].tolist(),
+            "time": day_appointments['APPOINTMENT_DATETIME'].dt.strftime("%I:%M %p").tolist(),
+            "reason": day_appointments['APPOINTMENT_TYPE'].tolist(),
+            "probability_score": no_show_probabilities.tolist(),
+            "prediction": levels.tolist(),
+            "risk_factors": factor_lists,
+        }
+        keys = list(columns)
+        appointments_list = [dict(zip(keys, values)) for values in zip(*columns.values())]
 
     # --- Calculate Summary ---
     total_appointments = len(day_appointments)
+    high_risk_count = int(is_high_risk.sum())
     noshow_rate = (high_risk_count / total_appointments) * 100 if total_appointments > 0 else 0
 
-    if all_risk_factors:
-        top_risk_factors = pd.Series(all_risk_factors).value_counts().index[0]
-    else:
-        top_risk_factors = "None"
-
     summary = {
         "total_appointments": total_appointments,
         "predicted_noshows": high_risk_count,
-        "noshow_rate": round(noshow_rate, 1)
+        "noshow_rate": round(noshow_rate, 1),
+        "top_risk_factors": top_risk_factor(flags, is_high_risk, factor_names),
+        "model_version": loaded.version,
     }
 
     return {
         "summary": summary,
         "appointments": appointments_list
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+
+
+def _settle(future, result=None, error=None):
+    """Resolves a caller's future, unless the caller already gave up on it."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single predictions into one vectorized call.
+
+    Each `submit` puts its item on a queue and waits. A background task takes
+    the first waiting item, keeps collecting until `max_batch_size` items are
+    queued or `max_wait` seconds have passed, then runs `predict_batch` on the
+    whole list in a worker thread (so the event loop keeps accepting requests)
+    and hands each caller its own result.
+
+    `predict_batch` takes a list of items and returns a sequence of results in
+    the same order. If it raises on a batch, the items are scored again one
+    by one, so only the callers whose items fail get the exception.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_wait=0.005):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        # The queue and worker belong to the running event loop, so they are
+        # created on first use rather than at import time.
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _predict(self, items):
+        # The batch serves many requests, so it runs in an empty context
+        # rather than the one of the request that started this task
+        # (per-request state such as stage timings)
+        return await asyncio.to_thread(contextvars.Context().run, self.predict_batch, items)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                results = await self._predict([item for item, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    _settle(batch[0][1], error=e)
+                    continue
+                # One bad item must not fail the requests it was batched with
+                for item, future in batch:
+                    try:
+                        result, = await self._predict([item])
+                    except Exception as item_error:
+                        _settle(future, error=item_error)
+                    else:
+                        _settle(future, result)
+                continue
+            for (_, future), result in zip(batch, results):
+                _settle(future, result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
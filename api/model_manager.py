@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_bundle import load_bundle, read_current, set_current
+from risk_engine import feature_group_matrix, risk_factor_names
+
+
+class ModelVersion:
+    """A loaded model with its encoder, identified by its version."""
+
+    def __init__(self, version, model, encoder, source, load_seconds=None):
+        self.version = version
+        self.model = model
+        self.encoder = encoder
+        self.source = source
+        self.load_seconds = load_seconds
+        # Sums the per-column model contributions into one value per raw feature
+        self.risk_factor_features, self.risk_factor_groups = feature_group_matrix(encoder.column_features)
+        self.risk_factor_names = risk_factor_names(self.risk_factor_features)
+        self.loaded_at = time.time()
+
+    def warm_up(self):
+        """
+        Reads every page of a memory-mapped model and scores a small batch,
+        so the first requests after the switch don't pay for page faults.
+        """
+        for name in ('feature', 'threshold', 'left', 'right', 'value', 'missing_go_to_left'):
+            array = getattr(self.model, name, None)
+            if array is not None:
+                np.asarray(array).sum()
+        self.model.predict_contributions(np.zeros((8, self.encoder.n_features), dtype=np.float32))
+
+
+class ModelManager:
+    """
+    Serves one active ModelVersion and keeps the previously active one in
+    memory for an instant rollback.
+
+    A background thread polls the CURRENT file of the versioned model
+    directory. When it names another version, that version is loaded and
+    warmed up (and `on_loaded` called with it, e.g. to pre-score cached
+    days) while requests keep being served by the active one; then the two
+    are switched with a single reference assignment. Request handlers read
+    `manager.active` once and use that version throughout, so a request
+    never mixes the encoder of one version with the model of another.
+    """
+
+    def __init__(self, models_dir, poll_interval=2.0, on_loaded=None, on_swap=None):
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+        self.on_loaded = on_loaded
+        self.on_swap = on_swap
+        self.active = None
+        self.previous = None
+        self.last_error = None
+        self._swap_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def uses_registry(self):
+        return read_current(self.models_dir) is not None
+
+    def load_version(self, version):
+        start = time.perf_counter()
+        model, encoder, manifest = load_bundle(os.path.join(self.models_dir, version))
+        return ModelVersion(manifest['version'], model, encoder, source=f"models/{version}",
+                            load_seconds=time.perf_counter() - start)
+
+    def set_active(self, loaded, reason='load'):
+        with self._swap_lock:
+            self._switch(loaded, reason)
+
+    def _switch(self, loaded, reason):
+        if self.active is not None and self.active.version != loaded.version:
+            self.previous = self.active
+        self.active = loaded
+        if self.on_swap is not None:
+            self.on_swap(loaded, reason)
+
+    def activate(self, version, reason='swap'):
+        """Switches to `version`, from memory if it is the previous one. Returns the active version."""
+        with self._swap_lock:
+            if self.active is not None and self.active.version == version:
+                return self.active
+            if self.previous is not None and self.previous.version == version:
+                self._switch(self.previous, reason)
+                return self.active
+            loaded = self.load_version(version)
+            loaded.warm_up()
+            if self.on_loaded is not None:
+                self.on_loaded(loaded)
+            self._switch(loaded, reason)
+            return self.active
+
+    def rollback(self):
+        """
+        Switches back to the previous version held in memory. CURRENT is
+        updated too, so the other workers follow and a restart keeps it.
+        """
+        with self._swap_lock:
+            previous = self.previous
+        if previous is None:
+            raise LookupError("There is no previous model version to roll back to.")
+        if self.uses_registry():
+            set_current(previous.version, self.models_dir)
+        return self.activate(previous.version, reason='rollback')
+
+    def check(self):
+        """Activates the version named by CURRENT if it isn't active. Returns True on a switch."""
+        current = read_current(self.models_dir)
+        if current is None or (self.active is not None and self.active.version == current['version']):
+            return False
+        try:
+            self.activate(current['version'], reason='rollback' if self.previous is not None
+                          and self.previous.version == current['version'] else 'swap')
+            self.last_error = None
+            return True
+        except Exception as error:
+            # Keep serving the active version; the next poll tries again
+            if str(error) != self.last_error:
+                print(f"Could not load model version {current['version']}: {error}")
+            self.last_error = str(error)
+            return False
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
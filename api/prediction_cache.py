@@ -0,0 +1,83 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    LRU cache of scored day payloads for get_appointments_by_date.
+
+    Every lookup compares the size and modification time of the watched
+    files (model, scaler, model columns and feature CSV) with the ones seen
+    when the cached entries were computed. If any of them changed, the whole
+    cache is dropped and `on_invalidate` is called so the caller can reload
+    its artifacts before anything is recomputed.
+    """
+
+    def __init__(self, watched_files, max_entries=128, on_invalidate=None):
+        self.watched_files = list(watched_files)
+        self.max_entries = max_entries
+        self.on_invalidate = on_invalidate
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._signature = self._files_signature()
+        self.hits = 0
+        self.misses = 0
+
+    def _files_signature(self):
+        signature = []
+        for path in self.watched_files:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh(self):
+        """Drops the cache if any watched file changed since the last check."""
+        signature = self._files_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            self._entries.clear()
+            if self.on_invalidate is not None:
+                self.on_invalidate()
+            self._signature = signature
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached payload for `key`, calling `compute()` on a miss."""
+        self.refresh()
+        signature = self._signature
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        payload = compute()
+
+        with self._lock:
+            # Don't store a result if the artifacts changed while computing it.
+            if signature == self._signature:
+                self._entries[key] = payload
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def warm_up(self, keys, compute):
+        """Pre-computes the payloads for `keys`. `compute` is called with each key."""
+        for key in keys:
+            self.get_or_compute(key, lambda: compute(key))
+
+    def __len__(self):
+        return len(self._entries)
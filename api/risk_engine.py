@@ -0,0 +1,150 @@
+import numpy as np
+
+HIGH_RISK = "High Risk"
+MEDIUM_RISK = "Medium Risk"
+LOW_RISK = "Low Risk"
+
+# Rule-based risk factors, in the order they are reported
+RISK_FACTORS = [
+    "History of No-Shows",
+    "Booked Far in Advance",
+    "High-Risk Appointment Type",
+]
+HIGH_RISK_APPOINTMENT_TYPES = ["Boarding", "Grooming"]
+
+# Risk factor reported when a model feature pushes the no-show probability up
+FEATURE_RISK_FACTORS = {
+    'PAST_NOSHOW_RATE': "Past Attendance",
+    'LEAD_TIME_HOURS': "Booking Lead Time",
+    'APPOINTMENT_TYPE': "Appointment Type",
+    'DAYS_SINCE_LAST_APPT': "Time Since Last Visit",
+    'DURATION_MIN': "Appointment Duration",
+    'RESOURCE_NOSHOW_RATE': "Provider No-Show Rate",
+    'PRACTICE_NOSHOW_RATE': "Clinic No-Show Rate",
+    'DAY_OF_WEEK': "Day of Week",
+    'HOUR_OF_DAY': "Time of Day",
+    'IS_WEEKEND': "Day of Week",
+}
+# Value-specific label used instead, only for the appointments that have that value
+VALUE_RISK_FACTORS = {
+    'PAST_NOSHOW_RATE': ("History of No-Shows", lambda df: df['PAST_NOSHOW_RATE'] > 0),
+    'IS_WEEKEND': ("Weekend Appointment", lambda df: df['IS_WEEKEND'].eq(True)),
+}
+
+
+def risk_levels(probabilities, high_threshold=0.6, medium_threshold=0.3):
+    """
+    Buckets no-show probabilities: above `high_threshold` is High Risk,
+    from `medium_threshold` up to `high_threshold` is Medium Risk, anything
+    lower is Low Risk.
+    """
+    return np.select(
+        [probabilities > high_threshold, probabilities >= medium_threshold],
+        [HIGH_RISK, MEDIUM_RISK],
+        default=LOW_RISK,
+    )
+
+
+def risk_factor_flags(day_appointments):
+    """Returns a (n_appointments, len(RISK_FACTORS)) boolean matrix."""
+    return np.column_stack([
+        (day_appointments['PAST_NOSHOW_RATE'] > 0.5).to_numpy(),
+        (day_appointments['LEAD_TIME_HOURS'] > 72).to_numpy(),
+        day_appointments['APPOINTMENT_TYPE'].isin(HIGH_RISK_APPOINTMENT_TYPES).to_numpy(),
+    ])
+
+
+def risk_factor_lists(flags, names=RISK_FACTORS):
+    """
+    Turns the flag matrix into one list of factor names per appointment.
+    Rows with the same flags share the same list object.
+    """
+    n_factors = flags.shape[1]
+    # Each row's flags read as a bit pattern, e.g. [True, False, True] -> 5
+    codes = flags.astype(np.int64) @ (1 << np.arange(n_factors))
+    combinations = [
+        [names[j] for j in range(n_factors) if code & (1 << j)]
+        for code in range(1 << n_factors)
+    ]
+    return [combinations[code] for code in codes.tolist()]
+
+
+def top_risk_factor(flags, mask, names=RISK_FACTORS):
+    """
+    Returns the factor flagged most often among the rows selected by `mask`,
+    or "None" if no factor is flagged. Ties go to the factor that appears
+    first when reading the rows in order.
+    """
+    selected = flags[mask]
+    counts = selected.sum(axis=0)
+    if counts.max(initial=0) == 0:
+        return "None"
+
+    n_rows, n_factors = selected.shape
+    # Position of each factor's first occurrence in row-major reading order
+    positions = np.where(selected, np.arange(n_rows)[:, None] * n_factors + np.arange(n_factors), n_rows * n_factors)
+    first_seen = positions.min(axis=0)
+
+    candidates = np.flatnonzero(counts == counts.max())
+    return names[candidates[np.argmin(first_seen[candidates])]]
+
+
+def feature_group_matrix(column_features):
+    """
+    Returns (features, matrix) where `matrix` sums model columns into their
+    raw features, so the one-hot columns of e.g. HOUR_OF_DAY add up to one
+    HOUR_OF_DAY contribution. `features` are the raw feature names.
+    """
+    features = list(dict.fromkeys(column_features))
+    matrix = np.zeros((len(column_features), len(features)))
+    matrix[np.arange(len(column_features)), [features.index(f) for f in column_features]] = 1.0
+    return features, matrix
+
+
+def risk_factor_names(features):
+    """The risk factor labels the raw `features` can be reported as, neutral and value-specific."""
+    names = [FEATURE_RISK_FACTORS.get(f, f) for f in features]
+    names += [VALUE_RISK_FACTORS[f][0] for f in features if f in VALUE_RISK_FACTORS]
+    return list(dict.fromkeys(names))
+
+
+def risk_factor_labels(df, features, names):
+    """
+    Returns a (n_appointments, len(features)) matrix of indexes into `names`:
+    the label each feature is reported with for each appointment. A
+    value-specific label (e.g. "Weekend Appointment") is only used for the
+    appointments that have that value; the others get the neutral one.
+    """
+    neutral = np.array([names.index(FEATURE_RISK_FACTORS.get(f, f)) for f in features])
+    labels = np.tile(neutral, (len(df), 1))
+    for j, feature in enumerate(features):
+        if feature in VALUE_RISK_FACTORS and feature in df.columns:
+            label, has_value = VALUE_RISK_FACTORS[feature]
+            labels[has_value(df).fillna(False).to_numpy(dtype=bool), j] = names.index(label)
+    return labels
+
+
+def contribution_risk_factors(contributions, group_matrix, labels, names, top_k=3):
+    """
+    Picks each appointment's risk factors from its per-column model
+    contributions: the `top_k` features that raised the no-show probability
+    the most, strongest first, each reported with its label from `labels`
+    (see risk_factor_labels). Returns (flags, lists) with the same layout
+    as risk_factor_flags and risk_factor_lists, indexed by `names`.
+    """
+    grouped = contributions @ group_matrix
+    top_k = min(top_k, grouped.shape[1])
+    order = np.argsort(-grouped, axis=1, kind='stable')[:, :top_k]
+    selected = np.take_along_axis(grouped, order, axis=1) > 0
+    top_labels = np.take_along_axis(labels, order, axis=1)
+
+    flags = np.zeros((len(grouped), len(names)), dtype=bool)
+    rows = np.broadcast_to(np.arange(len(grouped))[:, None], order.shape)
+    flags[rows[selected], top_labels[selected]] = True
+
+    # Two features can share a neutral label (DAY_OF_WEEK and IS_WEEKEND)
+    lists = [
+        list(dict.fromkeys(names[j] for j, keep in zip(row_labels, row_selected) if keep))
+        for row_labels, row_selected in zip(top_labels.tolist(), selected.tolist())
+    ]
+    return flags, lists
@@ -0,0 +1,198 @@
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from appointment_store import AppointmentStore, read_sorted
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` across processes (e.g. the uvicorn workers)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _column_arrays(series):
+    """
+    Splits a column into (kind, {name: array}) that np.save can write and
+    np.load can memory-map: text and categorical columns become int32 codes
+    plus an array of their distinct values, the rest a plain NumPy array.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(dtype) \
+            or pd.api.types.is_string_dtype(dtype):
+        codes, categories = pd.factorize(series, use_na_sentinel=True)
+        categories = np.asarray(categories)
+        if categories.dtype == object:
+            categories = categories.astype(str)
+        return 'codes', {'codes': codes.astype(np.int32), 'categories': categories}
+    if pd.api.types.is_datetime64_dtype(dtype):
+        return 'values', {'values': series.to_numpy()}
+    if pd.api.types.is_bool_dtype(dtype) and not series.isna().any():
+        return 'values', {'values': series.to_numpy(dtype=bool)}
+    # Nullable integer/boolean columns become float with NaN, as CSV reads them
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return 'values', {'values': series.to_numpy(dtype=np.float64, na_value=np.nan)}
+    return 'values', {'values': series.to_numpy()}
+
+
+def write_snapshot(df, path):
+    """
+    Writes a dataset sorted by APPOINTMENT_DATETIME (with an APPOINTMENT_DATE
+    column) to `path` as one .npy file per column array, plus the row offset
+    of every day and a manifest. The directory is built under a temporary
+    name and renamed into place, so readers only ever see complete snapshots.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # The rows are sorted, so every day is one contiguous range
+    days = df['APPOINTMENT_DATE'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.array([], dtype=np.int64)
+    offsets = np.r_[starts, len(days)].astype(np.int64)
+    ordinals = np.array([days[i].toordinal() for i in starts], dtype=np.int64)
+    np.save(os.path.join(tmp, '_day_ordinals.npy'), ordinals)
+    np.save(os.path.join(tmp, '_day_offsets.npy'), offsets)
+
+    columns = {}
+    for i, column in enumerate(c for c in df.columns if c != 'APPOINTMENT_DATE'):
+        kind, arrays = _column_arrays(df[column])
+        files = {}
+        for name, array in arrays.items():
+            files[name] = f'{i:03d}_{name}.npy'
+            np.save(os.path.join(tmp, files[name]), array)
+        columns[column] = {'kind': kind, 'files': files}
+
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump({'format_version': SNAPSHOT_FORMAT_VERSION, 'rows': len(df), 'columns': columns}, f, indent=2)
+    os.rename(tmp, path)
+
+
+def build_snapshot(data_file, columns, path):
+    write_snapshot(read_sorted(data_file, columns), path)
+
+
+class DaySnapshot(Mapping):
+    """
+    Read-only {date: day frame} view of a snapshot written by write_snapshot.
+
+    Every array is memory-mapped, so the dataset lives once in the OS page
+    cache however many processes attach to it. A day's frame is built on
+    lookup from slices of the maps and only that day's rows are copied.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['format_version'] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported appointment snapshot version in {path}")
+        self.rows = manifest['rows']
+
+        def load(file_name):
+            return np.load(os.path.join(path, file_name), mmap_mode='r')
+
+        offsets = load('_day_offsets.npy')
+        self._offsets = {
+            date.fromordinal(int(ordinal)): (int(offsets[i]), int(offsets[i + 1]))
+            for i, ordinal in enumerate(load('_day_ordinals.npy'))
+        }
+        self._columns = {
+            column: (spec['kind'], {name: load(file_name) for name, file_name in spec['files'].items()})
+            for column, spec in manifest['columns'].items()
+        }
+
+    @staticmethod
+    def _decode(kind, arrays, start, stop):
+        if kind == 'values':
+            return np.array(arrays['values'][start:stop])
+        codes = np.asarray(arrays['codes'][start:stop])
+        categories = arrays['categories']
+        if not len(categories):
+            return np.full(len(codes), None, dtype=object)
+        values = categories[np.maximum(codes, 0)]
+        missing = codes < 0
+        if values.dtype.kind == 'U':
+            values = values.astype(object)
+            values[missing] = None
+        elif missing.any():
+            values = values.astype(np.float64)
+            values[missing] = np.nan
+        return values
+
+    def frame(self, start, stop, day=None):
+        df = pd.DataFrame({
+            column: self._decode(kind, arrays, start, stop)
+            for column, (kind, arrays) in self._columns.items()
+        })
+        df['APPOINTMENT_DATE'] = pd.Series([day] * (stop - start), dtype=object)
+        return df
+
+    def __getitem__(self, day):
+        start, stop = self._offsets[day]
+        return self.frame(start, stop, day)
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+
+class SharedAppointmentStore(AppointmentStore):
+    """
+    AppointmentStore for several worker processes. Instead of every worker
+    keeping a private copy of the dataset, the first one to load a version
+    of the table converts it into a memory-mapped snapshot under
+    `snapshot_dir` (the others wait on a file lock) and every worker
+    attaches to that snapshot read-only.
+
+    Snapshots are named after the table's path, size, modification time and
+    the loaded columns, so a changed table gets a new snapshot while workers
+    still attached to the old one keep reading it until they reload.
+    """
+
+    def __init__(self, data_file, snapshot_dir, columns=None):
+        self.snapshot_dir = snapshot_dir
+        super().__init__(data_file, columns=columns)
+
+    def _snapshot_path(self, signature):
+        key = json.dumps([os.path.abspath(signature[0]), *signature[1:], self.columns])
+        return os.path.join(self.snapshot_dir, hashlib.sha256(key.encode()).hexdigest()[:16])
+
+    def _load(self, signature):
+        path = self._snapshot_path(signature)
+        if not os.path.exists(os.path.join(path, 'manifest.json')):
+            with file_lock(os.path.join(self.snapshot_dir, '.lock')):
+                if not os.path.exists(os.path.join(path, 'manifest.json')):
+                    start = time.perf_counter()
+                    # In a short-lived process, so the memory used to read
+                    # and convert the table is returned when it exits
+                    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                        pool.submit(build_snapshot, self.data_file, self.columns, path).result()
+                    print(f"Appointment snapshot written to {path} in {time.perf_counter() - start:.1f}s")
+                    # Older snapshots are unlinked; workers still mapping them keep their pages
+                    for name in os.listdir(self.snapshot_dir):
+                        if name != os.path.basename(path) and not name.startswith('.'):
+                            shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+
+        days = DaySnapshot(path)
+        return days, days.frame(0, 0), days.rows
@@ -0,0 +1,164 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from patient_history import add_patient_history, history_order, PATIENT_KEY
+
+# No-show rate columns computed over all appointments of the same group
+GROUP_RATES = {
+    "RESOURCE_NOSHOW_RATE": "RESOURCE_ODU_ID",
+    "PRACTICE_NOSHOW_RATE": "PRACTICE_ODU_ID",
+}
+PRACTICE_KEY = "PRACTICE_ODU_ID"
+# Keys grouped by the features; rows sharing one must land in the same shard
+SHARD_LINK_KEYS = [PATIENT_KEY] + [key for key in GROUP_RATES.values() if key != PRACTICE_KEY]
+
+
+def add_appointment_features(df, required=("APPOINTMENT_DATETIME", "CREATED_DATE")):
+    """
+    Parses the date columns, drops the rows where the `required` ones can't
+    be parsed and adds the features that only depend on the appointment
+    itself: lead time, day/hour/month, weekend, time slot, duration and
+    month start/end flags.
+    """
+    # Ensure date columns are parsed correctly
+    df["APPOINTMENT_DATETIME"] = pd.to_datetime(df["APPOINTMENT_DATETIME"], errors="coerce")
+    df["CREATED_DATE"] = pd.to_datetime(df["CREATED_DATE"], errors="coerce")
+
+    # Handle potential parsing errors
+    df = df.dropna(subset=list(required))
+
+    # Create time-based features
+    df["LEAD_TIME_HOURS"] = (df["APPOINTMENT_DATETIME"] - df["CREATED_DATE"]).dt.total_seconds() / 3600
+    df["DAY_OF_WEEK"] = df["APPOINTMENT_DATETIME"].dt.day_name()
+    df["HOUR_OF_DAY"] = df["APPOINTMENT_DATETIME"].dt.hour
+    df["MONTH"] = df["APPOINTMENT_DATETIME"].dt.month
+    df["WEEKDAY_NUM"] = df["APPOINTMENT_DATETIME"].dt.weekday  # Monday=0, Sunday=6
+    df["IS_WEEKEND"] = df["WEEKDAY_NUM"].isin([5, 6])
+
+    # Appointment-related features
+    df["IS_MORNING_SLOT"] = df["HOUR_OF_DAY"].between(7, 11)
+    df["IS_AFTERNOON_SLOT"] = df["HOUR_OF_DAY"].between(12, 16)
+    df["IS_EVENING_SLOT"] = df["HOUR_OF_DAY"].between(17, 20)
+    df["DURATION_MIN"] = df["DURATION"]
+
+    # Time-window flags
+    df["IS_MONTH_START"] = df["APPOINTMENT_DATETIME"].dt.is_month_start
+    df["IS_MONTH_END"] = df["APPOINTMENT_DATETIME"].dt.is_month_end
+    return df
+
+
+def add_group_rates(df):
+    """Clinic & staff consistency features: the no-show rate of each resource and practice."""
+    for column, key in GROUP_RATES.items():
+        df[column] = df.groupby(key)["NO_SHOW"].transform("mean")
+    return df
+
+
+def remove_unused_categories(df):
+    """
+    Category columns (kept by the binary formats) should only list the values
+    that are left, so one-hot encoding doesn't produce empty columns.
+    """
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+def practice_components(df):
+    """
+    Labels each row with a component of practices: practices that share a
+    patient or resource (ids normally carry their practice as a suffix, so
+    this rarely merges any) get the same label. Every group the features are
+    computed over then lies within one component.
+    """
+    practices, _ = pd.factorize(df[PRACTICE_KEY], use_na_sentinel=False)
+    component = np.arange(practices.max() + 1 if len(practices) else 0)
+    links = []
+    for key in SHARD_LINK_KEYS:
+        pairs = pd.DataFrame({"key": pd.factorize(df[key])[0], "practice": practices})
+        pairs = pairs[pairs["key"] >= 0].drop_duplicates()
+        shared = pairs[pairs.duplicated("key", keep=False)]
+        if len(shared):
+            links.append((shared["key"].to_numpy(), shared["practice"].to_numpy()))
+
+    # Propagate the smallest practice label over the shared keys until stable
+    changed = bool(links)
+    while changed:
+        changed = False
+        for keys, linked in links:
+            smallest = np.full(keys.max() + 1, len(component))
+            np.minimum.at(smallest, keys, component[linked])
+            merged = np.minimum(component[linked], smallest[keys])
+            if (merged < component[linked]).any():
+                np.minimum.at(component, linked, merged)
+                changed = True
+    return component[practices]
+
+
+def practice_shards(df, n_shards):
+    """
+    Splits the rows into at most `n_shards` groups of whole practice
+    components, balanced by row count (largest components first). Returns
+    the row positions of each shard, in their original order.
+    """
+    components = practice_components(df)
+    sizes = np.bincount(components)
+    shard_of = np.zeros(len(sizes), dtype=int)
+    loads = np.zeros(min(n_shards, np.count_nonzero(sizes)), dtype=int)
+    for component in np.argsort(-sizes, kind="stable"):
+        if sizes[component]:
+            shard_of[component] = loads.argmin()
+            loads[shard_of[component]] += sizes[component]
+    rows = shard_of[components]
+    return [np.flatnonzero(rows == shard) for shard in range(len(loads))]
+
+
+# The frame being sharded, inherited by forked workers so it isn't pickled
+_sharded_frame = None
+
+
+def _featurize_shard(df):
+    # Unused categories are removed after concatenating, so every shard
+    # keeps the same category dtype and concat doesn't fall back to object
+    return add_group_rates(add_patient_history(add_appointment_features(df)))
+
+
+def _featurize_rows(rows):
+    return _featurize_shard(_sharded_frame.iloc[rows])
+
+
+def featurize_by_practice(df, workers, shards_per_worker=4):
+    """
+    Adds all the features (appointment, patient history and group rates) to
+    practice shards of a labeled frame in a process pool.
+
+    The patient, resource and practice groups never span two shards, so each
+    shard is featurized on its own. The shards are put back in HISTORY_ORDER
+    (patient, time, id), so the concatenated result is identical to
+    featurizing the whole frame in one process.
+
+    Where processes can be forked, the workers inherit the frame and only
+    receive the row positions of their shards; otherwise the shards are
+    pickled to them.
+    """
+    global _sharded_frame
+    shards = practice_shards(df, workers * shards_per_worker)
+    if "fork" in multiprocessing.get_all_start_methods():
+        _sharded_frame = df
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        featurize_shard = _featurize_rows
+    else:
+        shards = [df.iloc[rows] for rows in shards]
+        pool = ProcessPoolExecutor(max_workers=workers)
+        featurize_shard = _featurize_shard
+    try:
+        with pool:
+            parts = list(pool.map(featurize_shard, shards))
+    finally:
+        _sharded_frame = None
+    df = pd.concat(parts)
+    df = df.sort_values(history_order(df), kind="stable")
+    return remove_unused_categories(df)
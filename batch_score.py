@@ -0,0 +1,316 @@
+"""
+Offline batch scoring of an appointment file of any size.
+
+    python batch_score.py upcoming_appointments.csv --output output/scores --format parquet
+
+The input (CSV, Feather or Parquet) is streamed in chunks of --chunksize
+rows. Every chunk is encoded and scored by a pool of worker processes, each
+holding its own copy of the model (a published bundle is memory-mapped, so
+they share its pages). At most two chunks per worker are in flight, so
+memory is bounded by the chunk size rather than the file size, and results
+are written in input order as they come back.
+
+The input is either a feature table (the columns of
+output/final_features_and_eda) or raw appointments with the columns of
+Apointment_clean.csv. For raw appointments the appointment features are
+derived as in feature_engineering_eda.py and the patient, resource and
+practice history features are looked up in the feature index (see
+feature_index.py). Rows whose appointment time can't be parsed are
+skipped: their id columns are written to <output>_skipped.csv, with the
+appointment time as it was in the input. A missing creation time leaves
+the lead time missing (0 once encoded).
+
+The output has the id columns of the input, NO_SHOW_PROBABILITY and
+RISK_LEVEL (the API's High/Medium/Low Risk buckets). When no row can be
+scored, it is an empty table with those columns.
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# The risk buckets are shared with the API
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'api'))
+
+from appointment_features import add_appointment_features
+from feature_encoder import FeatureEncoder, NUMERICAL_FEATURES, CATEGORICAL_FEATURES
+from feature_index import FeatureIndex, INDEX_FILE
+from forest_engine import FlatForest, FLAT_MODEL_FILE
+from model_bundle import MODELS_DIR, COLUMNS_FILE, SCALER_FILE, load_bundle, read_current
+from risk_engine import risk_levels
+from table_io import EXTENSIONS, DEFAULT_FORMAT, find_table, table_stem
+
+ID_COLUMNS = ['APPOINTMENT_ODU_ID', 'PATIENT_ODU_ID', 'RESOURCE_ODU_ID', 'PRACTICE_ODU_ID', 'APPOINTMENT_DATETIME']
+# Raw appointment columns the features are derived from
+RAW_COLUMNS = ['APPOINTMENT_DATETIME', 'CREATED_DATE', 'DURATION', 'APPOINTMENT_TYPE']
+FEATURE_COLUMNS = NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+HIGH_RISK_THRESHOLD = float(os.environ.get('NOSHOW_HIGH_RISK_THRESHOLD', 0.6))
+MEDIUM_RISK_THRESHOLD = float(os.environ.get('NOSHOW_MEDIUM_RISK_THRESHOLD', 0.3))
+
+
+# --- Reading and writing in chunks ---
+
+def table_columns(path):
+    """The column names of a stored table, without reading its rows."""
+    if path.endswith(EXTENSIONS['feather']):
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+    if path.endswith(EXTENSIONS['parquet']):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _rebatch(batches, chunksize):
+    """Regroups Arrow record batches into DataFrames of `chunksize` rows."""
+    import pyarrow as pa
+    buffered, rows = [], 0
+    for batch in batches:
+        while batch.num_rows:
+            part = batch.slice(0, chunksize - rows)
+            buffered.append(part)
+            rows += part.num_rows
+            batch = batch.slice(part.num_rows)
+            if rows == chunksize:
+                yield pa.Table.from_batches(buffered).to_pandas()
+                buffered, rows = [], 0
+    if buffered:
+        yield pa.Table.from_batches(buffered).to_pandas()
+
+
+def read_chunks(path, columns, chunksize):
+    """
+    Yields the `columns` of a table in DataFrames of `chunksize` rows. Feather
+    files are memory-mapped and read one record batch at a time, Parquet
+    files one row group at a time, CSV with pandas' chunked reader.
+    """
+    if path.endswith(EXTENSIONS['feather']):
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            yield from _rebatch((reader.get_batch(i).select(columns) for i in range(reader.num_record_batches)),
+                                chunksize)
+    elif path.endswith(EXTENSIONS['parquet']):
+        import pyarrow.parquet as pq
+        yield from _rebatch(pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns), chunksize)
+    else:
+        ids = {col: 'string' for col in ID_COLUMNS if col in columns and col != 'APPOINTMENT_DATETIME'}
+        dates = [col for col in ('APPOINTMENT_DATETIME',) if col in columns]
+        yield from pd.read_csv(path, usecols=columns, dtype=ids, parse_dates=dates, chunksize=chunksize)
+
+
+class ScoreWriter:
+    """
+    Appends scored chunks to a CSV, Feather or Parquet file. The file is
+    written under a temporary name and renamed when closed, so an
+    interrupted run never leaves a partial file that looks complete.
+    """
+
+    def __init__(self, path, fmt):
+        self.path = table_stem(path) + EXTENSIONS[fmt]
+        self.fmt = fmt
+        self.tmp = f'{self.path}.{os.getpid()}.tmp'
+        self._writer = None
+        self._schema = None
+        self.rows = 0
+
+    def write(self, df):
+        if self.fmt == 'csv':
+            df.to_csv(self.tmp, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.fmt == 'feather':
+                    self._writer = pa.ipc.new_file(self.tmp, self._schema)
+                else:
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.tmp, self._schema)
+            self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp):
+            os.replace(self.tmp, self.path)
+        return self.path
+
+
+def empty_scores(id_columns):
+    """A scores table without rows, with the column types of a scored chunk."""
+    columns = {col: pd.Series(dtype='datetime64[us]' if col == 'APPOINTMENT_DATETIME' else 'string')
+               for col in id_columns}
+    columns['NO_SHOW_PROBABILITY'] = pd.Series(dtype=np.float32)
+    columns['RISK_LEVEL'] = pd.Series(dtype=str)
+    return pd.DataFrame(columns)
+
+
+# --- Scoring ---
+
+def load_model():
+    """The current published model version, or the flat export of the Random Forest."""
+    current = read_current(MODELS_DIR)
+    if current is not None:
+        model, encoder, manifest = load_bundle(os.path.join(MODELS_DIR, current['version']))
+        return model, encoder, manifest['version']
+    return FlatForest.load(FLAT_MODEL_FILE), FeatureEncoder.from_files(COLUMNS_FILE, SCALER_FILE), 'file'
+
+
+class ChunkScorer:
+    """Turns a chunk of the input into its scores (see the module docstring)."""
+
+    def __init__(self, id_columns, hydrate, high_threshold, medium_threshold):
+        self.model, self.encoder, self.version = load_model()
+        self.index = FeatureIndex.load(INDEX_FILE) if hydrate else None
+        self.id_columns = id_columns
+        self.high_threshold = high_threshold
+        self.medium_threshold = medium_threshold
+
+    def features(self, chunk):
+        if self.index is None:
+            return chunk
+        chunk = add_appointment_features(chunk, required=["APPOINTMENT_DATETIME"])
+        return self.index.hydrate_frame(chunk)
+
+    def score(self, chunk):
+        """The scores of a chunk and the id columns of the rows that were skipped."""
+        times = chunk['APPOINTMENT_DATETIME'] if 'APPOINTMENT_DATETIME' in chunk else None
+        features = self.features(chunk)
+        dropped = chunk.index.difference(features.index)
+        skipped = chunk.loc[dropped, self.id_columns]
+        if times is not None:
+            # add_appointment_features replaced the unparseable times with NaT
+            skipped = skipped.assign(APPOINTMENT_DATETIME=times[dropped].astype(str))
+
+        probabilities = self.model.predict_proba(self.encoder.transform_frame(features))[:, 1]
+        scores = features[self.id_columns].reset_index(drop=True)
+        scores['NO_SHOW_PROBABILITY'] = probabilities.astype(np.float32)
+        scores['RISK_LEVEL'] = risk_levels(probabilities, self.high_threshold, self.medium_threshold)
+        return scores, skipped
+
+
+# Each worker process builds its scorer once
+_scorer = None
+
+
+def _init_worker(*args):
+    global _scorer
+    _scorer = ChunkScorer(*args)
+
+
+def _score_chunk(chunk):
+    return (len(chunk), *_scorer.score(chunk))
+
+
+def score_chunks(chunks, scorer_args, workers):
+    """
+    Yields (input rows, scores, skipped rows) per chunk, in input order. Scoring runs in
+    `workers` processes with at most two chunks per worker in flight; with
+    one worker it runs in this process.
+    """
+    if workers <= 1:
+        _init_worker(*scorer_args)
+        for chunk in chunks:
+            yield _score_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=scorer_args) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def peak_memory_mb(who):
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score an appointment file in chunks across processes and write probabilities and risk levels.")
+    parser.add_argument('input', help="Feature table or raw appointment file (.csv, .feather or .parquet).")
+    parser.add_argument('--output', default=os.path.join('output', 'scores'),
+                        help="Output file; the extension follows --format (default: output/scores).")
+    parser.add_argument('--format', choices=list(EXTENSIONS), default=DEFAULT_FORMAT,
+                        help="Output file format (default: $NOSHOW_TABLE_FORMAT or csv).")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Rows per chunk (default: 100000).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Scoring processes (default: one per CPU).")
+    parser.add_argument('--high-threshold', type=float, default=HIGH_RISK_THRESHOLD,
+                        help="Probability above which an appointment is High Risk (default: $NOSHOW_HIGH_RISK_THRESHOLD or 0.6).")
+    parser.add_argument('--medium-threshold', type=float, default=MEDIUM_RISK_THRESHOLD,
+                        help="Probability from which an appointment is Medium Risk (default: $NOSHOW_MEDIUM_RISK_THRESHOLD or 0.3).")
+    args = parser.parse_args()
+
+    try:
+        input_file = find_table(args.input)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        exit(1)
+    available = table_columns(input_file)
+    id_columns = [col for col in ID_COLUMNS if col in available]
+    hydrate = not set(FEATURE_COLUMNS) <= set(available)
+    if hydrate:
+        missing = [col for col in RAW_COLUMNS if col not in available]
+        if missing:
+            print(f"Error: {input_file} has neither the model features nor the raw appointment columns "
+                  f"(missing {', '.join(missing)}).")
+            exit(1)
+        if not os.path.exists(INDEX_FILE):
+            print(f"Error: {INDEX_FILE} not found. Run feature_engineering_eda.py to build the feature index.")
+            exit(1)
+        columns = list(dict.fromkeys(id_columns + RAW_COLUMNS))
+    else:
+        columns = list(dict.fromkeys(id_columns + FEATURE_COLUMNS))
+
+    print(f"Scoring {input_file} ({'raw appointments, hydrated from the feature index' if hydrate else 'feature table'}) "
+          f"in chunks of {args.chunksize:,} rows with {args.workers} worker(s)...")
+    writer = ScoreWriter(args.output, args.format)
+    skipped_writer = ScoreWriter(table_stem(args.output) + '_skipped', 'csv')
+    start = time.perf_counter()
+    rows = 0
+    chunks = read_chunks(input_file, columns, args.chunksize)
+    scorer_args = (id_columns, hydrate, args.high_threshold, args.medium_threshold)
+    for chunk_rows, scores, skipped in score_chunks(chunks, scorer_args, args.workers):
+        if len(scores):
+            writer.write(scores)
+        if len(skipped):
+            skipped_writer.write(skipped)
+        rows += chunk_rows
+        elapsed = time.perf_counter() - start
+        print(f"  {rows:,} rows read, {rows / elapsed:,.0f} rows/s"
+              + (f" ({len(skipped):,} skipped in this chunk)" if len(skipped) else ""))
+    if not writer.rows:
+        # An empty input, or no parseable row: still leave a table with the output columns
+        writer.write(empty_scores(id_columns))
+    output_file = writer.close()
+    skipped_file = skipped_writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"\nScored {writer.rows:,} of {rows:,} appointments in {elapsed:.1f}s "
+          f"({rows / elapsed if elapsed else 0:,.0f} rows/s).")
+    if skipped_writer.rows:
+        print(f"Skipped {skipped_writer.rows:,} rows whose appointment time could not be parsed; "
+              f"their ids are in '{skipped_file}'.")
+    peak_memory = f"Peak memory: {peak_memory_mb(resource.RUSAGE_SELF):,.0f} MB"
+    if args.workers > 1:
+        peak_memory += f" in this process, {peak_memory_mb(resource.RUSAGE_CHILDREN):,.0f} MB in the largest worker"
+    print(peak_memory + ".")
+    if writer.rows:
+        print(f"Scores saved to '{output_file}'.")
+    else:
+        print(f"No appointment could be scored; wrote an empty table to '{output_file}'.")
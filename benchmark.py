@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_DIR)
+
+from table_io import EXTENSIONS, DEFAULT_FORMAT, read_table
+
+WORK_DIR = os.path.join('output', 'benchmark')
+REPORT_FILE = os.path.join('output', 'benchmark_report.json')
+FEATURES_FILE = os.path.join('output', 'final_features_and_eda')
+
+# name -> command run from the benchmark's data directory
+STAGES = {
+    'analysis': ['analysis.py'],
+    'features': ['feature_engineering_eda.py'],
+    'train_logistic': ['model_training.py'],
+    'train_rf': ['model_training_rf.py'],
+    'score': ['batch_score.py', FEATURES_FILE, '--output', os.path.join('output', 'scores')],
+}
+TABLE_STAGES = {'analysis', 'features', 'score'}
+
+
+def run_measured(command, cwd, log_file):
+    """
+    Runs a command and returns its exit code, wall time, CPU time and peak
+    resident memory (MB), as reported by the kernel for that process.
+    """
+    with open(log_file, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak_rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return {
+        'returncode': process.returncode,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime, 3),
+        'peak_rss_mb': round(peak_rss, 1),
+    }
+
+
+def table_rows(data_dir, stem):
+    """Number of rows of a table, reading a single column."""
+    return len(read_table(os.path.join(data_dir, stem), columns=['PATIENT_ODU_ID']))
+
+
+def prepare_data(size, work_dir, seed, regenerate=False):
+    """Generates (or reuses) the synthetic input files for one size."""
+    from synthetic_data import generate
+
+    data_dir = os.path.join(work_dir, f'{size}')
+    marker = os.path.join(data_dir, 'synthetic.json')
+    params = {'appointments': size, 'seed': seed}
+    if not regenerate and os.path.exists(marker):
+        with open(marker) as f:
+            saved = json.load(f)
+        if saved['params'] == params:
+            return data_dir, saved['counts']
+
+    counts = generate(data_dir, size, seed=seed, template_file=os.path.join(PROJECT_DIR, 'Apointment_clean.csv'))
+    os.makedirs(os.path.join(data_dir, 'output'), exist_ok=True)
+    with open(marker, 'w') as f:
+        json.dump({'params': params, 'counts': counts}, f)
+    return data_dir, counts
+
+
+def benchmark_size(size, stages, args):
+    data_dir, counts = prepare_data(size, args.work_dir, args.seed, args.regenerate)
+    results = []
+    for stage in stages:
+        command = [sys.executable, os.path.join(PROJECT_DIR, STAGES[stage][0])] + STAGES[stage][1:]
+        if stage in TABLE_STAGES:
+            command += ['--format', args.format]
+        if stage == 'analysis' and args.chunksize:
+            command += ['--chunksize', str(args.chunksize)]
+
+        print(f"[{size:,}] {stage}...", end=' ', flush=True)
+        measured = run_measured(command, data_dir, os.path.join(data_dir, f'{stage}.log'))
+
+        if stage == 'analysis':
+            rows = counts['appointments'] + counts['transactions']
+        elif stage == 'features':
+            rows = table_rows(data_dir, 'analysis_results')
+        else:
+            rows = table_rows(data_dir, FEATURES_FILE)
+
+        result = {'size': size, 'stage': stage, 'rows': rows, **measured,
+                  'rows_per_s': round(rows / measured['wall_s'], 1) if measured['wall_s'] else None}
+        results.append(result)
+        if measured['returncode'] != 0:
+            print(f"FAILED (exit code {measured['returncode']}, see {data_dir}/{stage}.log)")
+            break
+        print(f"{measured['wall_s']:.1f}s, {measured['peak_rss_mb']:.0f} MB peak, {result['rows_per_s']:,.0f} rows/s")
+    return results
+
+
+def environment():
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except ImportError:
+            return None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': {name: version(name) for name in ['numpy', 'pandas', 'sklearn', 'pyarrow']},
+    }
+
+
+def compare_reports(base_file, new_file):
+    """Prints the change in wall time, peak memory and throughput per size and stage."""
+    with open(base_file) as f:
+        base = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    base_results = {(r['size'], r['stage']): r for r in base['results']}
+
+    print(f"Base: {base['environment'].get('commit')}  New: {new['environment'].get('commit')}")
+    print(f"{'size':>12} {'stage':<16} {'wall (s)':>20} {'peak RSS (MB)':>22} {'rows/s':>10}")
+    for result in new['results']:
+        old = base_results.get((result['size'], result['stage']))
+        if old is None or old['returncode'] != 0 or result['returncode'] != 0:
+            continue
+        wall_change = result['wall_s'] / old['wall_s'] - 1 if old['wall_s'] else 0
+        rss_change = result['peak_rss_mb'] / old['peak_rss_mb'] - 1 if old['peak_rss_mb'] else 0
+        speedup = result['rows_per_s'] / old['rows_per_s'] if old['rows_per_s'] else float('nan')
+        print(f"{result['size']:>12,} {result['stage']:<16} "
+              f"{old['wall_s']:>7.2f} -> {result['wall_s']:>7.2f} ({wall_change:+.0%}) "
+              f"{old['peak_rss_mb']:>7.0f} -> {result['peak_rss_mb']:>7.0f} ({rss_change:+.0%}) "
+              f"{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark every pipeline stage on synthetic data sets of increasing size.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000],
+                        help="Numbers of synthetic appointments to benchmark with (default: 100000).")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--format', choices=list(EXTENSIONS), default=DEFAULT_FORMAT,
+                        help="File format for the intermediate tables.")
+    parser.add_argument('--chunksize', type=int, default=None, help="Passed on to analysis.py.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=WORK_DIR, help="Where the synthetic data and stage outputs go.")
+    parser.add_argument('--regenerate', action='store_true', help="Regenerate the synthetic data even if it exists.")
+    parser.add_argument('--report', default=REPORT_FILE, help="JSON report to write.")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Compare two reports and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        sys.exit(0)
+
+    args.work_dir = os.path.abspath(args.work_dir)
+    results = []
+    for size in args.sizes:
+        results += benchmark_size(size, args.stages, args)
+
+    report = {
+        'environment': environment(),
+        'options': {'format': args.format, 'chunksize': args.chunksize, 'seed': args.seed},
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {args.report}")
@@ -0,0 +1,159 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from table_io import read_table
+
+INPUT_FILE = os.path.join('output', 'final_features_and_eda')
+OUTPUT_DIR = 'output'
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def rate_table(sums, counts):
+    """No-show rate per group with the half-width of its 95% confidence interval."""
+    rate = sums / counts
+    with np.errstate(invalid="ignore"):
+        ci = 1.96 * np.sqrt(rate * (1 - rate) / counts)
+    return pd.DataFrame({"NO_SHOW": rate, "CI": ci, "COUNT": counts})
+
+
+def compute_aggregates(df):
+    """
+    Everything the plots need, computed once from the feature dataset.
+
+    The day and hour rates are rolled up from a single day x hour groupby of
+    no-show sums and counts, which also gives the heatmap. The plots only
+    receive these small tables (and the clipped lead times for the histogram),
+    so the workers don't need the full dataset.
+    """
+    no_show = df["NO_SHOW"].astype(float)
+    by_day_hour = (
+        no_show.groupby([df["DAY_OF_WEEK"], df["HOUR_OF_DAY"]], observed=True)
+        .agg(["sum", "count"])
+    )
+    by_day = by_day_hour.groupby(level="DAY_OF_WEEK").sum()
+    by_hour = by_day_hour.groupby(level="HOUR_OF_DAY").sum().sort_index()
+
+    day_rates = rate_table(by_day["sum"], by_day["count"]).reindex(
+        [day for day in DAY_ORDER if day in by_day.index])
+    hour_rates = rate_table(by_hour["sum"], by_hour["count"])
+    heatmap = (by_day_hour["sum"] / by_day_hour["count"]).unstack("HOUR_OF_DAY").sort_index()
+
+    return {
+        "day_rates": day_rates,
+        "hour_rates": hour_rates,
+        "heatmap": heatmap,
+        "lead_times": df["LEAD_TIME_HOURS"].clip(0, 1000).dropna().to_numpy(),
+    }
+
+
+def _new_figure(figsize):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt, plt.figure(figsize=figsize)
+
+
+def _save(plt, path):
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close("all")
+    return path
+
+
+def plot_rate_bars(rates, title, path, figsize, rotate_labels=False):
+    plt, _ = _new_figure(figsize)
+    import seaborn as sns
+    labels = [str(label) for label in rates.index]
+    ax = sns.barplot(x=labels, y=rates["NO_SHOW"].to_numpy(), errorbar=None)
+    ax.errorbar(range(len(labels)), rates["NO_SHOW"].to_numpy(), yerr=rates["CI"].to_numpy(),
+                fmt="none", ecolor="#3f3f3f", elinewidth=2.5)
+    ax.set_xlabel(rates.index.name)
+    ax.set_ylabel("NO_SHOW")
+    plt.title(title)
+    if rotate_labels:
+        plt.xticks(rotation=45)
+    return _save(plt, path)
+
+
+def plot_lead_time_distribution(lead_times, path):
+    plt, _ = _new_figure((10, 6))
+    import seaborn as sns
+    sns.histplot(lead_times, bins=50, kde=True)
+    plt.xlabel("LEAD_TIME_HOURS")
+    plt.title("Distribution of Lead Time (Hours, clipped at 1000)")
+    return _save(plt, path)
+
+
+def plot_heatmap(pivot, path):
+    plt, _ = _new_figure((14, 8))
+    import seaborn as sns
+    sns.heatmap(pivot, cmap="Reds", annot=True, fmt=".2f")
+    plt.title("No-show Rate by Day and Hour")
+    return _save(plt, path)
+
+
+def print_summary(df, aggregates):
+    # Missing values
+    print("\n--- Missing Values ---")
+    missing_values = df.isnull().sum().sort_values(ascending=False)
+    print(missing_values[missing_values > 0])
+
+    # Summary stats
+    print("\n--- Summary Statistics ---")
+    print(df.describe(include="all"))
+
+    # Grouped no-show rates
+    print("\n--- Grouped No-Show Rates ---")
+    print("\nBy Schedule Type:")
+    print(df.groupby("PIMS_SCHEDULE_TYPE", dropna=False, observed=True)["NO_SHOW"].mean().reset_index())
+    print("\nBy Day of Week:")
+    print(aggregates["day_rates"]["NO_SHOW"].sort_index().reset_index())
+    print("\nBy Hour of Day:")
+    print(aggregates["hour_rates"]["NO_SHOW"].reset_index())
+    print("\nBy Practice Name:")
+    print(df.groupby("PRACTICE_NAME", observed=True)["NO_SHOW"].mean().reset_index())
+
+    # Correlation between lead time and no-show
+    corr = df["LEAD_TIME_HOURS"].corr(df["NO_SHOW"].astype(float))
+    print(f"\nCorrelation between lead time and no-show: {corr:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the EDA summary and render the EDA plots from the feature dataset.")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Number of processes rendering plots (default: one per CPU, at most 4).")
+    parser.add_argument('--no-summary', action='store_true',
+                        help="Only render the plots, skip the printed summary statistics.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print("Loading the feature dataset...")
+    df = read_table(INPUT_FILE)
+    aggregates = compute_aggregates(df)
+
+    jobs = [
+        (plot_rate_bars, aggregates["day_rates"], "No-show Rate by Day of Week",
+         os.path.join(OUTPUT_DIR, "noshow_by_day.png"), (10, 6), True),
+        (plot_rate_bars, aggregates["hour_rates"], "No-show Rate by Hour of Day",
+         os.path.join(OUTPUT_DIR, "noshow_by_hour.png"), (12, 6)),
+        (plot_lead_time_distribution, aggregates["lead_times"],
+         os.path.join(OUTPUT_DIR, "lead_time_distribution.png")),
+        (plot_heatmap, aggregates["heatmap"], os.path.join(OUTPUT_DIR, "noshow_heatmap.png")),
+    ]
+
+    # Plots render in worker processes while the summary is printed here
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(*job) for job in jobs]
+        if not args.no_summary:
+            print_summary(df, aggregates)
+        print("\nGenerating and saving visualizations...")
+        for future in futures:
+            print(f"Saved {os.path.basename(future.result())}")
+
+    print(f"\nEDA report complete in {time.perf_counter() - start:.1f}s.")
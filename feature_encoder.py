@@ -0,0 +1,120 @@
+import numpy as np
+import joblib
+
+# The original numerical features the scaler was trained on
+NUMERICAL_FEATURES = [
+    'LEAD_TIME_HOURS',
+    'DURATION_MIN',
+    'DAYS_SINCE_LAST_APPT',
+    'PAST_NOSHOW_RATE',
+    'RESOURCE_NOSHOW_RATE',
+    'PRACTICE_NOSHOW_RATE'
+]
+
+# Features that were one-hot encoded with pd.get_dummies during training
+CATEGORICAL_FEATURES = [
+    'DAY_OF_WEEK',
+    'HOUR_OF_DAY',
+    'APPOINTMENT_TYPE',
+    'IS_WEEKEND'
+]
+
+
+class FeatureEncoder:
+    """
+    Turns raw appointment features into the model's input matrix.
+
+    This replaces the per-request pd.get_dummies + reindex + scaler.transform
+    sequence. The one-hot layout is taken from model_columns (a dummy column
+    named 'HOUR_OF_DAY_10' maps the category ('HOUR_OF_DAY', '10') to its
+    column index) and the scaler is reduced to its mean and scale vectors, so
+    encoding only writes values into a preallocated float32 matrix.
+
+    Missing numerical values are filled with 0 before scaling, as in training.
+    Categories that were not seen in training (or dropped by drop_first)
+    leave all their dummy columns at 0, like reindex(fill_value=0) did.
+    """
+
+    def __init__(self, model_columns, scaler, numerical_features=NUMERICAL_FEATURES,
+                 categorical_features=CATEGORICAL_FEATURES):
+        self.model_columns = list(model_columns)
+        self.numerical_features = list(numerical_features)
+        self.categorical_features = list(categorical_features)
+        self.n_features = len(self.model_columns)
+
+        column_index = {col: i for i, col in enumerate(self.model_columns)}
+        self.numerical_index = np.array([column_index[col] for col in self.numerical_features], dtype=np.intp)
+
+        self.mean = scaler.mean_.astype(np.float64) if scaler.with_mean else np.zeros(len(self.numerical_features))
+        self.scale = scaler.scale_.astype(np.float64) if scaler.with_std else np.ones(len(self.numerical_features))
+
+        # {feature: {category as str: column index}}
+        self.category_index = {feature: {} for feature in self.categorical_features}
+        # Raw feature behind each model column, e.g. 'HOUR_OF_DAY' for 'HOUR_OF_DAY_10'
+        self.column_features = list(self.model_columns)
+        for col, i in column_index.items():
+            for feature in self.categorical_features:
+                prefix = feature + '_'
+                if col.startswith(prefix):
+                    self.category_index[feature][col[len(prefix):]] = i
+                    self.column_features[i] = feature
+                    break
+
+    @classmethod
+    def from_files(cls, columns_file, scaler_file):
+        return cls(joblib.load(columns_file), joblib.load(scaler_file))
+
+    def _scale(self, values):
+        values = np.where(np.isnan(values), 0.0, values)
+        return (values - self.mean) / self.scale
+
+    def transform_records(self, records, out=None):
+        """
+        Encodes a list of record dicts. Missing keys are treated like missing values.
+        Pass `out` to reuse a preallocated (len(records), n_features) float32 matrix.
+        """
+        n = len(records)
+        if out is None:
+            out = np.zeros((n, self.n_features), dtype=np.float32)
+        else:
+            out[:n] = 0
+
+        numeric = np.empty((n, len(self.numerical_features)), dtype=np.float64)
+        for row, record in enumerate(records):
+            for j, feature in enumerate(self.numerical_features):
+                value = record.get(feature)
+                numeric[row, j] = np.nan if value is None else value
+            for feature, index in self.category_index.items():
+                value = record.get(feature)
+                if value is not None:
+                    col = index.get(str(value))
+                    if col is not None:
+                        out[row, col] = 1.0
+
+        out[:n, self.numerical_index] = self._scale(numeric)
+        return out
+
+    def transform_one(self, record):
+        """Encodes a single record dict into a (1, n_features) matrix."""
+        return self.transform_records([record])
+
+    def transform_frame(self, df, out=None):
+        """Encodes every row of a DataFrame that has the raw feature columns."""
+        n = len(df)
+        if out is None:
+            out = np.zeros((n, self.n_features), dtype=np.float32)
+        else:
+            out[:n] = 0
+
+        numeric = df[self.numerical_features].to_numpy(dtype=np.float64, na_value=np.nan)
+        out[:n, self.numerical_index] = self._scale(numeric)
+
+        rows = np.arange(n)
+        for feature, index in self.category_index.items():
+            values = df[feature]
+            # Missing values stay missing instead of becoming the string 'nan'
+            labels = values.astype(str).where(values.notna())
+            cols = labels.map(index).to_numpy(dtype=np.float64, na_value=np.nan)
+            known = ~np.isnan(cols)
+            out[rows[known], cols[known].astype(np.intp)] = 1.0
+        return out
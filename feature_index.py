@@ -0,0 +1,227 @@
+"""
+Lookup index of the latest per-patient, resource and practice statistics,
+used to fill in the history features of a newly booked appointment from
+its ids.
+
+The index is built from the feature dataset and saved next to it by
+feature_engineering_eda.py and incremental_update.py. Every table is a
+plain dict, so hydrating an appointment is a handful of hash lookups:
+
+- patients: id -> (appointments, no-shows, last appointment time), the
+  totals PatientHistory keeps, giving DAYS_SINCE_LAST_APPT and
+  PAST_NOSHOW_RATE;
+- resources: id -> (RESOURCE_NOSHOW_RATE, practice id), so the practice can
+  be inferred from the resource;
+- practices: id -> PRACTICE_NOSHOW_RATE;
+- durations: appointment type -> median DURATION_MIN, used when the
+  duration isn't given.
+
+Ids that are not in the index get missing values, which the encoder treats
+as 0 like training does for a first appointment.
+"""
+import os
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from appointment_features import GROUP_RATES, PRACTICE_KEY
+from patient_history import PatientHistory, PATIENT_KEY
+from table_io import read_table
+
+INDEX_FILE = os.path.join('output', 'feature_index.joblib')
+FEATURES_FILE = os.path.join('output', 'final_features_and_eda')
+RESOURCE_KEY = 'RESOURCE_ODU_ID'
+INDEX_COLUMNS = [PATIENT_KEY, RESOURCE_KEY, PRACTICE_KEY, 'APPOINTMENT_DATETIME', 'APPOINTMENT_TYPE',
+                 'DURATION_MIN', 'NO_SHOW']
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def appointment_record(appointment_datetime, appointment_type, created_at=None, duration_min=None):
+    """The raw features that only depend on the appointment itself: lead time, duration and calendar."""
+    weekday = appointment_datetime.weekday()
+    return {
+        'LEAD_TIME_HOURS': ((appointment_datetime - created_at).total_seconds() / 3600
+                            if created_at is not None else None),
+        'DURATION_MIN': duration_min,
+        'DAY_OF_WEEK': DAY_NAMES[weekday],
+        'HOUR_OF_DAY': appointment_datetime.hour,
+        'APPOINTMENT_TYPE': appointment_type,
+        'IS_WEEKEND': weekday >= 5,
+    }
+
+
+def _take(values, rows, fill=np.nan):
+    """values[rows], with `fill` where a row is -1 (not in the index)."""
+    out = np.full(len(rows), fill, dtype=values.dtype)
+    found = rows >= 0
+    out[found] = values[rows[found]]
+    return out
+
+
+def _rates(df, key):
+    """{id: no-show rate over all its appointments}, as add_group_rates computes it."""
+    rates = df.groupby(key)['NO_SHOW'].mean()
+    return dict(zip(rates.index.astype(str), rates.to_numpy(dtype=float).tolist()))
+
+
+class FeatureIndex:
+    """Latest history statistics by patient, resource and practice id (see the module docstring)."""
+
+    def __init__(self, patients, resources, practices, durations, built_at=None):
+        self.patients = patients
+        self.resources = resources
+        self.practices = practices
+        self.durations = durations
+        self.built_at = built_at or datetime.now().isoformat(timespec='seconds')
+        self._arrays = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds the index from a featurized (or just labeled) appointment frame."""
+        df = df.assign(APPOINTMENT_DATETIME=pd.to_datetime(df['APPOINTMENT_DATETIME']),
+                       NO_SHOW=df['NO_SHOW'].astype(bool))
+        state = PatientHistory.from_frame(df).state
+        patients = dict(zip(
+            state.index.astype(str),
+            zip(state['APPT_COUNT'].tolist(), state['NOSHOW_COUNT'].tolist(),
+                state['LAST_APPT_DATETIME'].dt.to_pydatetime().tolist()),
+        ))
+
+        resource_rates = _rates(df, RESOURCE_KEY)
+        resource_practice = df.dropna(subset=[RESOURCE_KEY]).groupby(RESOURCE_KEY)[PRACTICE_KEY].last()
+        practice_of = dict(zip(resource_practice.index.astype(str), resource_practice.astype(object).tolist()))
+        resources = {resource: (rate, practice_of.get(resource)) for resource, rate in resource_rates.items()}
+
+        durations = df.groupby(df['APPOINTMENT_TYPE'].astype(str))['DURATION_MIN'].median().dropna()
+        return cls(patients, resources, _rates(df, GROUP_RATES['PRACTICE_NOSHOW_RATE']),
+                   durations.to_dict())
+
+    @classmethod
+    def from_table(cls, path=FEATURES_FILE):
+        return cls.from_frame(read_table(path, columns=INDEX_COLUMNS))
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        stored = joblib.load(path)
+        patients = stored['patients']
+        resources = stored['resources']
+        return cls(
+            dict(zip(patients['id'], zip(patients['appointments'].tolist(), patients['noshows'].tolist(),
+                                         patients['last'].astype('datetime64[us]').tolist()))),
+            dict(zip(resources['id'], zip(resources['rate'].tolist(), resources['practice']))),
+            dict(zip(stored['practices']['id'], stored['practices']['rate'].tolist())),
+            stored['durations'], stored['built_at'],
+        )
+
+    def save(self, path=INDEX_FILE):
+        """
+        Stores the tables as columns (id lists and NumPy arrays) rather than
+        dicts of tuples, which pickle an object per value and load several
+        times slower. The file is replaced atomically, so the API never
+        loads a half-written index.
+        """
+        tmp = f'{path}.{os.getpid()}.tmp'
+        appointments, noshows, last = zip(*self.patients.values()) if self.patients else ((), (), ())
+        rates, practices = zip(*self.resources.values()) if self.resources else ((), ())
+        joblib.dump({
+            'patients': {'id': list(self.patients), 'appointments': np.array(appointments, dtype=np.int64),
+                         'noshows': np.array(noshows, dtype=np.int64),
+                         'last': np.array(last, dtype='datetime64[us]')},
+            'resources': {'id': list(self.resources), 'rate': np.array(rates, dtype=float),
+                          'practice': list(practices)},
+            'practices': {'id': list(self.practices), 'rate': np.array(list(self.practices.values()), dtype=float)},
+            'durations': self.durations,
+            'built_at': self.built_at,
+        }, tmp)
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.patients)
+
+    def history(self, patient_id=None, resource_id=None, practice_id=None, appointment_datetime=None):
+        """
+        DAYS_SINCE_LAST_APPT, PAST_NOSHOW_RATE, RESOURCE_NOSHOW_RATE and
+        PRACTICE_NOSHOW_RATE for an appointment of these ids. Without a
+        practice id, the resource's practice is used.
+        """
+        days_since = past_rate = None
+        patient = self.patients.get(patient_id)
+        if patient is not None:
+            count, noshows, last = patient
+            past_rate = noshows / count if count else None
+            if appointment_datetime is not None:
+                days_since = (appointment_datetime - last).days
+
+        resource_rate, resource_practice = self.resources.get(resource_id, (None, None))
+        return {
+            'DAYS_SINCE_LAST_APPT': days_since,
+            'PAST_NOSHOW_RATE': past_rate,
+            'RESOURCE_NOSHOW_RATE': resource_rate,
+            'PRACTICE_NOSHOW_RATE': self.practices.get(practice_id or resource_practice),
+        }
+
+    def features(self, appointment_datetime, appointment_type, patient_id=None, resource_id=None,
+                 practice_id=None, created_at=None, duration_min=None):
+        """
+        All the model's raw features for a new appointment: the history
+        statistics looked up by id and appointment_record(). Without a
+        duration, the median of the appointment type is used.
+        """
+        if duration_min is None:
+            duration_min = self.durations.get(appointment_type)
+        record = self.history(patient_id, resource_id, practice_id, appointment_datetime)
+        record.update(appointment_record(appointment_datetime, appointment_type, created_at, duration_min))
+        return record
+
+    def _frame_tables(self):
+        """The dicts as pandas indexes and aligned arrays, built on first use by hydrate_frame."""
+        if self._arrays is None:
+            appointments, noshows, last = zip(*self.patients.values()) if self.patients else ((), (), ())
+            rates, practices = zip(*self.resources.values()) if self.resources else ((), ())
+            self._arrays = {
+                'patients': pd.Index(list(self.patients), dtype=object),
+                'appointments': np.array(appointments, dtype=float),
+                'noshows': np.array(noshows, dtype=float),
+                'last': np.array(last, dtype='datetime64[us]'),
+                'resources': pd.Index(list(self.resources), dtype=object),
+                'resource_rates': np.array(rates, dtype=float),
+                'resource_practices': np.array(practices, dtype=object),
+                'practices': pd.Index(list(self.practices), dtype=object),
+                'practice_rates': np.array(list(self.practices.values()), dtype=float),
+            }
+        return self._arrays
+
+    def hydrate_frame(self, df):
+        """
+        history() for every row of a frame with APPOINTMENT_DATETIME and the
+        id columns (any of them may be missing), with array lookups instead
+        of one dict lookup per row. A missing DURATION_MIN is filled with the
+        median of the appointment type. Returns the frame with the features added.
+        """
+        tables = self._frame_tables()
+
+        def rows_of(index, values):
+            return index.get_indexer(values.astype(object))
+
+        def column(name):
+            return df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+        patients = rows_of(tables['patients'], column(PATIENT_KEY))
+        last = pd.Series(_take(tables['last'], patients, np.datetime64('NaT')), index=df.index)
+        df['DAYS_SINCE_LAST_APPT'] = (df['APPOINTMENT_DATETIME'] - last).dt.days
+        appointments = _take(tables['appointments'], patients)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df['PAST_NOSHOW_RATE'] = np.where(appointments > 0, _take(tables['noshows'], patients) / appointments,
+                                              np.nan)
+
+        resources = rows_of(tables['resources'], column(RESOURCE_KEY))
+        df['RESOURCE_NOSHOW_RATE'] = _take(tables['resource_rates'], resources)
+        practice = column(PRACTICE_KEY).astype(object)
+        practice = practice.where(practice.notna(), _take(tables['resource_practices'], resources, None))
+        df['PRACTICE_NOSHOW_RATE'] = _take(tables['practice_rates'], rows_of(tables['practices'], practice))
+
+        typical = df['APPOINTMENT_TYPE'].astype(object).map(self.durations)
+        df['DURATION_MIN'] = df['DURATION_MIN'].fillna(typical) if 'DURATION_MIN' in df.columns else typical
+        return df
@@ -0,0 +1,268 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+
+OUTPUT_DIR = 'output'
+MODEL_FILE = os.path.join(OUTPUT_DIR, 'noshow_model_rf.joblib')
+FLAT_MODEL_FILE = os.path.join(OUTPUT_DIR, 'noshow_model_rf_flat.npz')
+
+
+class FlatForest:
+    """
+    A RandomForestClassifier packed into contiguous NumPy arrays.
+
+    All trees are concatenated node by node: `feature`, `threshold`, `left`
+    and `right` are indexed by a global node id, `roots[t]` is the root of
+    tree t and `value[n]` holds the class probabilities of leaf n. Child ids
+    are global too, and leaves have left == right == -1.
+
+    predict_proba walks every (sample, tree) pair one level per iteration
+    with vectorized gathers, so scoring a batch costs at most `max_depth`
+    rounds of NumPy operations instead of a Python/joblib round trip per
+    tree. Decisions use the same float32-input/float64-threshold comparison
+    as sklearn, so the probabilities match the original model up to
+    summation order. This is fastest for single rows and small batches;
+    for very large batches sklearn's compiled, multi-threaded traversal wins.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_go_to_left,
+                 roots, classes, max_depth, n_features=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_go_to_left = missing_go_to_left
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_estimators = len(roots)
+        if n_features is None:
+            n_features = int(feature.max()) + 1 if len(feature) else 0
+        self.n_features_in_ = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Packs the trees of a fitted RandomForestClassifier."""
+        features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            if tree.n_outputs != 1:
+                raise ValueError("Only single-output forests can be flattened.")
+
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            # Leaves get feature 0 so the gather in predict_proba stays in bounds
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int32))
+
+            proba = tree.value[:, 0, :].astype(np.float64)
+            proba /= proba.sum(axis=1, keepdims=True)
+            values.append(proba)
+
+            if hasattr(tree, 'missing_go_to_left'):
+                missing.append(tree.missing_go_to_left.astype(bool))
+            else:
+                missing.append(np.zeros(tree.node_count, dtype=bool))
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            missing_go_to_left=np.concatenate(missing),
+            roots=np.array(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+        )
+
+    def compact(self):
+        """
+        A smaller forest that makes exactly the same predictions.
+
+        - Splits whose two children are leaves with identical values decide
+          nothing; they are collapsed into a leaf, repeatedly, so whole
+          subtrees with a single outcome become one leaf. The nodes that are
+          no longer reachable are dropped and the ids renumbered.
+        - Thresholds are stored as float32. Inputs are float32, so rounding
+          each float64 threshold down to the nearest float32 keeps every
+          `x <= threshold` decision unchanged.
+        - Feature ids are stored as int16 when there are few enough features.
+
+        Contributions are unchanged too: a collapsed split moved the
+        probability by zero.
+        """
+        left, right, value = self.left.copy(), self.right.copy(), self.value.copy()
+        while True:
+            internal = np.flatnonzero(left != -1)
+            lchild, rchild = left[internal], right[internal]
+            redundant = ((left[lchild] == -1) & (left[rchild] == -1)
+                         & np.all(value[lchild] == value[rchild], axis=1))
+            if not redundant.any():
+                break
+            nodes = internal[redundant]
+            value[nodes] = value[lchild[redundant]]
+            left[nodes] = right[nodes] = -1
+
+        keep = np.zeros(len(left), dtype=bool)
+        frontier = self.roots
+        while frontier.size:
+            keep[frontier] = True
+            frontier = frontier[left[frontier] != -1]
+            frontier = np.concatenate([left[frontier], right[frontier]])
+        new_id = np.cumsum(keep, dtype=np.int64) - 1
+        is_leaf = left[keep] == -1
+
+        threshold = self.threshold[keep]
+        threshold32 = threshold.astype(np.float32)
+        above = threshold32.astype(np.float64) > threshold
+        threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+
+        feature_dtype = np.int16 if self.n_features_in_ <= np.iinfo(np.int16).max else np.int32
+        return FlatForest(
+            feature=np.where(is_leaf, 0, self.feature[keep]).astype(feature_dtype),
+            threshold=threshold32,
+            left=np.where(is_leaf, -1, new_id[left[keep]]).astype(np.int32),
+            right=np.where(is_leaf, -1, new_id[right[keep]]).astype(np.int32),
+            value=value[keep],
+            missing_go_to_left=self.missing_go_to_left[keep],
+            roots=new_id[self.roots].astype(np.int32),
+            classes=self.classes_,
+            max_depth=self.max_depth,
+            n_features=self.n_features_in_,
+        )
+
+    def arrays(self):
+        """The arrays that make up the forest, by name."""
+        return {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'missing_go_to_left': self.missing_go_to_left,
+            'roots': self.roots,
+        }
+
+    def save(self, path):
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            missing_go_to_left=self.missing_go_to_left,
+            roots=self.roots,
+            classes=self.classes_,
+            max_depth=np.array(self.max_depth),
+            # Columns no tree splits on can't be inferred from `feature`
+            n_features=np.array(self.n_features_in_),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def _descend(self, X):
+        """
+        Walks all (sample, tree) pairs down one level per step. Yields the
+        sample row, parent node and child node of every pair that moved,
+        and finally returns the leaf reached by each pair, flattened
+        sample-major.
+        """
+        n_samples = X.shape[0]
+        node = np.tile(self.roots, n_samples)
+        # Row of X for every (sample, tree) pair
+        rows = np.repeat(np.arange(n_samples, dtype=np.intp), self.n_estimators)
+
+        # Only pairs that have not reached a leaf yet are advanced, so later
+        # levels get cheaper as shallow branches finish.
+        active = np.flatnonzero(self.left[node] != -1)
+        while active.size:
+            current = node[active]
+            x = X[rows[active], self.feature[current]]
+            go_left = (x <= self.threshold[current]) | (np.isnan(x) & self.missing_go_to_left[current])
+            child = np.where(go_left, self.left[current], self.right[current])
+            yield rows[active], current, child
+            node[active] = child
+            active = active[self.left[child] != -1]
+        return node
+
+    def apply(self, X):
+        """Returns the leaf id reached by each sample in each tree, shape (n_samples, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        steps = self._descend(X)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value.reshape(X.shape[0], self.n_estimators)
+
+    def predict_contributions(self, X, class_index=-1):
+        """
+        Splits the predicted probability of `classes_[class_index]` into a
+        bias term and one contribution per feature, computed for the whole
+        batch in a single traversal.
+
+        Every split on the path to a leaf moves the probability from the
+        parent's value to the child's; that change is credited to the feature
+        the parent split on, then averaged over all trees. For each sample,
+        bias + contributions.sum() equals predict_proba(X)[:, class_index].
+        Returns (probabilities, bias, contributions): probabilities is exactly
+        predict_proba(X) and contributions has shape (n_samples, n_features).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        value = self.value[:, class_index]
+
+        contributions = np.zeros(n_samples * n_features)
+        steps = self._descend(X)
+        while True:
+            try:
+                rows, parent, child = next(steps)
+            except StopIteration as done:
+                leaves = done.value.reshape(n_samples, self.n_estimators)
+                break
+            contributions += np.bincount(
+                rows * n_features + self.feature[parent],
+                weights=value[child] - value[parent],
+                minlength=n_samples * n_features,
+            )
+
+        probabilities = self.value[leaves].mean(axis=1)
+        bias = value[self.roots].mean()
+        return probabilities, bias, contributions.reshape(n_samples, n_features) / self.n_estimators
+
+    def predict_proba(self, X):
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def export_forest(model_file=MODEL_FILE, flat_model_file=FLAT_MODEL_FILE):
+    """Flattens a saved RandomForestClassifier into the .npz format used by the API."""
+    forest = FlatForest.from_sklearn(joblib.load(model_file))
+    forest.save(flat_model_file)
+    return forest
+
+
+if __name__ == "__main__":
+    model_file = sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE
+    flat_model_file = sys.argv[2] if len(sys.argv) > 2 else FLAT_MODEL_FILE
+    print(f"Flattening {model_file}...")
+    forest = export_forest(model_file, flat_model_file)
+    print(f"Flat model with {forest.n_estimators} trees and {len(forest.feature)} nodes saved to {flat_model_file}")
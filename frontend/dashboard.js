@@ -59,6 +59,10 @@ document.addEventListener('DOMContentLoaded', () => {
                 <h3>No-Show Rate</h3>
                 <p>${summary.noshow_rate}%</p>
             </div>
+            <div class="card">
+                <h3>Top Risk Factor</h3>
+                <p>${summary.top_risk_factors}</p>
+            </div>
         `;
     }
 
@@ -17,11 +17,14 @@ document.addEventListener('DOMContentLoaded', () => {
         const data = {
             appointment_date: formData.get('appointment_date'),
             appointment_time: formData.get('appointment_time'),
-            past_noshow_rate: parseFloat(formData.get('past_noshow_rate')),
-            days_since_last_appt: parseInt(formData.get('days_since_last_appt')),
             duration_min: parseInt(formData.get('duration_min')),
             appointment_type: formData.get('appointment_type'),
-            doctor: formData.get('doctor'),
+            // The API looks up the patient's history and the resource's and
+            // practice's no-show rates from the IDs
+            patient_id: formData.get('patient_id').trim() || null,
+            resource_id: formData.get('resource_id').trim() || null,
+            // Booked now, in local time like the appointment time
+            created_at: localDateTime(new Date()),
         };
 
         // Basic validation
@@ -65,6 +68,11 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    function localDateTime(date) {
+        const local = new Date(date.getTime() - date.getTimezoneOffset() * 60000);
+        return local.toISOString().slice(0, 19);
+    }
+
     function displayResult(result) {
         resultContainer.classList.remove('hidden');
         const probabilityPercent = Math.round(result.no_show_probability * 100);
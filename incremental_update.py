@@ -0,0 +1,271 @@
+"""
+Incremental ingestion of new and updated appointments and transactions.
+
+Instead of re-running analysis.py and feature_engineering_eda.py over the
+whole history, delta files are folded into the tables those scripts
+persisted (analysis_results, output/transaction_aggregates and
+output/final_features_and_eda):
+
+- appointments are upserted on (APPOINTMENT_ODU_ID, ODU_UPDATED_AT_UTC): a
+  row replaces the stored row with the same id if its update time is newer
+  than that row's, and is added if the id is new. Late rows (stamped before
+  other, newer appointments) are applied as long as they are newer than
+  their own stored version; older versions, and rows of stored ids whose
+  update time can't be parsed, are skipped and counted;
+- transactions whose id was not ingested before are added to the aggregates
+  of their patient-day;
+- the NO_SHOW label is recomputed for the upserted appointments and for the
+  stored appointments on patient-days that got new transactions;
+- patient history is recomputed only for the patients of those appointments,
+  and the resource/practice no-show rates only for their resources and
+  practices; the feature index the API hydrates requests from is rebuilt.
+
+    python incremental_update.py --appointments delta_appointments.csv --transactions delta_transactions.csv
+
+The delta files have the columns of Apointment_clean.csv and
+Transaction_clean.csv and either may be left out. A full extract works too:
+rows that were already ingested are skipped, so running the same delta
+twice changes nothing. Transactions are treated as immutable once ingested
+(corrections arrive as new transactions).
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from table_io import EXTENSIONS, find_table, read_table, write_table
+from transaction_aggregation import GROUP_KEYS, aggregate_transactions, to_day
+from labeling import (read_appointments, read_transactions, read_aggregates, label_appointments,
+                      APPOINTMENT_COLUMNS, AGGREGATES_FILE, TRANSACTION_IDS_FILE)
+from appointment_features import GROUP_RATES, add_appointment_features, remove_unused_categories
+from patient_history import (add_patient_history, history_order, PatientHistory, PATIENT_KEY,
+                             STATE_FILE as PATIENT_HISTORY_FILE)
+from feature_index import FeatureIndex, INDEX_FILE as FEATURE_INDEX_FILE
+from profiling import Profiler, add_profile_arguments
+
+LABELED_FILE = 'analysis_results'
+FEATURES_FILE = os.path.join('output', 'final_features_and_eda')
+ID_COLUMNS = ['APPOINTMENT_ODU_ID', 'PATIENT_ODU_ID']
+AFFECTED_KEYS = [PATIENT_KEY] + list(GROUP_RATES.values())
+
+
+def stored_format(path):
+    """The format a table was last written in."""
+    ext = os.path.splitext(find_table(path))[1]
+    return next(fmt for fmt, known in EXTENSIONS.items() if known == ext)
+
+
+def concat_tables(frames):
+    """
+    pd.concat that keeps category columns categorical when the frames list
+    different categories (plain concat falls back to object then).
+    """
+    categorical = {col for frame in frames for col in frame.select_dtypes('category').columns}
+    df = pd.concat(frames, ignore_index=True)
+    for col in categorical:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def read_stored(path, datetime_columns):
+    """
+    Reads a persisted table with the dtypes the incremental steps compare on,
+    whichever format it was written in: parsed datetimes and the ids as
+    strings.
+    """
+    df = read_table(path)
+    for col in datetime_columns:
+        df[col] = pd.to_datetime(df[col])
+    df['APPT_DATE'] = to_day(df['APPOINTMENT_DATE'])
+    return df.astype({col: 'string' for col in ID_COLUMNS})
+
+
+def new_appointments(path, stored):
+    """
+    The appointments of a delta file that are new or newer than their stored
+    version, one row per APPOINTMENT_ODU_ID (its latest version). `stored`
+    has the APPOINTMENT_ODU_ID and ODU_UPDATED_AT_UTC of the ingested rows.
+    Returns them with the number of rows skipped because they were older
+    than the stored version (`stale`) or had no parseable update time
+    (`undated`).
+    """
+    appts = read_appointments(path).dropna(subset=['PATIENT_ODU_ID'])
+    updated = pd.to_datetime(appts['ODU_UPDATED_AT_UTC'], errors='coerce')
+    # Undated versions sort first, so a dated version of the same id wins
+    latest = appts.assign(_UPDATED=updated).sort_values('_UPDATED', kind='stable', na_position='first')
+    latest = latest.drop_duplicates('APPOINTMENT_ODU_ID', keep='last')
+
+    stored_updated = (pd.to_datetime(stored['ODU_UPDATED_AT_UTC'], errors='coerce')
+                      .groupby(stored['APPOINTMENT_ODU_ID'].astype('string')).max())
+    is_stored = latest['APPOINTMENT_ODU_ID'].isin(stored_updated.index).to_numpy()
+    previous = stored_updated.reindex(latest['APPOINTMENT_ODU_ID'].astype('string')).to_numpy()
+    current = latest['_UPDATED'].to_numpy()
+    undated = is_stored & pd.isna(current) & pd.notna(previous)
+    newer = ~is_stored | (pd.notna(current) & (pd.isna(previous) | (current > previous)))
+    stale = is_stored & pd.notna(current) & pd.notna(previous) & (current < previous)
+    skipped = {'stale': int(stale.sum()), 'undated': int(undated.sum())}
+    return latest[newer].drop(columns='_UPDATED'), skipped
+
+
+def new_transactions(path, seen):
+    """
+    The transactions of a delta file whose id is not among the `seen` hashes.
+    Returns them with the updated hashes. Transactions without an id can't
+    be told apart from ones already ingested and are skipped.
+    """
+    txns = read_transactions(path).dropna(subset=['TRANSACTION_ODU_ID'])
+    hashes = pd.util.hash_pandas_object(txns['TRANSACTION_ODU_ID'], index=False).to_numpy()
+    is_new = ~np.isin(hashes, seen) & ~pd.Series(hashes).duplicated().to_numpy()
+    return txns[is_new], np.union1d(seen, hashes[is_new])
+
+
+def fold_transactions(agg_txn, txns):
+    """
+    Adds new transactions to the per patient-day aggregates. Only the
+    patient-days they fall on are re-aggregated. Returns the aggregates and
+    those patient-days.
+    """
+    txns = txns.assign(TXN_DATE=to_day(txns['REPORTING_DATE']))
+    delta = aggregate_transactions(txns)
+    touched = pd.MultiIndex.from_frame(agg_txn[GROUP_KEYS]).isin(pd.MultiIndex.from_frame(delta[GROUP_KEYS]))
+    combined = (
+        pd.concat([agg_txn[touched], delta], ignore_index=True)
+        .groupby(GROUP_KEYS, as_index=False)
+        .agg(
+            total_amount=('total_amount', 'sum'),
+            total_qty=('total_qty', 'sum'),
+            any_inclinic=('any_inclinic', 'max'),
+            any_revenue=('any_revenue', 'max'),
+            # The ids are new, so the distinct counts add up
+            txn_count=('txn_count', 'sum'),
+        )
+    )
+    agg_txn = pd.concat([agg_txn[~touched], combined], ignore_index=True).sort_values(GROUP_KEYS, ignore_index=True)
+    return agg_txn, delta[GROUP_KEYS]
+
+
+def relabel(labeled, appts, agg_txn, touched_days):
+    """
+    Upserts `appts` into the labeled dataset and labels them, together with
+    the stored appointments on `touched_days`. Returns the labeled dataset,
+    the (re)labeled rows and the stored rows they replace.
+    """
+    replaced = labeled['APPOINTMENT_ODU_ID'].isin(appts['APPOINTMENT_ODU_ID']).to_numpy()
+    days = pd.MultiIndex.from_frame(touched_days.rename(columns={'TXN_DATE': 'APPT_DATE'}))
+    on_touched_day = pd.MultiIndex.from_frame(labeled[['PATIENT_ODU_ID', 'APPT_DATE']]).isin(days) & ~replaced
+
+    stored = labeled.loc[on_touched_day, APPOINTMENT_COLUMNS]
+    changed = label_appointments(concat_tables([stored, appts]), agg_txn)[labeled.columns]
+    removed = labeled[replaced | on_touched_day]
+    labeled = concat_tables([labeled[~(replaced | on_touched_day)], changed])
+    return labeled, changed, removed
+
+
+def update_features(features, changed, removed):
+    """
+    Replaces the feature rows of the removed appointments with the changed
+    ones, then recomputes the patient history of the patients and the no-show
+    rates of the resources and practices on either side. Returns the features
+    in the order of a full run and the affected patients.
+    """
+    affected = {key: pd.concat([changed[key], removed[key]]).unique() for key in AFFECTED_KEYS}
+    ids = pd.concat([changed['APPOINTMENT_ODU_ID'], removed['APPOINTMENT_ODU_ID']])
+    columns = features.columns
+    features = concat_tables([features[~features['APPOINTMENT_ODU_ID'].isin(ids)],
+                              add_appointment_features(changed.copy())])
+
+    patients = features[PATIENT_KEY].isin(affected[PATIENT_KEY]).to_numpy()
+    features = concat_tables([features[~patients], add_patient_history(features[patients].copy())])
+
+    for column, key in GROUP_RATES.items():
+        rows = features[key].isin(affected[key]).to_numpy()
+        features.loc[rows, column] = features[rows].groupby(key)["NO_SHOW"].transform("mean")
+
+    features = features.sort_values(history_order(features), kind='stable', ignore_index=True)
+    return remove_unused_categories(features[columns]), affected[PATIENT_KEY]
+
+
+def update_patient_history(features, patients, path=PATIENT_HISTORY_FILE):
+    """Rebuilds the running history state of `patients` only."""
+    state = PatientHistory.load(path).state if os.path.exists(path) else PatientHistory().state
+    fresh = PatientHistory.from_frame(features[features[PATIENT_KEY].isin(patients)]).state
+    state = pd.concat([state.drop(index=patients, errors='ignore'), fresh]).sort_index()
+    PatientHistory(state).save(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fold new and updated appointments and transactions into the labeled and featurized datasets.")
+    parser.add_argument('--appointments', help="Appointment delta (columns of Apointment_clean.csv).")
+    parser.add_argument('--transactions', help="Transaction delta (columns of Transaction_clean.csv).")
+    parser.add_argument('--format', choices=list(EXTENSIONS), default=None,
+                        help="File format for the updated tables (default: the format each was stored in).")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.appointments and not args.transactions:
+        parser.error("Pass --appointments and/or --transactions.")
+    profiler = Profiler.from_args(args, 'incremental_update.py', 'output/incremental_update.profile.json')
+
+    print("Loading the stored datasets...")
+    profiler.start('load')
+    try:
+        labeled = read_stored(LABELED_FILE, ['APPOINTMENT_DATE', 'APPOINTMENT_DATETIME'])
+        features = read_stored(FEATURES_FILE, ['APPOINTMENT_DATE', 'APPOINTMENT_DATETIME', 'CREATED_DATE',
+                                               'PREV_APPT_DATE'])
+        agg_txn = read_aggregates(AGGREGATES_FILE).astype({'PATIENT_ODU_ID': 'string'})
+        seen = np.load(TRANSACTION_IDS_FILE)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        print("Run analysis.py and feature_engineering_eda.py once to create the stored datasets.")
+        exit(1)
+    if 'ODU_UPDATED_AT_UTC' not in labeled.columns:
+        print("Error: analysis_results has no ODU_UPDATED_AT_UTC column. Re-run analysis.py once.")
+        exit(1)
+    last_updated = pd.to_datetime(labeled['ODU_UPDATED_AT_UTC'], errors='coerce').max()
+    print(f"{len(labeled):,} labeled appointments, last updated {last_updated}; {len(agg_txn):,} patient-days "
+          f"with transactions.")
+    profiler.stop(labeled=labeled, features=features, agg_txn=agg_txn)
+
+    profiler.start('transactions')
+    touched_days = agg_txn[GROUP_KEYS].iloc[:0]
+    if args.transactions:
+        txns, seen = new_transactions(args.transactions, seen)
+        agg_txn, touched_days = fold_transactions(agg_txn, txns)
+        print(f"{len(txns):,} new transactions on {len(touched_days):,} patient-days.")
+    profiler.stop(agg_txn=agg_txn)
+
+    profiler.start('label')
+    appts = labeled[APPOINTMENT_COLUMNS].iloc[:0]
+    if args.appointments:
+        appts, skipped = new_appointments(args.appointments, labeled[['APPOINTMENT_ODU_ID', 'ODU_UPDATED_AT_UTC']])
+        appts = appts.astype({col: 'string' for col in ID_COLUMNS})
+        print(f"{len(appts):,} new or updated appointments.")
+        if skipped['stale']:
+            print(f"Warning: skipped {skipped['stale']:,} appointments older than their stored version.")
+        if skipped['undated']:
+            print(f"Warning: skipped {skipped['undated']:,} updates of stored appointments without a parseable "
+                  f"ODU_UPDATED_AT_UTC.")
+    labeled, changed, removed = relabel(labeled, appts, agg_txn, touched_days)
+    print(f"{len(changed):,} appointments (re)labeled, {len(removed):,} stored rows replaced.")
+    profiler.stop(changed=changed)
+    if changed.empty and not len(touched_days):
+        print("\nNothing new to ingest.")
+        profiler.save()
+        exit()
+
+    profiler.start('features')
+    features, patients = update_features(features, changed, removed)
+    update_patient_history(features, patients)
+    FeatureIndex.from_frame(features).save(FEATURE_INDEX_FILE)
+    print(f"Features recomputed for {len(patients):,} patients; {len(features):,} featurized appointments.")
+    profiler.stop(features=features)
+
+    profiler.start('save')
+    written = []
+    for df, path in [(labeled, LABELED_FILE), (agg_txn, AGGREGATES_FILE), (features, FEATURES_FILE)]:
+        written += write_table(df, path, fmt=args.format or stored_format(path))
+    np.save(TRANSACTION_IDS_FILE, seen)
+    profiler.stop()
+    print(f"\nIncremental update complete. Saved {', '.join(repr(f) for f in written)}.")
+    profiler.save()
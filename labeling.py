@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from table_io import read_table
+from transaction_aggregation import GROUP_KEYS, MISSING_KEY, patient_day_keys, to_day
+
+APPOINTMENT_FILE = 'Apointment_clean.csv'
+TRANSACTION_FILE = 'Transaction_clean.csv'
+# Per patient-day transaction aggregates and the hashes of the transactions
+# they include, kept so later deltas can be folded in (see incremental_update.py)
+AGGREGATES_FILE = 'output/transaction_aggregates'
+TRANSACTION_IDS_FILE = 'output/transaction_ids.npy'
+
+APPOINTMENT_COLUMNS = [
+ 'APPOINTMENT_ODU_ID','PATIENT_ODU_ID','APPOINTMENT_DATE','APPOINTMENT_DATETIME',
+ 'DURATION','PIMS_SOURCE','PIMS_SCHEDULE_TYPE','PIMS_STATUS','NOTES',
+ 'APPOINTMENT_TYPE','IS_CANCELED_APPOINTMENT','ODU_IS_DELETED',
+ 'CREATED_DATE', 'RESOURCE_ODU_ID', 'PRACTICE_ODU_ID', 'PRACTICE_NAME',
+ 'ODU_UPDATED_AT_UTC'
+]
+TRANSACTION_COLUMNS = [
+ 'TRANSACTION_ODU_ID','PATIENT_ODU_ID','REPORTING_DATE','REPORTING_DATETIME',
+ 'REPORTING_AMOUNT','QUANTITY','IS_INCLINIC','IS_REVENUE','PIMS_TRANSACTION_TYPE',
+ 'IS_ONLINE','IS_PAYMENT','TOP_REVENUE_CATEGORY_NAME'
+]
+
+APPOINTMENT_DTYPES = {'APPOINTMENT_ODU_ID': 'string', 'PATIENT_ODU_ID': 'string',
+                      'PIMS_SOURCE':'category','PIMS_SCHEDULE_TYPE':'category',
+                      'PIMS_STATUS':'category','APPOINTMENT_TYPE':'category',
+                      'ODU_IS_DELETED': 'boolean'} # Explicitly set ODU_IS_DELETED to boolean
+TRANSACTION_DTYPES = {'TRANSACTION_ODU_ID':'string','PATIENT_ODU_ID':'string',
+                      'IS_INCLINIC':'boolean','IS_REVENUE':'boolean',
+                      'IS_ONLINE':'boolean','IS_PAYMENT':'boolean',
+                      'TOP_REVENUE_CATEGORY_NAME':'category'}
+
+
+def read_appointments(path=APPOINTMENT_FILE):
+    return pd.read_csv(path, usecols=APPOINTMENT_COLUMNS, dtype=APPOINTMENT_DTYPES,
+                       parse_dates=['APPOINTMENT_DATE','APPOINTMENT_DATETIME'])
+
+
+def read_transactions(path=TRANSACTION_FILE, chunksize=None):
+    """The transaction file, or a lazy reader of chunks with `chunksize`."""
+    return pd.read_csv(path, usecols=TRANSACTION_COLUMNS, dtype=TRANSACTION_DTYPES,
+                       parse_dates=['REPORTING_DATE','REPORTING_DATETIME'],
+                       chunksize=chunksize)
+
+
+def transaction_id_hashes(ids):
+    """Sorted, distinct 64-bit hashes of transaction ids (missing ids are skipped)."""
+    return np.unique(pd.util.hash_pandas_object(ids.dropna(), index=False).to_numpy())
+
+
+def label_appointments(appts, agg_txn, codes=None):
+    """
+    Joins appointments to the per patient-day transaction aggregates and
+    derives the label: an appointment is a no-show unless its patient had an
+    in-clinic revenue transaction that day and the appointment isn't deleted.
+    Returns a new frame with upper-case column names.
+
+    The join runs on integer patient-day keys rather than the id strings and
+    dates. `codes` are the appointments' patient codes in the dictionary the
+    aggregates were built with (encode_patients), whose index then holds the
+    patient-day keys. Without them both sides are coded here, with a
+    dictionary built from the appointments: transactions of other patients
+    can't match and drop out.
+    """
+    appts = appts.copy()
+    appts['APPT_DATE'] = to_day(appts['APPOINTMENT_DATE'])
+
+    if codes is None:
+        codes, patients = pd.factorize(appts['PATIENT_ODU_ID'])
+        txn_keys = patient_day_keys(pd.Index(patients).get_indexer(agg_txn['PATIENT_ODU_ID']), agg_txn['TXN_DATE'])
+    else:
+        txn_keys = agg_txn.index.to_numpy()
+    appt_keys = patient_day_keys(codes, appts['APPT_DATE'])
+    matched = txn_keys != MISSING_KEY
+
+    # The aggregates have one row per patient-day, so the left join is a lookup
+    right = agg_txn.drop(columns=GROUP_KEYS)[matched].set_axis(txn_keys[matched])
+    merged = pd.concat([appts.reset_index(drop=True), right.reindex(appt_keys).reset_index(drop=True)], axis=1)
+
+    merged['any_revenue'] = merged['any_revenue'].fillna(False).astype(bool)
+    merged['any_inclinic'] = merged['any_inclinic'].fillna(False).astype(bool)
+    merged['total_amount'] = merged['total_amount'].fillna(0.0)
+    merged['ODU_IS_DELETED'] = merged['ODU_IS_DELETED'].fillna(False).astype(bool)
+
+    merged['no_show'] = ~( (merged['any_revenue']) & (merged['any_inclinic']) & (~merged['ODU_IS_DELETED']) )
+    merged.columns = [col.upper() for col in merged.columns]
+    return merged
+
+
+def read_aggregates(path=AGGREGATES_FILE):
+    """The persisted transaction aggregates, with TXN_DATE parsed again (CSV stores text)."""
+    agg_txn = read_table(path)
+    agg_txn['TXN_DATE'] = to_day(agg_txn['TXN_DATE'])
+    return agg_txn
@@ -0,0 +1,265 @@
+"""
+Compact, memory-mappable bundle of everything the API needs to score, and
+the versioned directory the bundles are published to.
+
+    output/models/
+        CURRENT               the active version and the one before it
+        <version>/            one bundle per version (a content hash)
+            manifest.json     versioned description: model shape, encoder
+                              parameters and every array's dtype/shape/checksum
+            feature.npy, threshold.npy, ...   the compacted forest (FlatForest.compact)
+
+The arrays are plain .npy files opened with mmap_mode='r', so loading costs
+a few file opens instead of unpickling: nothing is copied until a tree is
+walked, and processes scoring with the same bundle share its pages through
+the OS page cache. Loading doesn't import sklearn either, the scaler is kept
+as its mean/scale vectors.
+
+Publishing never touches a version that is being served: a bundle is
+written under a temporary name, renamed into place and only then made
+current. The API watches CURRENT and switches to the new version without a
+restart.
+
+    python model_bundle.py publish      # bundle the saved Random Forest, columns and scaler
+    python model_bundle.py list
+    python model_bundle.py activate <version>
+    python model_bundle.py rollback     # back to the previously active version
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import joblib
+import numpy as np
+
+from feature_encoder import FeatureEncoder, NUMERICAL_FEATURES, CATEGORICAL_FEATURES
+from forest_engine import FlatForest, MODEL_FILE
+
+OUTPUT_DIR = 'output'
+MODELS_DIR = os.path.join(OUTPUT_DIR, 'models')
+COLUMNS_FILE = os.path.join(OUTPUT_DIR, 'model_columns.joblib')
+SCALER_FILE = os.path.join(OUTPUT_DIR, 'scaler.joblib')
+MANIFEST = 'manifest.json'
+BUNDLE_FORMAT = 'noshow-forest-bundle'
+FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+# Versions kept by publish_bundle, besides the current and previous ones
+KEEP_VERSIONS = 5
+
+
+def _replace_file(path, write, mode='wb'):
+    """
+    Calls write(file) on a temporary file and renames it into place, so
+    processes that have the old file memory-mapped keep reading the old
+    inode instead of seeing it truncated under them.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, mode) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def write_bundle(forest, model_columns, scaler, bundle_dir, source=None):
+    """
+    Compacts `forest` and writes it with the encoder parameters to `bundle_dir`.
+    The manifest is written last, so a reader never sees a manifest that
+    points to arrays that are not there yet. Returns the manifest.
+    """
+    compact = forest.compact()
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    arrays = {}
+    digest = hashlib.sha256()
+    for name, array in compact.arrays().items():
+        array = np.ascontiguousarray(array)
+        file_name = f'{name}.npy'
+        _replace_file(os.path.join(bundle_dir, file_name), lambda f: np.save(f, array))
+        checksum = hashlib.sha256(array.tobytes()).hexdigest()
+        digest.update(name.encode() + checksum.encode())
+        arrays[name] = {'file': file_name, 'dtype': array.dtype.str, 'shape': list(array.shape),
+                        'sha256': checksum}
+
+    encoder = {
+        'model_columns': list(model_columns),
+        'numerical_features': NUMERICAL_FEATURES,
+        'categorical_features': CATEGORICAL_FEATURES,
+        'mean': (scaler.mean_ if scaler.with_mean else np.zeros(len(NUMERICAL_FEATURES))).tolist(),
+        'scale': (scaler.scale_ if scaler.with_std else np.ones(len(NUMERICAL_FEATURES))).tolist(),
+    }
+    digest.update(json.dumps(encoder, sort_keys=True).encode())
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'format_version': FORMAT_VERSION,
+        # Content hash: the same model, columns and scaler give the same version
+        'version': digest.hexdigest()[:12],
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'source': source,
+        'model': {
+            'trees': compact.n_estimators,
+            'nodes': len(compact.left),
+            'nodes_before_compaction': len(forest.left),
+            'max_depth': compact.max_depth,
+            'n_features': compact.n_features_in_,
+            'classes': compact.classes_.tolist(),
+        },
+        'encoder': encoder,
+        'arrays': arrays,
+    }
+    _replace_file(os.path.join(bundle_dir, MANIFEST),
+                  lambda f: json.dump(manifest, f, indent=2), mode='w')
+    return manifest
+
+
+def read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT or manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{bundle_dir} is not a version {FORMAT_VERSION} model bundle.")
+    return manifest
+
+
+def load_bundle(bundle_dir, mmap=True, verify=False):
+    """
+    Returns (forest, encoder, manifest). With `mmap` the forest's arrays are
+    read-only memory maps of the bundle files. `verify` checks every array
+    against its checksum, which reads the whole bundle.
+    """
+    manifest = read_manifest(bundle_dir)
+    arrays = {}
+    for name, spec in manifest['arrays'].items():
+        array = np.load(os.path.join(bundle_dir, spec['file']), mmap_mode='r' if mmap else None)
+        if array.dtype.str != spec['dtype'] or list(array.shape) != spec['shape']:
+            raise ValueError(f"{spec['file']} in {bundle_dir} doesn't match the manifest.")
+        if verify and hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest() != spec['sha256']:
+            raise ValueError(f"Checksum mismatch for {spec['file']} in {bundle_dir}.")
+        arrays[name] = array
+
+    model = manifest['model']
+    forest = FlatForest(**arrays, classes=np.array(model['classes']), max_depth=model['max_depth'],
+                        n_features=model['n_features'])
+
+    params = manifest['encoder']
+    scaler = SimpleNamespace(mean_=np.array(params['mean']), scale_=np.array(params['scale']),
+                             with_mean=True, with_std=True)
+    encoder = FeatureEncoder(params['model_columns'], scaler, params['numerical_features'],
+                             params['categorical_features'])
+    return forest, encoder, manifest
+
+
+# --- Versioned model directory ---
+
+def read_current(models_dir=MODELS_DIR):
+    """The CURRENT record ({'version', 'previous', 'activated'}), or None if nothing was published."""
+    try:
+        with open(os.path.join(models_dir, CURRENT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version, models_dir=MODELS_DIR):
+    """Makes `version` the active one. The file is replaced atomically."""
+    read_manifest(os.path.join(models_dir, version))
+    current = read_current(models_dir)
+    previous = current['version'] if current else None
+    if previous == version:
+        previous = current.get('previous')
+    record = {'version': version, 'previous': previous,
+              'activated': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+    _replace_file(os.path.join(models_dir, CURRENT_FILE), lambda f: json.dump(record, f), mode='w')
+    return record
+
+
+def list_versions(models_dir=MODELS_DIR):
+    """Manifests of the published versions, oldest first."""
+    manifests = []
+    if os.path.isdir(models_dir):
+        for name in os.listdir(models_dir):
+            if os.path.exists(os.path.join(models_dir, name, MANIFEST)):
+                manifests.append(read_manifest(os.path.join(models_dir, name)))
+    return sorted(manifests, key=lambda manifest: manifest['created'])
+
+
+def publish_bundle(forest, model_columns, scaler, models_dir=MODELS_DIR, source=None, activate=True,
+                   keep=KEEP_VERSIONS):
+    """
+    Writes a bundle as a new version of `models_dir` and, with `activate`,
+    makes it current. The oldest versions beyond `keep` are removed, except
+    the current and previous ones; processes still mapping a removed version
+    keep reading it. Returns the manifest.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    tmp = os.path.join(models_dir, f'.tmp-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    manifest = write_bundle(forest, model_columns, scaler, tmp, source)
+
+    path = os.path.join(models_dir, manifest['version'])
+    if os.path.exists(path):
+        # Same content as an existing version
+        shutil.rmtree(tmp)
+    else:
+        os.rename(tmp, path)
+    if activate:
+        set_current(manifest['version'], models_dir)
+
+    current = read_current(models_dir) or {}
+    protected = {current.get('version'), current.get('previous'), manifest['version']}
+    old = [m['version'] for m in list_versions(models_dir) if m['version'] not in protected]
+    for version in old[:max(len(old) - keep, 0)]:
+        shutil.rmtree(os.path.join(models_dir, version), ignore_errors=True)
+    return read_manifest(path)
+
+
+def bundle_model(model_file=MODEL_FILE, columns_file=COLUMNS_FILE, scaler_file=SCALER_FILE,
+                 models_dir=MODELS_DIR, activate=True):
+    """Publishes a saved RandomForestClassifier with its columns and scaler."""
+    forest = FlatForest.from_sklearn(joblib.load(model_file))
+    source = {'model': os.path.basename(model_file), 'columns': os.path.basename(columns_file),
+              'scaler': os.path.basename(scaler_file)}
+    return publish_bundle(forest, joblib.load(columns_file), joblib.load(scaler_file), models_dir, source,
+                          activate=activate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish, list and switch model bundle versions.")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish = commands.add_parser('publish', help="Bundle the saved Random Forest, columns and scaler.")
+    publish.add_argument('--model', default=MODEL_FILE)
+    publish.add_argument('--no-activate', action='store_true', help="Publish without making it current.")
+    commands.add_parser('list', help="List the published versions.")
+    activate = commands.add_parser('activate', help="Make a published version current.")
+    activate.add_argument('version')
+    commands.add_parser('rollback', help="Make the previously active version current again.")
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        print(f"Bundling {args.model}...")
+        manifest = bundle_model(args.model, models_dir=args.models_dir, activate=not args.no_activate)
+        model = manifest['model']
+        path = os.path.join(args.models_dir, manifest['version'])
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        print(f"Version {manifest['version']}: {model['trees']} trees, {model['nodes']:,} nodes "
+              f"({model['nodes_before_compaction']:,} before compaction), {size / 2**20:.1f} MB, saved to {path}")
+        start = time.perf_counter()
+        load_bundle(path)
+        print(f"Loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.command == 'list':
+        current = read_current(args.models_dir) or {}
+        for manifest in list_versions(args.models_dir):
+            marker = {current.get('version'): '*', current.get('previous'): '-'}.get(manifest['version'], ' ')
+            print(f"{marker} {manifest['version']}  {manifest['created']}  {manifest['model']['trees']} trees, "
+                  f"{manifest['model']['nodes']:,} nodes")
+    elif args.command == 'activate':
+        print(f"Active version: {set_current(args.version, args.models_dir)['version']}")
+    else:
+        current = read_current(args.models_dir)
+        if not current or not current.get('previous'):
+            parser.error("There is no previous version to roll back to.")
+        print(f"Rolled back to {set_current(current['previous'], args.models_dir)['version']}")
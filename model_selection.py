@@ -0,0 +1,247 @@
+"""
+Model selection on the speed/quality tradeoff.
+
+For each candidate learner (Random Forest, histogram gradient boosting,
+logistic regression) runs a time-budgeted random hyperparameter search with
+process-parallel cross-validation, refits the best configuration on the
+training split and measures, next to accuracy/recall/ROC AUC on the test
+split, its training time, size on disk and inference latency.
+
+    python model_selection.py --engines rf hgb --budget 300 --jobs 4
+
+Models are saved under output/model_selection/ and the results in
+output/model_selection.json. The API keeps using the Random Forest trained
+by model_training_rf.py.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, recall_score, roc_auc_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, cross_validate, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from table_io import read_table
+from feature_encoder import NUMERICAL_FEATURES, CATEGORICAL_FEATURES
+
+INPUT_FILE = os.path.join('output', 'final_features_and_eda')
+OUTPUT_DIR = os.path.join('output', 'model_selection')
+REPORT_FILE = os.path.join('output', 'model_selection.json')
+TARGET = 'NO_SHOW'
+METRICS = ['roc_auc', 'recall', 'accuracy']
+
+# name -> (estimator factory, hyperparameter space sampled by the search)
+ENGINES = {
+    'rf': (
+        lambda seed: RandomForestClassifier(random_state=seed, class_weight='balanced', n_jobs=1),
+        {
+            'n_estimators': [50, 100, 200],
+            'max_depth': [None, 12, 20, 30],
+            'min_samples_leaf': [1, 5, 20, 50],
+            'max_features': ['sqrt', 0.5],
+        },
+    ),
+    'hgb': (
+        lambda seed: HistGradientBoostingClassifier(random_state=seed, class_weight='balanced',
+                                                    early_stopping=True),
+        {
+            'learning_rate': [0.03, 0.06, 0.1, 0.2],
+            'max_iter': [100, 200, 400],
+            'max_leaf_nodes': [15, 31, 63, 127],
+            'min_samples_leaf': [20, 50, 100, 200],
+            'l2_regularization': [0.0, 0.1, 1.0],
+            'max_bins': [63, 255],
+        },
+    ),
+    'logistic': (
+        lambda seed: LogisticRegression(max_iter=1000, class_weight='balanced'),
+        {'C': [0.01, 0.1, 1.0, 10.0]},
+    ),
+}
+
+
+def load_dataset(input_file=INPUT_FILE, seed=42):
+    """
+    The training/test matrices, prepared as in model_training_rf.py: missing
+    numbers filled with 0, one-hot categories (drop_first) and standard-scaled
+    numerical features, so a selected model works with the same FeatureEncoder.
+    """
+    df = read_table(input_file, columns=NUMERICAL_FEATURES + CATEGORICAL_FEATURES + [TARGET])
+    for col in NUMERICAL_FEATURES:
+        df[col] = df[col].fillna(0)
+    df['IS_WEEKEND'] = df['IS_WEEKEND'].astype(str)
+    y = df[TARGET].astype(bool).astype(int)
+    X = pd.get_dummies(df.drop(columns=TARGET), columns=CATEGORICAL_FEATURES, drop_first=True)
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    scaler = StandardScaler()
+    X_train = X_train.copy()
+    X_test = X_test.copy()
+    X_train[NUMERICAL_FEATURES] = scaler.fit_transform(X_train[NUMERICAL_FEATURES])
+    X_test[NUMERICAL_FEATURES] = scaler.transform(X_test[NUMERICAL_FEATURES])
+    # The API scores float32 matrices
+    return (X_train.to_numpy(dtype=np.float32), X_test.to_numpy(dtype=np.float32),
+            y_train.to_numpy(), y_test.to_numpy(), X.columns.tolist(), scaler)
+
+
+def search(engine, X, y, budget, cv=3, jobs=-1, metric='roc_auc', seed=0):
+    """
+    Random search over the engine's space until `budget` seconds are spent.
+    The folds of each candidate are fitted in parallel worker processes. A
+    candidate is only started if, judging by the slowest one so far, it can
+    finish within the budget (the first one always runs).
+    Returns the trials sorted best first.
+    """
+    factory, space = ENGINES[engine]
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=seed)
+    # All values are lists, so this is the whole grid without repeats. The
+    # sampler returns a full grid in order, hence the shuffle.
+    grid_size = int(np.prod([len(values) for values in space.values()]))
+    candidates = list(ParameterSampler(space, n_iter=grid_size, random_state=seed))
+    random.Random(seed).shuffle(candidates)
+
+    trials = []
+    start = time.perf_counter()
+    slowest = 0.0
+    for params in candidates:
+        elapsed = time.perf_counter() - start
+        if trials and elapsed + slowest > budget:
+            break
+
+        trial_start = time.perf_counter()
+        scores = cross_validate(factory(seed).set_params(**params), X, y, cv=folds, scoring=METRICS, n_jobs=jobs)
+        duration = time.perf_counter() - trial_start
+        slowest = max(slowest, duration)
+        trials.append({
+            'params': params,
+            'seconds': round(duration, 2),
+            **{name: round(float(scores[f'test_{name}'].mean()), 4) for name in METRICS},
+        })
+        print(f"  [{engine}] {len(trials):>3}  {metric} {trials[-1][metric]:.4f}  "
+              f"({duration:.1f}s)  {params}", flush=True)
+    return sorted(trials, key=lambda trial: trial[metric], reverse=True)
+
+
+def inference_latency(model, X, single_rows=200, batch_rows=10_000):
+    """Median single-row latency (ms) and batch throughput (rows/s) of predict_proba."""
+    rng = np.random.default_rng(0)
+    rows = X[rng.integers(0, len(X), size=single_rows)]
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict_proba(row[None, :])
+        timings.append(time.perf_counter() - start)
+
+    batch = X[:batch_rows]
+    start = time.perf_counter()
+    model.predict_proba(batch)
+    batch_seconds = time.perf_counter() - start
+    return {
+        'single_row_ms_p50': round(float(np.median(timings)) * 1000, 3),
+        'single_row_ms_p99': round(float(np.percentile(timings, 99)) * 1000, 3),
+        'batch_rows_per_s': round(len(batch) / batch_seconds, 1) if batch_seconds else None,
+    }
+
+
+def evaluate_engine(engine, params, data, out_dir, seed=0):
+    """Refits `params` on the training split and measures quality, training time, size and latency."""
+    X_train, X_test, y_train, y_test = data
+    factory, _ = ENGINES[engine]
+    model = factory(seed).set_params(**params)
+    if isinstance(model, RandomForestClassifier):
+        model.set_params(n_jobs=-1)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - start
+
+    model_file = os.path.join(out_dir, f'{engine}.joblib')
+    joblib.dump(model, model_file)
+
+    probabilities = model.predict_proba(X_test)[:, 1]
+    predictions = (probabilities >= 0.5).astype(int)
+    return {
+        'engine': engine,
+        'params': params,
+        'model_file': model_file,
+        'train_s': round(train_seconds, 2),
+        'model_mb': round(os.path.getsize(model_file) / 2**20, 2),
+        'accuracy': round(accuracy_score(y_test, predictions), 4),
+        'recall': round(recall_score(y_test, predictions), 4),
+        'roc_auc': round(roc_auc_score(y_test, probabilities), 4),
+        **inference_latency(model, X_test),
+    }
+
+
+def print_results(results):
+    print(f"\n{'engine':<10} {'accuracy':>9} {'recall':>7} {'roc_auc':>8} {'train (s)':>10} "
+          f"{'size (MB)':>10} {'1 row (ms)':>11} {'batch rows/s':>13}")
+    for r in results:
+        print(f"{r['engine']:<10} {r['accuracy']:>9.4f} {r['recall']:>7.4f} {r['roc_auc']:>8.4f} "
+              f"{r['train_s']:>10.2f} {r['model_mb']:>10.2f} {r['single_row_ms_p50']:>11.3f} "
+              f"{r['batch_rows_per_s']:>13,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Search hyperparameters of several learners within a time budget and compare "
+                    "them on quality, training time, model size and inference latency.")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=['rf', 'hgb'])
+    parser.add_argument('--budget', type=float, default=120,
+                        help="Seconds of hyperparameter search per engine (default: 120). The first candidate "
+                             "always runs, so 0 evaluates a single configuration.")
+    parser.add_argument('--cv', type=int, default=3, help="Cross-validation folds (default: 3).")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help="Worker processes for the cross-validation folds (default: all CPUs).")
+    parser.add_argument('--metric', choices=METRICS, default='roc_auc', help="Metric the search optimizes.")
+    parser.add_argument('--search-rows', type=int, default=None,
+                        help="Run the search on a random sample of this many training rows.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out-dir', default=OUTPUT_DIR, help="Where the selected models are saved.")
+    parser.add_argument('--report', default=REPORT_FILE, help="JSON report to write.")
+    args = parser.parse_args()
+
+    print(f"Loading data from {INPUT_FILE}...")
+    X_train, X_test, y_train, y_test, model_columns, scaler = load_dataset()
+    print(f"{len(X_train):,} training and {len(X_test):,} test rows, {X_train.shape[1]} columns")
+    os.makedirs(args.out_dir, exist_ok=True)
+    joblib.dump(model_columns, os.path.join(args.out_dir, 'model_columns.joblib'))
+    joblib.dump(scaler, os.path.join(args.out_dir, 'scaler.joblib'))
+
+    X_search, y_search = X_train, y_train
+    if args.search_rows and args.search_rows < len(X_train):
+        sample = np.random.default_rng(args.seed).choice(len(X_train), size=args.search_rows, replace=False)
+        X_search, y_search = X_train[sample], y_train[sample]
+
+    results = []
+    searches = {}
+    for engine in args.engines:
+        print(f"\nSearching {engine} for {args.budget:.0f}s ({args.cv}-fold CV, {len(X_search):,} rows)...")
+        trials = search(engine, X_search, y_search, args.budget, cv=args.cv, jobs=args.jobs,
+                        metric=args.metric, seed=args.seed)
+        searches[engine] = trials
+        print(f"Best {engine}: {trials[0]['params']}. Refitting on the full training split...")
+        results.append(evaluate_engine(engine, trials[0]['params'], (X_train, X_test, y_train, y_test),
+                                       args.out_dir, seed=args.seed))
+
+    print_results(results)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'options': {'budget_s': args.budget, 'cv': args.cv, 'metric': args.metric,
+                    'search_rows': len(X_search), 'seed': args.seed},
+        'results': results,
+        'searches': searches,
+    }
+    os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nReport saved to {args.report}, models saved to {args.out_dir}")
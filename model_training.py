@@ -6,20 +6,28 @@ from sklearn.metrics import classification_report, accuracy_score
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 import joblib
 import os
+import argparse
+
+from table_io import read_table
+from profiling import Profiler, add_profile_arguments
 
 # Define paths
-INPUT_FILE = os.path.join('output', 'final_features_and_eda.csv')
+# CSV, Feather or Parquet, whichever feature_engineering_eda.py wrote last
+INPUT_FILE = os.path.join('output', 'final_features_and_eda')
 OUTPUT_DIR = 'output'
 MODEL_FILE = os.path.join(OUTPUT_DIR, 'noshow_model.joblib')
-COLUMNS_FILE = os.path.join(OUTPUT_DIR, 'model_columns.joblib')
+# The API and predict.py use the Random Forest's columns and scaler
+# (model_columns.joblib, scaler.joblib); these belong to this baseline model.
+COLUMNS_FILE = os.path.join(OUTPUT_DIR, 'model_columns_logistic.joblib')
 
 # Create output directory if it doesn't exist
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-# Load the dataset
-print(f"Loading data from {INPUT_FILE}...")
-df = pd.read_csv(INPUT_FILE)
+parser = argparse.ArgumentParser(description="Train and evaluate the baseline Logistic Regression model.")
+add_profile_arguments(parser)
+args = parser.parse_args()
+profiler = Profiler.from_args(args, 'model_training.py', os.path.join(OUTPUT_DIR, 'noshow_model.profile.json'))
 
 # --- Feature Engineering & Selection ---
 print("Preparing data for modeling...")
@@ -44,6 +52,13 @@ categorical_features = [
 target = 'NO_SHOW'
 
 features = numerical_features + categorical_features
+
+# Load the dataset, reading only the columns the model uses
+print(f"Loading data from {INPUT_FILE}...")
+profiler.start('load')
+df = read_table(INPUT_FILE, columns=features + [target])
+profiler.stop(df=df)
+profiler.start('featurize')
 df_model = df[features + [target]].copy()
 
 # --- Data Preprocessing ---
@@ -52,7 +67,7 @@ df_model = df[features + [target]].copy()
 # For rate features, NaN likely means no prior data, so a rate of 0 is a reasonable default.
 # For 'DAYS_SINCE_LAST_APPT', NaN means a first appointment, so 0 is also appropriate.
 for col in numerical_features:
-    df_model[col].fillna(0, inplace=True)
+    df_model[col] = df_model[col].fillna(0)
 
 # Convert boolean 'IS_WEEKEND' to object type for consistent encoding
 df_model['IS_WEEKEND'] = df_model['IS_WEEKEND'].astype(str)
@@ -81,7 +96,7 @@ X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_
 # The scaler is fit ONLY on the training data to prevent data leakage.
 print("Scaling numerical features...")
 scaler = StandardScaler()
-SCALER_FILE = os.path.join(OUTPUT_DIR, 'scaler.joblib')
+SCALER_FILE = os.path.join(OUTPUT_DIR, 'scaler_logistic.joblib')
 
 # Create copies to avoid SettingWithCopyWarning
 X_train_scaled = X_train.copy()
@@ -91,15 +106,19 @@ X_test_scaled = X_test.copy()
 # Note: We only use the original 'numerical_features' list for this
 X_train_scaled[numerical_features] = scaler.fit_transform(X_train[numerical_features])
 X_test_scaled[numerical_features] = scaler.transform(X_test[numerical_features])
+profiler.stop(X_train_scaled=X_train_scaled, X_test_scaled=X_test_scaled)
 
 
 # --- Model Training ---
 print("Training Logistic Regression model on scaled data...")
 model = LogisticRegression(random_state=42, max_iter=1000, class_weight='balanced')
+profiler.start('train')
 model.fit(X_train_scaled, y_train)
+profiler.stop()
 
 # --- Model Evaluation ---
 print("Evaluating model performance on scaled data...")
+profiler.start('evaluate')
 y_pred = model.predict(X_test_scaled)
 
 # Print evaluation metrics
@@ -109,10 +128,14 @@ report = classification_report(y_test, y_pred, target_names=['Show', 'No-Show'])
 print(f"\nModel Accuracy: {accuracy:.4f}\n")
 print("Classification Report:")
 print(report)
+profiler.stop()
 
 # --- Save the Model & Scaler ---
+profiler.start('save')
 joblib.dump(model, MODEL_FILE)
 joblib.dump(scaler, SCALER_FILE)
 print(f"\nModel saved to {MODEL_FILE}")
 print(f"Scaler saved to {SCALER_FILE}")
 print("Model training and evaluation complete.")
+profiler.stop()
+profiler.save()
@@ -6,17 +6,27 @@ from sklearn.metrics import classification_report, accuracy_score
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 import joblib
 import os
+import argparse
+
+from table_io import read_table
+from profiling import Profiler, add_profile_arguments
+
+from forest_engine import FlatForest
+from model_bundle import publish_bundle, MODELS_DIR
 
 # Define paths
-INPUT_FILE = os.path.join('output', 'final_features_and_eda.csv')
+# CSV, Feather or Parquet, whichever feature_engineering_eda.py wrote last
+INPUT_FILE = os.path.join('output', 'final_features_and_eda')
 OUTPUT_DIR = 'output'
 MODEL_FILE = os.path.join(OUTPUT_DIR, 'noshow_model_rf.joblib') # New model file name
 COLUMNS_FILE = os.path.join(OUTPUT_DIR, 'model_columns.joblib')
 SCALER_FILE = os.path.join(OUTPUT_DIR, 'scaler.joblib')
+FLAT_MODEL_FILE = os.path.join(OUTPUT_DIR, 'noshow_model_rf_flat.npz')
 
-# Load the dataset
-print(f"Loading data from {INPUT_FILE}...")
-df = pd.read_csv(INPUT_FILE)
+parser = argparse.ArgumentParser(description="Train and evaluate the Random Forest model.")
+add_profile_arguments(parser)
+args = parser.parse_args()
+profiler = Profiler.from_args(args, 'model_training_rf.py', os.path.join(OUTPUT_DIR, 'noshow_model_rf.profile.json'))
 
 # --- Feature Engineering & Selection ---
 print("Preparing data for modeling...")
@@ -40,13 +50,20 @@ categorical_features = [
 target = 'NO_SHOW'
 
 features = numerical_features + categorical_features
+
+# Load the dataset, reading only the columns the model uses
+print(f"Loading data from {INPUT_FILE}...")
+profiler.start('load')
+df = read_table(INPUT_FILE, columns=features + [target])
+profiler.stop(df=df)
+profiler.start('featurize')
 df_model = df[features + [target]].copy()
 
 # --- Data Preprocessing ---
 
 # Handle missing values
 for col in numerical_features:
-    df_model[col].fillna(0, inplace=True)
+    df_model[col] = df_model[col].fillna(0)
 
 # Convert boolean 'IS_WEEKEND' to object type for consistent encoding
 df_model['IS_WEEKEND'] = df_model['IS_WEEKEND'].astype(str)
@@ -62,9 +79,10 @@ df_model = pd.get_dummies(df_model, columns=categorical_features, drop_first=Tru
 X = df_model.drop(target, axis=1)
 y = df_model[target]
 
-# Load the saved columns to ensure consistency
-model_columns = joblib.load(COLUMNS_FILE)
-X = X[model_columns]
+# Save the columns used for training, so prediction can rebuild the same layout
+model_columns = X.columns.tolist()
+joblib.dump(model_columns, COLUMNS_FILE)
+print(f"Model columns saved to {COLUMNS_FILE}")
 
 # Split data into training and testing sets
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
@@ -80,15 +98,19 @@ X_test_scaled = X_test.copy()
 # Fit and transform the numerical features
 X_train_scaled[numerical_features] = scaler.fit_transform(X_train[numerical_features])
 X_test_scaled[numerical_features] = scaler.transform(X_test[numerical_features])
+profiler.stop(X_train_scaled=X_train_scaled, X_test_scaled=X_test_scaled)
 
 
 # --- Model Training (Random Forest) ---
 print("Training Random Forest model on scaled data...")
 model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced', n_jobs=-1)
+profiler.start('train')
 model.fit(X_train_scaled, y_train)
+profiler.stop()
 
 # --- Model Evaluation ---
 print("Evaluating model performance on scaled data...")
+profiler.start('evaluate')
 y_pred = model.predict(X_test_scaled)
 
 # Print evaluation metrics
@@ -98,11 +120,30 @@ report = classification_report(y_test, y_pred, target_names=['Show', 'No-Show'])
 print(f"\nModel Accuracy: {accuracy:.4f}\n")
 print("Classification Report:")
 print(report)
+profiler.stop()
 
 # --- Save the Model & Scaler ---
+profiler.start('save')
 joblib.dump(model, MODEL_FILE)
 # We can reuse the same scaler, but saving it again with the new model is fine.
 joblib.dump(scaler, SCALER_FILE) 
 print(f"\nModel saved to {MODEL_FILE}")
 print(f"Scaler saved to {SCALER_FILE}")
+
+# --- Export the Flat Inference Model ---
+# The API scores with this NumPy copy of the forest instead of the sklearn object.
+flat_model = FlatForest.from_sklearn(model)
+flat_model.save(FLAT_MODEL_FILE)
+print(f"Flat inference model saved to {FLAT_MODEL_FILE}")
+
+# --- Publish the Model Bundle ---
+# Compacted forest + encoder parameters with a versioned manifest; the API
+# memory-maps it instead of unpickling the model, columns and scaler, and
+# switches to the new version without a restart.
+manifest = publish_bundle(flat_model, model_columns, scaler, MODELS_DIR,
+                          source={'model': os.path.basename(MODEL_FILE), 'columns': os.path.basename(COLUMNS_FILE),
+                                  'scaler': os.path.basename(SCALER_FILE)})
+print(f"Model version {manifest['version']} published to {MODELS_DIR}")
+profiler.stop()
 print("Random Forest model training and evaluation complete.")
+profiler.save()
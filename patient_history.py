@@ -0,0 +1,124 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+PATIENT_KEY = "PATIENT_ODU_ID"
+STATE_FILE = "output/patient_history_state.joblib"
+# Appointments of a patient at the same time are ordered by id, so every run
+# (full, sharded or incremental) sees them in the same order
+HISTORY_ORDER = [PATIENT_KEY, "APPOINTMENT_DATETIME", "APPOINTMENT_ODU_ID"]
+
+
+def history_order(df):
+    """The HISTORY_ORDER columns `df` has (frames of new appointments may have no ids)."""
+    return [col for col in HISTORY_ORDER if col in df.columns]
+
+
+def add_patient_history(df):
+    """
+    Adds PREV_APPT_DATE, DAYS_SINCE_LAST_APPT and PAST_NOSHOW_RATE to a
+    labeled appointment frame, sorted by patient, appointment time and id.
+
+    PAST_NOSHOW_RATE is the patient's no-show rate over their earlier
+    appointments only (NaN for a first appointment), computed from grouped
+    cumulative sums and counts instead of a per-patient expanding mean.
+    """
+    df = df.sort_values(history_order(df), kind="stable")
+    by_patient = df.groupby(PATIENT_KEY, sort=False)
+
+    df["PREV_APPT_DATE"] = by_patient["APPOINTMENT_DATETIME"].shift(1)
+    df["DAYS_SINCE_LAST_APPT"] = (df["APPOINTMENT_DATETIME"] - df["PREV_APPT_DATE"]).dt.days
+
+    no_show = df["NO_SHOW"].astype(int)
+    past_count = by_patient.cumcount()
+    past_noshows = no_show.groupby(df[PATIENT_KEY], sort=False).cumsum() - no_show
+    df["PAST_NOSHOW_RATE"] = (past_noshows / past_count.where(past_count > 0)).astype(float)
+    return df
+
+
+class PatientHistory:
+    """
+    Running per-patient history: number of appointments, number of no-shows
+    and time of the last appointment, indexed by PATIENT_ODU_ID.
+
+    Keeping this state lets the history features of new appointments be
+    computed from the previous totals instead of re-scanning every patient's
+    full history. New appointments are assumed to be later than the ones
+    already folded into the state.
+    """
+
+    def __init__(self, state=None):
+        if state is None:
+            state = pd.DataFrame(
+                {"APPT_COUNT": pd.Series(dtype="int64"),
+                 "NOSHOW_COUNT": pd.Series(dtype="int64"),
+                 "LAST_APPT_DATETIME": pd.Series(dtype="datetime64[ns]")},
+                index=pd.Index([], name=PATIENT_KEY),
+            )
+        self.state = state
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds the state from a labeled appointment frame."""
+        grouped = df.groupby(PATIENT_KEY)
+        state = pd.DataFrame({
+            "APPT_COUNT": grouped.size().astype("int64"),
+            "NOSHOW_COUNT": grouped["NO_SHOW"].sum().astype("int64"),
+            "LAST_APPT_DATETIME": grouped["APPOINTMENT_DATETIME"].max(),
+        })
+        return cls(state)
+
+    @classmethod
+    def load(cls, path=STATE_FILE):
+        return cls(joblib.load(path))
+
+    def save(self, path=STATE_FILE):
+        joblib.dump(self.state, path)
+
+    def features_for(self, appointments):
+        """
+        Computes the history features for new appointments from the running
+        state, without needing their labels. Several new appointments of the
+        same patient see each other in time order; their PAST_NOSHOW_RATE only
+        counts labeled history (the state plus earlier new rows that already
+        carry a NO_SHOW value). Returns a frame sorted by patient and time.
+        """
+        df = appointments.sort_values(history_order(appointments), kind="stable").copy()
+        by_patient = df.groupby(PATIENT_KEY, sort=False)
+        previous = self.state.reindex(df[PATIENT_KEY])
+
+        # Earlier rows from this batch take precedence over the stored last visit
+        prev_in_batch = by_patient["APPOINTMENT_DATETIME"].shift(1)
+        df["PREV_APPT_DATE"] = prev_in_batch.fillna(
+            pd.Series(previous["LAST_APPT_DATETIME"].to_numpy(), index=df.index))
+        df["DAYS_SINCE_LAST_APPT"] = (df["APPOINTMENT_DATETIME"] - df["PREV_APPT_DATE"]).dt.days
+
+        if "NO_SHOW" in df.columns:
+            labeled = df["NO_SHOW"].notna().astype(int)
+            no_show = df["NO_SHOW"].fillna(False).astype(int)
+        else:
+            labeled = pd.Series(0, index=df.index)
+            no_show = labeled
+        batch_count = labeled.groupby(df[PATIENT_KEY], sort=False).cumsum() - labeled
+        batch_noshows = no_show.groupby(df[PATIENT_KEY], sort=False).cumsum() - no_show
+
+        past_count = previous["APPT_COUNT"].fillna(0).to_numpy() + batch_count.to_numpy()
+        past_noshows = previous["NOSHOW_COUNT"].fillna(0).to_numpy() + batch_noshows.to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df["PAST_NOSHOW_RATE"] = np.where(past_count > 0, past_noshows / past_count, np.nan)
+        return df
+
+    def update(self, appointments):
+        """Folds newly labeled appointments into the running state."""
+        delta = PatientHistory.from_frame(appointments).state
+        state = self.state.reindex(self.state.index.union(delta.index))
+        current = delta.reindex(state.index)
+
+        state["APPT_COUNT"] = state["APPT_COUNT"].fillna(0).astype("int64") + current["APPT_COUNT"].fillna(0).astype("int64")
+        state["NOSHOW_COUNT"] = state["NOSHOW_COUNT"].fillna(0).astype("int64") + current["NOSHOW_COUNT"].fillna(0).astype("int64")
+        state["LAST_APPT_DATETIME"] = pd.concat(
+            [state["LAST_APPT_DATETIME"], current["LAST_APPT_DATETIME"]], axis=1).max(axis=1)
+        state.index.name = PATIENT_KEY
+        self.state = state
+        return self
+
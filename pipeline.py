@@ -0,0 +1,306 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from table_io import EXTENSIONS, DEFAULT_FORMAT
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = 'output'
+STATE_FILE = os.path.join(OUTPUT_DIR, 'pipeline_state.json')
+
+
+class Stage:
+    """
+    One step of the pipeline: a script run with `args`, the files it reads
+    (data and code) and the files it writes. A stage depends on every stage
+    that writes one of its inputs.
+    """
+
+    def __init__(self, name, script, inputs, outputs, args=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = list(args)
+
+    @property
+    def command(self):
+        return [sys.executable, self.script] + self.args
+
+
+def project_modules(script):
+    """
+    The script and every project module it imports, directly or through
+    other project modules, as file names. Found by parsing the import
+    statements (including the ones inside functions), so a stage's code
+    inputs follow the code instead of a hand-kept list.
+    """
+    found, pending = set(), [script]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(os.path.join(PROJECT_DIR, path)) as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                # Only the flat modules of the project; packages and libraries are skipped
+                candidate = module.split('.')[0] + '.py'
+                if os.path.exists(os.path.join(PROJECT_DIR, candidate)):
+                    pending.append(candidate)
+    return sorted(found)
+
+
+def build_stages(fmt=DEFAULT_FORMAT, chunksize=None, csv_copy=False, eda=False, workers=1):
+    """
+    The analysis -> feature engineering -> training DAG for the given options.
+    With `eda`, the EDA report is added as a stage next to the training stages.
+    Each stage's inputs are its data files plus project_modules() of its script.
+    """
+    ext = EXTENSIONS[fmt]
+    table_args = ['--format', fmt] + (['--csv'] if csv_copy else [])
+
+    def table_outputs(stem):
+        outputs = [stem + ext]
+        if csv_copy and fmt != 'csv':
+            outputs.append(stem + EXTENSIONS['csv'])
+        return outputs
+
+    analysis_results = 'analysis_results' + ext
+    features = os.path.join(OUTPUT_DIR, 'final_features_and_eda') + ext
+
+    stages = [
+        Stage(
+            'analysis', 'analysis.py',
+            inputs=['Apointment_clean.csv', 'Transaction_clean.csv'] + project_modules('analysis.py'),
+            outputs=table_outputs('analysis_results') + [
+                os.path.join(OUTPUT_DIR, 'transaction_aggregates') + ext,
+                os.path.join(OUTPUT_DIR, 'transaction_ids.npy'),
+            ],
+            args=table_args + (['--chunksize', str(chunksize)] if chunksize else []),
+        ),
+        Stage(
+            'features', 'feature_engineering_eda.py',
+            inputs=[analysis_results] + project_modules('feature_engineering_eda.py'),
+            outputs=table_outputs(os.path.join(OUTPUT_DIR, 'final_features_and_eda')) + [
+                os.path.join(OUTPUT_DIR, 'patient_history_state.joblib'),
+                os.path.join(OUTPUT_DIR, 'feature_index.joblib'),
+            ],
+            args=table_args + (['--workers', str(workers)] if workers > 1 else []),
+        ),
+        Stage(
+            'train_logistic', 'model_training.py',
+            inputs=[features] + project_modules('model_training.py'),
+            outputs=[
+                os.path.join(OUTPUT_DIR, 'noshow_model.joblib'),
+                os.path.join(OUTPUT_DIR, 'model_columns_logistic.joblib'),
+                os.path.join(OUTPUT_DIR, 'scaler_logistic.joblib'),
+            ],
+        ),
+        Stage(
+            'train_rf', 'model_training_rf.py',
+            inputs=[features] + project_modules('model_training_rf.py'),
+            outputs=[
+                os.path.join(OUTPUT_DIR, 'noshow_model_rf.joblib'),
+                os.path.join(OUTPUT_DIR, 'noshow_model_rf_flat.npz'),
+                os.path.join(OUTPUT_DIR, 'models', 'CURRENT'),
+                os.path.join(OUTPUT_DIR, 'model_columns.joblib'),
+                os.path.join(OUTPUT_DIR, 'scaler.joblib'),
+            ],
+        ),
+    ]
+    if eda:
+        stages.append(Stage(
+            'eda', 'eda_report.py',
+            inputs=[features] + project_modules('eda_report.py'),
+            outputs=[
+                os.path.join(OUTPUT_DIR, 'noshow_by_day.png'),
+                os.path.join(OUTPUT_DIR, 'noshow_by_hour.png'),
+                os.path.join(OUTPUT_DIR, 'lead_time_distribution.png'),
+                os.path.join(OUTPUT_DIR, 'noshow_heatmap.png'),
+            ],
+        ))
+    return stages
+
+
+def stage_dependencies(stages):
+    """Maps each stage name to the names of the stages producing its inputs."""
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in producers:
+                raise ValueError(f"'{path}' is written by both '{producers[path]}' and '{stage.name}'.")
+            producers[path] = stage.name
+    return {
+        stage.name: {producers[path] for path in stage.inputs if path in producers}
+        for stage in stages
+    }
+
+
+class Fingerprints:
+    """
+    Content hashes of files and stages, persisted in STATE_FILE.
+
+    A file's hash is reused while its size and modification time are
+    unchanged, so large inputs are only re-read after they change. A stage's
+    fingerprint covers its command line and the hashes of all its inputs.
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        self.files = state.get('files', {})
+        self.stages = state.get('stages', {})
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.files[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def stage_fingerprint(self, stage):
+        digest = hashlib.sha256()
+        digest.update(json.dumps([stage.script] + stage.args).encode())
+        for path in stage.inputs:
+            digest.update(path.encode())
+            digest.update(self.file_hash(path).encode() if os.path.exists(path) else b'missing')
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage, fingerprint):
+        return (self.stages.get(stage.name) == fingerprint
+                and all(os.path.exists(path) for path in stage.outputs))
+
+    def record(self, stage, fingerprint):
+        self.stages[stage.name] = fingerprint
+        # Hash the outputs now so downstream fingerprints don't re-read them
+        for path in stage.outputs:
+            if os.path.exists(path):
+                self.file_hash(path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'files': self.files, 'stages': self.stages}, f, indent=2)
+
+
+def run_stage(stage):
+    start = time.perf_counter()
+    result = subprocess.run(stage.command, capture_output=True, text=True)
+    return result, time.perf_counter() - start
+
+
+def run_pipeline(stages, jobs=2, force=(), dry_run=False):
+    """
+    Runs the stages in dependency order, up to `jobs` at a time. A stage is
+    skipped when its fingerprint matches the last successful run, its outputs
+    exist and none of the stages it depends on ran. Stages named in `force`
+    always run. Returns True if every stage succeeded or was skipped.
+    """
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    fingerprints = Fingerprints()
+    pending = [stage.name for stage in stages]
+    done, failed, ran = set(), set(), set()
+
+    def schedule(name):
+        stage = by_name[name]
+        fingerprint = fingerprints.stage_fingerprint(stage)
+        upstream_ran = dependencies[name] & ran
+        if name not in force and not upstream_ran and fingerprints.is_up_to_date(stage, fingerprint):
+            print(f"[{name}] up to date, skipped")
+            done.add(name)
+            return None
+        if dry_run:
+            print(f"[{name}] would run: {' '.join(stage.command[1:])}")
+            ran.add(name)
+            done.add(name)
+            return None
+        print(f"[{name}] running: {' '.join(stage.command[1:])}")
+        return fingerprint
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while pending or running:
+            # Start every stage whose dependencies are finished
+            for name in list(pending):
+                if dependencies[name] & failed:
+                    print(f"[{name}] not run, an upstream stage failed")
+                    pending.remove(name)
+                    failed.add(name)
+                elif dependencies[name] <= done:
+                    pending.remove(name)
+                    fingerprint = schedule(name)
+                    if fingerprint is not None:
+                        running[pool.submit(run_stage, by_name[name])] = (name, fingerprint)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, _ = running.pop(future)
+                result, elapsed = future.result()
+                if result.returncode == 0:
+                    print(f"[{name}] done in {elapsed:.1f}s")
+                    # Fingerprint again: inputs may have changed while it ran
+                    fingerprints.record(by_name[name], fingerprints.stage_fingerprint(by_name[name]))
+                    fingerprints.save()
+                    ran.add(name)
+                    done.add(name)
+                else:
+                    print(f"[{name}] failed with exit code {result.returncode}:")
+                    print(result.stdout[-2000:])
+                    print(result.stderr[-2000:], file=sys.stderr)
+                    failed.add(name)
+
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run analysis -> feature engineering -> training, skipping stages whose inputs are unchanged.")
+    parser.add_argument('--format', choices=list(EXTENSIONS), default=DEFAULT_FORMAT,
+                        help="File format for the intermediate tables (default: $NOSHOW_TABLE_FORMAT or csv).")
+    parser.add_argument('--csv', action='store_true', help="Also export CSV copies of binary intermediate tables.")
+    parser.add_argument('--chunksize', type=int, default=None, help="Stream transactions in chunks of this many rows.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Featurize practice shards in this many processes (feature_engineering_eda.py).")
+    parser.add_argument('--eda', action='store_true', help="Also produce the EDA report (eda_report.py).")
+    parser.add_argument('--jobs', type=int, default=2, help="Maximum number of stages run in parallel.")
+    parser.add_argument('--force', nargs='*', default=None, metavar='STAGE',
+                        help="Re-run the named stages (all stages if none are named).")
+    parser.add_argument('--dry-run', action='store_true', help="Only print which stages would run.")
+    args = parser.parse_args()
+
+    stages = build_stages(fmt=args.format, chunksize=args.chunksize, csv_copy=args.csv, eda=args.eda,
+                          workers=args.workers)
+    if args.force is None:
+        force = set()
+    else:
+        force = set(args.force) or {stage.name for stage in stages}
+
+    ok = run_pipeline(stages, jobs=args.jobs, force=force, dry_run=args.dry_run)
+    sys.exit(0 if ok else 1)
@@ -1,7 +1,9 @@
-
-import pandas as pd
 import joblib
 import os
+from datetime import datetime
+
+from feature_encoder import FeatureEncoder
+from feature_index import FeatureIndex
 
 # --- 1. LOAD SAVED ARTIFACTS ---
 
@@ -9,21 +11,28 @@ OUTPUT_DIR = 'output'
 MODEL_FILE = os.path.join(OUTPUT_DIR, 'noshow_model_rf.joblib')
 SCALER_FILE = os.path.join(OUTPUT_DIR, 'scaler.joblib')
 COLUMNS_FILE = os.path.join(OUTPUT_DIR, 'model_columns.joblib')
+# Latest patient/resource/practice statistics, written by feature_engineering_eda.py
+INDEX_FILE = os.path.join(OUTPUT_DIR, 'feature_index.joblib')
 
 print("Loading model and other artifacts...")
 model = joblib.load(MODEL_FILE)
-scaler = joblib.load(SCALER_FILE)
-model_columns = joblib.load(COLUMNS_FILE)
-
-# These are the original numerical features the scaler was trained on
-numerical_features = [
-    'LEAD_TIME_HOURS',
-    'DURATION_MIN',
-    'DAYS_SINCE_LAST_APPT',
-    'PAST_NOSHOW_RATE',
-    'RESOURCE_NOSHOW_RATE',
-    'PRACTICE_NOSHOW_RATE'
-]
+# Holds the one-hot column layout and the scaler's mean/scale vectors
+encoder = FeatureEncoder.from_files(COLUMNS_FILE, SCALER_FILE)
+# Fills in the patient, resource and practice history features from the ids;
+# loaded on first use, so full feature records can be scored without it
+_feature_index = None
+
+
+def hydrate(appointment_datetime, appointment_type, **appointment):
+    """
+    All the raw features of a new appointment from its ids and times (see
+    FeatureIndex.features), ready for predict_single.
+    """
+    global _feature_index
+    if _feature_index is None:
+        _feature_index = FeatureIndex.load(INDEX_FILE)
+    return _feature_index.features(appointment_datetime, appointment_type, **appointment)
+
 
 def predict_single(record):
     """
@@ -31,40 +40,20 @@ def predict_single(record):
     Performs all the necessary preprocessing steps.
     """
     print("\nProcessing new appointment record...")
-    # Convert single record dictionary to a DataFrame
-    df = pd.DataFrame([record])
 
     # --- 2. PREPROCESS THE NEW RECORD (must match training steps) ---
 
-    # Handle missing values
-    for col in numerical_features:
-        if col in df.columns:
-            df[col].fillna(0, inplace=True)
-
-    # Ensure boolean is string for consistent encoding
-    if 'IS_WEEKEND' in df.columns:
-        df['IS_WEEKEND'] = df['IS_WEEKEND'].astype(str)
-
-    # One-Hot Encode categorical features
-    df = pd.get_dummies(df)
-
-    # Align columns with the model's training columns
-    # This is a crucial step: adds missing columns (with value 0) and removes extra ones.
-    df = df.reindex(columns=model_columns, fill_value=0)
-
-    # Scale numerical features using the loaded scaler
-    # We only scale the columns that are both in the record and in the numerical_features list
-    features_to_scale = [f for f in numerical_features if f in df.columns]
-    if features_to_scale:
-        df[features_to_scale] = scaler.transform(df[features_to_scale])
+    # Fills missing values, one-hot encodes the categorical features, aligns
+    # them with the model's training columns and scales the numerical ones.
+    X = encoder.transform_one(record)
 
     print("Preprocessing complete. Making prediction...")
 
     # --- 3. MAKE PREDICTION ---
 
     # Predict the probability [P(Show), P(No-Show)]
-    probability = model.predict_proba(df)[0]
-    prediction = model.predict(df)[0]
+    probability = model.predict_proba(X)[0]
+    prediction = model.classes_[probability.argmax()]
 
     return prediction, probability
 
@@ -72,20 +61,17 @@ def predict_single(record):
 # --- 4. EXAMPLE USAGE ---
 
 if __name__ == "__main__":
-    # Create a sample new appointment record.
+    # A sample newly booked appointment: only the ids, the times and the type.
     # You can change these values to test different scenarios.
-    new_appointment = {
-        'LEAD_TIME_HOURS': 300,         # Booked 300 hours in advance
-        'DURATION_MIN': 15,             # A 15-minute appointment
-        'DAYS_SINCE_LAST_APPT': 90,     # Patient's last visit was 90 days ago
-        'PAST_NOSHOW_RATE': 0.5,        # Patient has a 50% no-show history
-        'RESOURCE_NOSHOW_RATE': 0.15,   # Doctor has a 15% no-show rate
-        'PRACTICE_NOSHOW_RATE': 0.1,    # Clinic has a 10% no-show rate
-        'DAY_OF_WEEK': 'Monday',        # Appointment is on a Monday
-        'HOUR_OF_DAY': 10,              # at 10 AM
-        'APPOINTMENT_TYPE': 'Examination',
-        'IS_WEEKEND': False
-    }
+    new_appointment = hydrate(
+        appointment_datetime=datetime(2025, 3, 3, 10, 0),   # Monday at 10 AM
+        appointment_type='Examination',
+        patient_id='14173-1359',
+        resource_id='1-1359',                               # the practice is looked up from the resource
+        created_at=datetime(2025, 2, 20, 14, 0),            # booked 260 hours in advance
+        duration_min=15,                                    # a 15-minute appointment
+    )
+    print("Hydrated features:", new_appointment)
 
     # Get the prediction
     pred_label, pred_prob = predict_single(new_appointment)
@@ -0,0 +1,166 @@
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    # VmHWM can be reset between steps (see _reset_peak_rss); ru_maxrss can't
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _reset_peak_rss():
+    """Resets the kernel's peak RSS counter so the next reading covers one step. Linux only."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def frame_memory_mb(frames):
+    """Memory footprint (deep, in MB) of each DataFrame/Series among `frames`."""
+    return {
+        name: round(frame.memory_usage(deep=True).sum() / 2**20 if isinstance(frame, pd.DataFrame)
+                    else frame.memory_usage(deep=True) / 2**20, 2)
+        for name, frame in frames.items()
+        if isinstance(frame, (pd.DataFrame, pd.Series))
+    }
+
+
+class Profiler:
+    """
+    Step timings for the pipeline scripts, off unless enabled with --profile.
+
+    A script marks its steps with `start(name)` / `stop(**frames)`. For each
+    step the profile records wall time, CPU time, the peak RSS reached during
+    the step (process-wide peak where the kernel can't reset it) and the
+    memory footprint of the DataFrames passed to `stop`. `save()` writes it
+    all as JSON. With `cprofile`, every step also runs under cProfile and the
+    statistics of the slowest one are dumped next to the JSON profile (the
+    timings then include the profiler's overhead).
+
+    When disabled every call is a no-op, so the scripts can call it unconditionally.
+    """
+
+    def __init__(self, script, path, enabled=False, cprofile=False):
+        self.script = script
+        self.path = path
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.steps = []
+        self._current = None
+        self._profiles = {}
+        self._started = time.perf_counter()
+
+    @classmethod
+    def from_args(cls, args, script, path):
+        return cls(script, path, enabled=args.profile or args.cprofile, cprofile=args.cprofile)
+
+    def start(self, name):
+        if not self.enabled:
+            return
+        if self._current is not None:
+            self.stop()
+        per_step = _reset_peak_rss()
+        self._current = {
+            'name': name,
+            'per_step_peak': per_step,
+            'wall': time.perf_counter(),
+            'cpu': time.process_time(),
+        }
+        if self.cprofile:
+            profile = cProfile.Profile()
+            self._profiles[name] = profile
+            profile.enable()
+
+    def stop(self, **frames):
+        """Ends the current step. DataFrames passed as keywords are measured."""
+        if not self.enabled or self._current is None:
+            return
+        step, self._current = self._current, None
+        if self.cprofile:
+            self._profiles[step['name']].disable()
+
+        self.steps.append({
+            'step': step['name'],
+            'wall_s': round(time.perf_counter() - step['wall'], 4),
+            'cpu_s': round(time.process_time() - step['cpu'], 4),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'peak_rss_scope': 'step' if step['per_step_peak'] else 'process',
+            'frames_mb': frame_memory_mb(frames),
+        })
+
+    def slowest_step(self):
+        return max(self.steps, key=lambda step: step['wall_s'])['step'] if self.steps else None
+
+    def save(self):
+        """Writes the JSON profile (and the slowest step's cProfile stats). Returns the paths written."""
+        if not self.enabled:
+            return []
+        self.stop()
+        profile = {
+            'script': self.script,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'total_wall_s': round(time.perf_counter() - self._started, 4),
+            'cprofile': self.cprofile,
+            'slowest_step': self.slowest_step(),
+            'steps': self.steps,
+        }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        written = [self.path]
+
+        slowest = profile['slowest_step']
+        if self.cprofile and slowest is not None:
+            stats_file = os.path.splitext(self.path)[0] + f'.{slowest}.prof'
+            self._profiles[slowest].dump_stats(stats_file)
+            profile['cprofile_file'] = stats_file
+            written.append(stats_file)
+
+        with open(self.path, 'w') as f:
+            json.dump(profile, f, indent=2)
+        self.report()
+        return written
+
+    def report(self):
+        """Prints the step table, and the top functions of the slowest step under cProfile."""
+        print(f"\n--- Profile: {self.script} ---")
+        print(f"{'step':<12} {'wall (s)':>9} {'cpu (s)':>9} {'peak RSS (MB)':>14}  DataFrames (MB)")
+        for step in self.steps:
+            frames = ', '.join(f"{name} {mb:,.1f}" for name, mb in step['frames_mb'].items())
+            print(f"{step['step']:<12} {step['wall_s']:>9.3f} {step['cpu_s']:>9.3f} "
+                  f"{step['peak_rss_mb']:>14.1f}  {frames}")
+        slowest = self.slowest_step()
+        if self.cprofile and slowest is not None:
+            out = io.StringIO()
+            pstats.Stats(self._profiles[slowest], stream=out).sort_stats('cumulative').print_stats(15)
+            print(f"\nSlowest step '{slowest}', top functions by cumulative time:")
+            print(out.getvalue())
+        print(f"Profile saved to {self.path}")
+
+
+def add_profile_arguments(parser):
+    """Adds the --profile/--cprofile options shared by the pipeline scripts."""
+    parser.add_argument('--profile', action='store_true',
+                        help="Record wall time, CPU time, peak RSS and DataFrame memory per step into a JSON profile.")
+    parser.add_argument('--cprofile', action='store_true',
+                        help="Like --profile, and also dump cProfile statistics of the slowest step.")
@@ -0,0 +1,288 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_FILE = 'Apointment_clean.csv'
+APPOINTMENT_FILE = 'Apointment_clean.csv'
+TRANSACTION_FILE = 'Transaction_clean.csv'
+
+APPOINTMENT_COLUMNS = [
+    'APPOINTMENT_ODU_ID', 'PRACTICE_ODU_ID', 'PRACTICE_NAME', 'CLIENT_ODU_ID', 'PATIENT_ODU_ID',
+    'RESOURCE_ODU_ID', 'APPOINTMENT_DATE', 'APPOINTMENT_DATETIME', 'DURATION', 'PIMS_SOURCE',
+    'PIMS_SCHEDULE_TYPE', 'PIMS_STATUS', 'PIMS_REASON', 'NOTES', 'APPOINTMENT_TYPE',
+    'IS_CANCELED_APPOINTMENT', 'ODU_IS_DELETED', 'ODU_CREATED_AT_UTC', 'ODU_UPDATED_AT_UTC',
+    'EXTRACTOR_CREATED_AT_UTC', 'EXTRACTOR_UPDATED_AT_UTC', 'EXTRACTOR_DELETED_AT_UTC', 'CREATED_DATE',
+]
+TRANSACTION_COLUMNS = [
+    'TRANSACTION_ODU_ID', 'PATIENT_ODU_ID', 'REPORTING_DATE', 'REPORTING_DATETIME',
+    'REPORTING_AMOUNT', 'QUANTITY', 'IS_INCLINIC', 'IS_REVENUE', 'PIMS_TRANSACTION_TYPE',
+    'IS_ONLINE', 'IS_PAYMENT', 'TOP_REVENUE_CATEGORY_NAME',
+]
+# Attributes copied together from one template row, so combinations such as
+# schedule type / appointment type / duration stay realistic
+TEMPLATE_ATTRIBUTES = [
+    'DURATION', 'PIMS_SOURCE', 'PIMS_SCHEDULE_TYPE', 'PIMS_STATUS', 'PIMS_REASON', 'NOTES',
+    'APPOINTMENT_TYPE', 'IS_CANCELED_APPOINTMENT', 'ODU_IS_DELETED',
+]
+REVENUE_CATEGORIES = ['Professional Services', 'Pharmacy', 'Laboratory', 'Diet', 'Vaccines', 'Surgery']
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Where the real extracts and the artifacts built from them live; synthetic
+# data must never replace them (use output/synthetic/ or output/benchmark/)
+PROTECTED_DIRS = [PROJECT_DIR, os.path.join(PROJECT_DIR, 'output')]
+
+
+class Template:
+    """Empirical distributions taken from the real appointment file."""
+
+    def __init__(self, path=TEMPLATE_FILE):
+        df = pd.read_csv(path)
+        appointment_time = pd.to_datetime(df['APPOINTMENT_DATETIME'], errors='coerce')
+        created_at = pd.to_datetime(df['ODU_CREATED_AT_UTC'], errors='coerce')
+        lead_hours = ((appointment_time - created_at).dt.total_seconds() / 3600).dropna()
+
+        self.attributes = df[TEMPLATE_ATTRIBUTES].reset_index(drop=True)
+        self.hours = appointment_time.dt.hour.value_counts(normalize=True)
+        self.minutes = appointment_time.dt.minute.value_counts(normalize=True)
+        self.weekdays = appointment_time.dt.weekday.value_counts(normalize=True).reindex(range(7), fill_value=0)
+        self.lead_hours = lead_hours.to_numpy()
+        self.practice_names = df['PRACTICE_NAME'].dropna().unique().tolist()
+        self.missing_patient_rate = df['PATIENT_ODU_ID'].isna().mean()
+        self.missing_created_date_rate = df['CREATED_DATE'].isna().mean()
+        self.patients_per_client = df['PATIENT_ODU_ID'].nunique() / max(df['CLIENT_ODU_ID'].nunique(), 1)
+        self.resources_per_practice = df.groupby('PRACTICE_ODU_ID')['RESOURCE_ODU_ID'].nunique().to_numpy()
+
+
+def _ids(numbers, suffix):
+    """'<number>-<suffix>' strings, the format of the ODU ids."""
+    numbers = pd.Series(numbers).astype(str)
+    if np.ndim(suffix) == 0:
+        return numbers + f'-{suffix}'
+    return numbers.str.cat(pd.Series(suffix).astype(str), sep='-')
+
+
+class SyntheticData:
+    """
+    Generates appointment and transaction files with the schema of
+    Apointment_clean.csv / Transaction_clean.csv at any size.
+
+    Practices, resources and patients scale with the number of appointments
+    (`appointments_per_practice`, the template's resources per practice and
+    `appointments_per_patient`), and each patient belongs to one practice.
+    Appointment attributes, times of day and booking lead times are sampled
+    from the template file. Whether a patient attends depends on a per-patient
+    propensity, the lead time and the appointment type; attended appointments
+    get same-day in-clinic revenue transactions, which is what analysis.py
+    turns back into the NO_SHOW label.
+    """
+
+    def __init__(self, appointments, template, seed=0, start='2025-01-01', days=59,
+                 appointments_per_patient=2.5, appointments_per_practice=2600, transactions_per_visit=1.6):
+        self.appointments = appointments
+        self.template = template
+        self.seed = seed
+        self.start = pd.Timestamp(start)
+        self.days = days
+        self.transactions_per_visit = transactions_per_visit
+
+        rng = np.random.default_rng([seed, 0])
+        n_practices = max(len(template.practice_names), round(appointments / appointments_per_practice))
+        self.practice_numbers = rng.choice(100000, size=n_practices, replace=False)
+        # The template's names, numbered once they repeat: 'Vet Hospital', ..., 'Vet Hospital 2'
+        names = template.practice_names
+        self.practice_names = [
+            names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else "")
+            for i in range(n_practices)
+        ]
+        # Uneven practice sizes, like the template's (largest ~3.5x the smallest)
+        weights = rng.uniform(1, 3.5, size=n_practices)
+        self.practice_weights = weights / weights.sum()
+
+        self.resources = rng.choice(template.resources_per_practice, size=n_practices)
+        self.resource_offsets = np.concatenate([[0], np.cumsum(self.resources)])
+
+        n_patients = max(n_practices, round(appointments * (1 - template.missing_patient_rate) / appointments_per_patient))
+        patients = np.maximum(1, np.round(self.practice_weights * n_patients)).astype(np.int64)
+        self.patient_offsets = np.concatenate([[0], np.cumsum(patients)])
+        # Per-patient no-show propensity on the logit scale
+        self.patient_effect = rng.normal(0, 1.0, size=self.patient_offsets[-1])
+        self.patients_per_client = template.patients_per_client
+
+    @property
+    def n_practices(self):
+        return len(self.practice_numbers)
+
+    @property
+    def n_patients(self):
+        return int(self.patient_offsets[-1])
+
+    def _appointment_chunk(self, first, size, rng):
+        t = self.template
+        practice = rng.choice(self.n_practices, size=size, p=self.practice_weights)
+        practice_number = self.practice_numbers[practice]
+
+        # Skewed towards low patient numbers, so some patients come often
+        patient_span = self.patient_offsets[practice + 1] - self.patient_offsets[practice]
+        patient = self.patient_offsets[practice] + (patient_span * rng.random(size) ** 2).astype(np.int64)
+        resource = self.resource_offsets[practice] + (self.resources[practice] * rng.random(size)).astype(np.int64)
+
+        day_weights = t.weekdays.to_numpy()[(self.start.weekday() + np.arange(self.days)) % 7]
+        day = rng.choice(self.days, size=size, p=day_weights / day_weights.sum())
+        hour = rng.choice(t.hours.index.to_numpy(), size=size, p=t.hours.to_numpy())
+        minute = rng.choice(t.minutes.index.to_numpy(), size=size, p=t.minutes.to_numpy())
+        appointment_time = (self.start + pd.to_timedelta(day, unit='D')
+                            + pd.to_timedelta(hour, unit='h') + pd.to_timedelta(minute, unit='min'))
+
+        lead_hours = rng.choice(t.lead_hours, size=size)
+        created_at = (appointment_time - pd.to_timedelta(lead_hours * 60, unit='min')).floor('min')
+        updated_at = (appointment_time.where(appointment_time > created_at, created_at)
+                      + pd.to_timedelta(rng.integers(0, 72 * 60, size=size), unit='min'))
+        extractor_lag = pd.to_timedelta(rng.integers(60, 180, size=size), unit='min')
+
+        attributes = t.attributes.iloc[rng.integers(0, len(t.attributes), size=size)].reset_index(drop=True)
+
+        patient_ids = _ids(patient, practice_number)
+        patient_ids[rng.random(size) < t.missing_patient_rate] = np.nan
+        client = (patient / self.patients_per_client).astype(np.int64)
+        created_date = (created_at - pd.Timedelta(days=1)).normalize().strftime('%Y-%m-%d')
+        created_date = pd.Series(created_date).where(rng.random(size) >= t.missing_created_date_rate)
+
+        df = pd.DataFrame({
+            'APPOINTMENT_ODU_ID': _ids(first + np.arange(size), practice_number),
+            'PRACTICE_ODU_ID': _ids(practice_number, 'location'),
+            'PRACTICE_NAME': np.asarray(self.practice_names, dtype=object)[practice],
+            'CLIENT_ODU_ID': _ids(client, practice_number),
+            'PATIENT_ODU_ID': patient_ids,
+            'RESOURCE_ODU_ID': _ids(resource, practice_number),
+            'APPOINTMENT_DATE': appointment_time.strftime('%Y-%m-%d'),
+            'APPOINTMENT_DATETIME': appointment_time.strftime(DATETIME_FORMAT),
+            'ODU_CREATED_AT_UTC': created_at.strftime(DATETIME_FORMAT),
+            'ODU_UPDATED_AT_UTC': updated_at.strftime(DATETIME_FORMAT),
+            'EXTRACTOR_CREATED_AT_UTC': (created_at - extractor_lag).strftime(DATETIME_FORMAT),
+            'EXTRACTOR_UPDATED_AT_UTC': (updated_at - extractor_lag).strftime(DATETIME_FORMAT),
+            'EXTRACTOR_DELETED_AT_UTC': np.nan,
+            'CREATED_DATE': created_date,
+        })
+        df = pd.concat([df, attributes], axis=1)[APPOINTMENT_COLUMNS]
+
+        # Attendance: patient propensity, long lead times, boarding/grooming and cancellations
+        logit = (-1.9 + self.patient_effect[patient]
+                 + 0.7 * (lead_hours > 72)
+                 + 0.8 * attributes['APPOINTMENT_TYPE'].isin(['Boarding', 'Grooming']).to_numpy()
+                 + 1.5 * attributes['IS_CANCELED_APPOINTMENT'].fillna(False).astype(bool).to_numpy())
+        attended = rng.random(size) >= 1 / (1 + np.exp(-logit))
+        return df, attended
+
+    def _transaction_chunk(self, first, appointments, attended, rng):
+        has_patient = appointments['PATIENT_ODU_ID'].notna().to_numpy()
+        visits = appointments[attended & has_patient]
+
+        # Attended visits: one or more same-day transactions, mostly in-clinic revenue
+        per_visit = 1 + rng.poisson(self.transactions_per_visit - 1, size=len(visits))
+        rows = np.repeat(np.arange(len(visits)), per_visit)
+        visit_time = pd.to_datetime(visits['APPOINTMENT_DATETIME'].to_numpy()[rows])
+        in_clinic = rng.random(len(rows)) < 0.9
+        revenue = rng.random(len(rows)) < 0.93
+
+        # A few transactions unrelated to an appointment (online orders, payments)
+        n_other = int(0.15 * len(appointments))
+        other = appointments['PATIENT_ODU_ID'].dropna().sample(n=n_other, replace=True, random_state=rng)
+        other_time = (self.start + pd.to_timedelta(rng.integers(0, self.days * 24 * 60, size=n_other), unit='min'))
+
+        patient_ids = pd.concat([visits['PATIENT_ODU_ID'].iloc[rows], other], ignore_index=True)
+        reporting_time = pd.Series(np.concatenate([
+            (visit_time + pd.to_timedelta(rng.integers(0, 90, size=len(rows)), unit='min')).to_numpy(),
+            other_time.to_numpy(),
+        ]))
+        size = len(patient_ids)
+        is_online = np.concatenate([np.zeros(len(rows), dtype=bool), rng.random(n_other) < 0.6])
+        is_payment = np.concatenate([np.zeros(len(rows), dtype=bool), rng.random(n_other) < 0.4])
+        amount = np.round(rng.lognormal(3.6, 0.8, size=size), 2)
+        amount[rng.random(size) < 0.03] *= -1  # refunds
+        category = np.asarray(REVENUE_CATEGORIES, dtype=object)[rng.integers(0, len(REVENUE_CATEGORIES), size=size)]
+        category[is_payment] = np.nan
+
+        return pd.DataFrame({
+            'TRANSACTION_ODU_ID': _ids(first + np.arange(size), 'x'),
+            'PATIENT_ODU_ID': patient_ids,
+            'REPORTING_DATE': reporting_time.dt.strftime('%Y-%m-%d'),
+            'REPORTING_DATETIME': reporting_time.dt.strftime(DATETIME_FORMAT),
+            'REPORTING_AMOUNT': amount,
+            'QUANTITY': 1 + rng.poisson(0.5, size=size),
+            'IS_INCLINIC': np.concatenate([in_clinic, np.zeros(n_other, dtype=bool)]),
+            'IS_REVENUE': np.concatenate([revenue, ~is_payment[len(rows):]]),
+            'PIMS_TRANSACTION_TYPE': np.where(is_payment, 'Payment', 'Invoice'),
+            'IS_ONLINE': is_online,
+            'IS_PAYMENT': is_payment,
+            'TOP_REVENUE_CATEGORY_NAME': category,
+        })[TRANSACTION_COLUMNS]
+
+    def write(self, out_dir, chunksize=500_000):
+        """
+        Writes APPOINTMENT_FILE and TRANSACTION_FILE into `out_dir`, generating
+        `chunksize` appointments at a time so memory stays flat at any size.
+        Returns the number of rows written to each file.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        appointment_path = os.path.join(out_dir, APPOINTMENT_FILE)
+        transaction_path = os.path.join(out_dir, TRANSACTION_FILE)
+        n_appointments = n_transactions = 0
+
+        for index, first in enumerate(range(0, self.appointments, chunksize)):
+            rng = np.random.default_rng([self.seed, index + 1])
+            size = min(chunksize, self.appointments - first)
+            appointments, attended = self._appointment_chunk(first, size, rng)
+            transactions = self._transaction_chunk(n_transactions, appointments, attended, rng)
+
+            mode, header = ('w', True) if index == 0 else ('a', False)
+            appointments.to_csv(appointment_path, mode=mode, header=header, index=False)
+            transactions.to_csv(transaction_path, mode=mode, header=header, index=False)
+            n_appointments += len(appointments)
+            n_transactions += len(transactions)
+            print(f"  {n_appointments:,} appointments, {n_transactions:,} transactions written")
+
+        return {'appointments': n_appointments, 'transactions': n_transactions}
+
+
+def generate(out_dir, appointments, seed=0, template_file=TEMPLATE_FILE, **options):
+    """
+    Writes a synthetic data set into `out_dir`. Returns the row counts.
+    Raises ValueError if `out_dir` is the project directory or its output/.
+    """
+    if os.path.realpath(out_dir) in {os.path.realpath(d) for d in PROTECTED_DIRS}:
+        raise ValueError(f"Refusing to write synthetic data into {out_dir}: it holds the real extracts or the "
+                         f"artifacts built from them. Use a directory such as output/synthetic.")
+    data = SyntheticData(appointments, Template(template_file), seed=seed, **options)
+    print(f"Generating {appointments:,} appointments for {data.n_practices:,} practices "
+          f"and {data.n_patients:,} patients into {out_dir}/...")
+    return data.write(out_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic Apointment_clean.csv / Transaction_clean.csv files for scaling tests.")
+    parser.add_argument('--appointments', type=int, default=100_000, help="Number of appointments to generate.")
+    parser.add_argument('--out', default=os.path.join('output', 'synthetic'), help="Directory to write the files to.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--template', default=TEMPLATE_FILE,
+                        help="Real appointment file the value distributions are taken from.")
+    parser.add_argument('--start', default='2025-01-01', help="First appointment date.")
+    parser.add_argument('--days', type=int, default=59, help="Number of days the appointments are spread over.")
+    parser.add_argument('--appointments-per-patient', type=float, default=2.5)
+    parser.add_argument('--appointments-per-practice', type=int, default=2600)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        counts = generate(args.out, args.appointments, seed=args.seed, template_file=args.template,
+                          start=args.start, days=args.days,
+                          appointments_per_patient=args.appointments_per_patient,
+                          appointments_per_practice=args.appointments_per_practice)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Done in {time.perf_counter() - start:.1f}s: {counts['appointments']:,} appointments, "
+          f"{counts['transactions']:,} transactions.")
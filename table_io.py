@@ -0,0 +1,87 @@
+import os
+
+import pandas as pd
+
+# Intermediate tables (analysis_results, output/final_features_and_eda) can be
+# stored as CSV or in a columnar binary format. Feather (Arrow IPC) and Parquet
+# keep the category/boolean/datetime dtypes, can load a subset of columns, and
+# Feather files are memory-mapped on read. Both need pyarrow.
+EXTENSIONS = {
+    'csv': '.csv',
+    'feather': '.feather',
+    'parquet': '.parquet',
+}
+DEFAULT_FORMAT = os.environ.get('NOSHOW_TABLE_FORMAT', 'csv')
+
+
+def table_stem(path):
+    """Strips a known table extension: 'output/x.csv' -> 'output/x'."""
+    root, ext = os.path.splitext(path)
+    return root if ext in EXTENSIONS.values() else path
+
+
+def table_paths(path):
+    """All the files a table may be stored in, one per format."""
+    stem = table_stem(path)
+    return [stem + ext for ext in EXTENSIONS.values()]
+
+
+def find_table(path):
+    """
+    Returns the most recently written file of a table, whatever its format.
+    Raises FileNotFoundError if the table was never written.
+    """
+    existing = [p for p in table_paths(path) if os.path.exists(p)]
+    if not existing:
+        raise FileNotFoundError(f"No table found at {table_stem(path)} (.csv, .feather or .parquet)")
+    # On a tie the binary formats win over CSV
+    return max(existing, key=lambda p: (os.path.getmtime(p), not p.endswith(EXTENSIONS['csv'])))
+
+
+def read_table(path, columns=None, parse_dates=None, **csv_kwargs):
+    """
+    Reads the newest stored version of a table. `columns` loads only those
+    columns. `parse_dates` and `csv_kwargs` only apply to CSV files; the
+    binary formats already store parsed datetimes.
+    """
+    path = find_table(path)
+    if path.endswith(EXTENSIONS['feather']):
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    if path.endswith(EXTENSIONS['parquet']):
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if columns is not None and parse_dates is not None:
+        parse_dates = [col for col in parse_dates if col in columns]
+    return pd.read_csv(path, usecols=columns, parse_dates=parse_dates, **csv_kwargs)
+
+
+def write_table(df, path, fmt=DEFAULT_FORMAT, csv_copy=False):
+    """
+    Writes a table in `fmt` ('csv', 'feather' or 'parquet'). With `csv_copy`,
+    a CSV export is written next to the binary file. Returns the paths written.
+    """
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown table format '{fmt}'. Choose one of: {', '.join(EXTENSIONS)}")
+
+    stem = table_stem(path)
+    written = []
+    # The CSV copy goes first so the binary file is the newest one and is
+    # what find_table picks up.
+    if fmt == 'csv' or csv_copy:
+        df.to_csv(stem + EXTENSIONS['csv'], index=False)
+        written.append(stem + EXTENSIONS['csv'])
+    if fmt == 'feather':
+        df.reset_index(drop=True).to_feather(stem + EXTENSIONS['feather'])
+        written.append(stem + EXTENSIONS['feather'])
+    elif fmt == 'parquet':
+        df.to_parquet(stem + EXTENSIONS['parquet'], index=False)
+        written.append(stem + EXTENSIONS['parquet'])
+    return written
+
+
+def add_format_arguments(parser):
+    """Adds the --format/--csv options shared by the scripts that write tables."""
+    parser.add_argument('--format', choices=list(EXTENSIONS), default=DEFAULT_FORMAT,
+                        help="File format for the output table (default: $NOSHOW_TABLE_FORMAT or csv).")
+    parser.add_argument('--csv', action='store_true',
+                        help="Also export a CSV copy when writing a binary format.")
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from appointment_features import add_appointment_features, add_group_rates
+from feature_index import FeatureIndex
+from patient_history import add_patient_history
+
+HISTORY_FEATURES = ['DAYS_SINCE_LAST_APPT', 'PAST_NOSHOW_RATE', 'RESOURCE_NOSHOW_RATE', 'PRACTICE_NOSHOW_RATE']
+
+
+def appointments(rows):
+    columns = ['APPOINTMENT_ODU_ID', 'PATIENT_ODU_ID', 'RESOURCE_ODU_ID', 'PRACTICE_ODU_ID',
+               'APPOINTMENT_DATETIME', 'CREATED_DATE', 'APPOINTMENT_TYPE', 'DURATION', 'NO_SHOW']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def featurize(df):
+    """The offline features, as feature_engineering_eda.py computes them."""
+    return add_group_rates(add_patient_history(add_appointment_features(df)))
+
+
+HISTORY = appointments([
+    ['a1', 'p1', 'r1', 'x', '2025-01-06 09:00', '2025-01-01', 'Exam', 30.0, False],
+    ['a2', 'p1', 'r2', 'x', '2025-02-03 10:00', '2025-01-20', 'Exam', 20.0, True],
+    ['a3', 'p1', 'r1', 'x', '2025-03-03 11:00', '2025-02-20', 'Surgery', 90.0, False],
+    ['a4', 'p2', 'r1', 'x', '2025-01-07 09:00', '2025-01-02', 'Exam', 30.0, True],
+    ['a5', 'p2', 'r3', 'y', '2025-02-10 14:00', '2025-02-01', 'Exam', 40.0, False],
+    ['a6', 'p3', 'r3', 'y', '2025-03-10 15:00', '2025-03-01', 'Surgery', 60.0, True],
+])
+
+
+def test_hydrate_frame_matches_the_offline_features_of_a_known_patient(tmp_path):
+    features = featurize(HISTORY.copy())
+    FeatureIndex.from_frame(features).save(tmp_path / 'index.joblib')
+    index = FeatureIndex.load(tmp_path / 'index.joblib')
+
+    # p1's next appointment; offline it would be featurized together with the history
+    new = appointments([['a7', 'p1', 'r1', 'x', '2025-04-01 09:30', '2025-03-20', 'Exam', np.nan, False]])
+    offline = featurize(pd.concat([HISTORY, new], ignore_index=True))
+    offline = offline[offline['APPOINTMENT_ODU_ID'] == 'a7'].iloc[0]
+    stored = features.set_index('APPOINTMENT_ODU_ID')
+
+    hydrated = index.hydrate_frame(add_appointment_features(new.drop(columns='NO_SHOW'))).iloc[0]
+
+    assert hydrated['DAYS_SINCE_LAST_APPT'] == offline['DAYS_SINCE_LAST_APPT'] == 28
+    assert hydrated['PAST_NOSHOW_RATE'] == offline['PAST_NOSHOW_RATE'] == 1 / 3
+    # The group rates are the ones of the offline feature table
+    assert hydrated['RESOURCE_NOSHOW_RATE'] == stored.loc['a1', 'RESOURCE_NOSHOW_RATE']
+    assert hydrated['PRACTICE_NOSHOW_RATE'] == stored.loc['a1', 'PRACTICE_NOSHOW_RATE']
+    # A missing duration is the median of the appointment type
+    assert hydrated['DURATION_MIN'] == 30.0
+
+
+def test_hydrate_frame_agrees_with_history_per_record():
+    index = FeatureIndex.from_frame(featurize(HISTORY.copy()))
+    # A known patient without a practice id, an unknown patient and an appointment without ids
+    rows = [
+        ['b1', 'p2', 'r3', None, '2025-04-02 10:00', '2025-03-30', 'Surgery', 45.0, False],
+        ['b2', 'p9', 'r1', 'y', '2025-04-02 11:00', '2025-03-30', 'Exam', np.nan, False],
+        ['b3', None, None, None, '2025-04-03 12:00', None, 'Dental', np.nan, False],
+    ]
+    new = appointments(rows).drop(columns='NO_SHOW')
+
+    hydrated = index.hydrate_frame(add_appointment_features(new, required=['APPOINTMENT_DATETIME']))
+
+    for (appointment_id, patient, resource, practice, time, *_), row in zip(rows, hydrated.itertuples()):
+        record = index.history(patient, resource, practice, pd.Timestamp(time))
+        for feature in HISTORY_FEATURES:
+            expected = np.nan if record[feature] is None else record[feature]
+            np.testing.assert_equal(getattr(row, feature), expected, err_msg=f'{appointment_id} {feature}')
@@ -0,0 +1,47 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import FlatForest
+
+
+def test_save_keeps_features_no_tree_splits_on(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 4)).astype(np.float32)
+    # The last two columns are constant, so no split uses them
+    X[:, 2:] = 0
+    y = (X[:, 0] > 0.5).astype(int)
+    model = RandomForestClassifier(n_estimators=5, max_depth=3, random_state=0).fit(X, y)
+
+    forest = FlatForest.from_sklearn(model)
+    forest.save(tmp_path / 'forest.npz')
+    loaded = FlatForest.load(tmp_path / 'forest.npz')
+
+    assert forest.n_features_in_ == loaded.n_features_in_ == 4
+    probabilities, _, contributions = loaded.predict_contributions(X)
+    assert contributions.shape == (200, 4)
+    np.testing.assert_allclose(probabilities, model.predict_proba(X), atol=1e-12)
+
+
+def test_predict_proba_matches_sklearn_before_and_after_compact():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(2000, 6)).astype(np.float32)
+    # Coarse values repeat, so many deep splits end in leaves with identical values
+    X[:, 3] = np.round(X[:, 3])
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = ((np.nan_to_num(X[:, 0]) + np.nan_to_num(X[:, 1]) * X[:, 3] > 0) ^ (rng.random(2000) < 0.1)).astype(int)
+    model = RandomForestClassifier(n_estimators=10, min_samples_leaf=3, random_state=0).fit(X, y)
+    expected = model.predict_proba(X)
+
+    forest = FlatForest.from_sklearn(model)
+    compact = forest.compact()
+
+    assert len(compact.left) < len(forest.left)
+    assert compact.threshold.dtype == np.float32
+    np.testing.assert_allclose(forest.predict_proba(X), expected, atol=1e-6)
+    np.testing.assert_allclose(compact.predict_proba(X), expected, atol=1e-6)
+    # Inputs at and next to the float32 roundings of the thresholds take the same branches as in sklearn
+    thresholds = forest.threshold[(forest.left != -1) & np.isfinite(forest.threshold)].astype(np.float32)
+    near = np.concatenate([thresholds, np.nextafter(thresholds, np.float32(-np.inf)),
+                           np.nextafter(thresholds, np.float32(np.inf))])
+    X_near = np.tile(near[:, None], (1, 6))
+    np.testing.assert_allclose(compact.predict_proba(X_near), model.predict_proba(X_near), atol=1e-6)
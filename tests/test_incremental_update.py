@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from conftest import PROJECT_DIR
+from incremental_update import new_appointments
+from synthetic_data import generate
+from table_io import read_table
+
+APPOINTMENTS = 25_000
+
+
+def run(script, cwd, *args):
+    subprocess.run([sys.executable, os.path.join(PROJECT_DIR, script), *args], cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def build(data_dir):
+    """analysis.py and feature_engineering_eda.py over the files in `data_dir`."""
+    os.makedirs(os.path.join(data_dir, 'output'), exist_ok=True)
+    run('analysis.py', data_dir, '--format', 'feather')
+    run('feature_engineering_eda.py', data_dir, '--format', 'feather')
+
+
+def test_incremental_update_matches_a_full_rebuild(tmp_path):
+    full, base = tmp_path / 'full', tmp_path / 'base'
+    generate(full, APPOINTMENTS, seed=1, template_file=os.path.join(PROJECT_DIR, 'Apointment_clean.csv'))
+    appts = pd.read_csv(full / 'Apointment_clean.csv', dtype=str, keep_default_na=False)
+    txns = pd.read_csv(full / 'Transaction_clean.csv', dtype=str, keep_default_na=False)
+
+    # The last tenth of the appointment updates and every tenth transaction arrive as deltas
+    updated = pd.to_datetime(appts['ODU_UPDATED_AT_UTC'])
+    late = (updated > updated.quantile(0.9)).to_numpy()
+    delayed = (txns.index % 10 == 0)
+    base.mkdir()
+    appts[~late].to_csv(base / 'Apointment_clean.csv', index=False)
+    txns[~delayed].to_csv(base / 'Transaction_clean.csv', index=False)
+    appts[late].to_csv(tmp_path / 'delta_appointments.csv', index=False)
+    txns[delayed].to_csv(tmp_path / 'delta_transactions.csv', index=False)
+
+    build(full)
+    build(base)
+    run('incremental_update.py', base, '--appointments', str(tmp_path / 'delta_appointments.csv'),
+        '--transactions', str(tmp_path / 'delta_transactions.csv'))
+
+    expected = read_table(str(full / 'output' / 'final_features_and_eda'))
+    result = read_table(str(base / 'output' / 'final_features_and_eda'))
+    assert len(result) == len(expected)
+    for column in expected.columns:
+        pd.testing.assert_series_equal(result[column].astype(expected[column].dtype), expected[column],
+                                       check_categorical=False, obj=column)
+
+
+def test_new_appointments_upserts_against_each_stored_version(tmp_path):
+    rows = pd.read_csv(os.path.join(PROJECT_DIR, 'Apointment_clean.csv'), nrows=5, dtype=str)
+    rows['APPOINTMENT_ODU_ID'] = ['late', 'stale', 'same', 'undated', 'new']
+    stored = pd.DataFrame({
+        'APPOINTMENT_ODU_ID': ['late', 'stale', 'same', 'undated', 'newest'],
+        'ODU_UPDATED_AT_UTC': ['2025-01-01 00:00:00', '2025-03-01 00:00:00', '2025-02-01 00:00:00',
+                               '2025-01-01 00:00:00', '2025-06-01 00:00:00'],
+    })
+    # 'late' is older than the newest stored appointment but newer than its own stored version
+    rows['ODU_UPDATED_AT_UTC'] = ['2025-02-01 00:00:00', '2025-02-01 00:00:00', '2025-02-01 00:00:00',
+                                  'not a time', '2025-02-01 00:00:00']
+    rows.to_csv(tmp_path / 'delta.csv', index=False)
+
+    appts, skipped = new_appointments(str(tmp_path / 'delta.csv'), stored)
+
+    assert sorted(appts['APPOINTMENT_ODU_ID']) == ['late', 'new']
+    assert skipped == {'stale': 1, 'undated': 1}
@@ -0,0 +1,22 @@
+import asyncio
+
+from micro_batcher import MicroBatcher
+
+
+def predict(items):
+    if any(item < 0 for item in items):
+        raise ValueError("negative item")
+    return [item * 2 for item in items]
+
+
+def test_a_bad_item_only_fails_its_own_request():
+    async def run():
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait=0.05)
+        try:
+            return await asyncio.gather(*(batcher.submit(item) for item in [1, -1, 3]), return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    good, bad, other = asyncio.run(run())
+    assert (good, other) == (2, 6)
+    assert isinstance(bad, ValueError)
@@ -0,0 +1,65 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from feature_encoder import FeatureEncoder, NUMERICAL_FEATURES
+from forest_engine import FlatForest
+from model_bundle import list_versions, load_bundle, publish_bundle, read_current, set_current
+
+MODEL_COLUMNS = NUMERICAL_FEATURES + ['DAY_OF_WEEK_Monday', 'DAY_OF_WEEK_Saturday', 'HOUR_OF_DAY_10',
+                                      'APPOINTMENT_TYPE_Surgery', 'IS_WEEKEND_True']
+RECORDS = [
+    {'LEAD_TIME_HOURS': 48.0, 'DURATION_MIN': 30.0, 'PAST_NOSHOW_RATE': 0.5, 'DAY_OF_WEEK': 'Monday',
+     'HOUR_OF_DAY': 10, 'APPOINTMENT_TYPE': 'Surgery', 'IS_WEEKEND': False},
+    {'LEAD_TIME_HOURS': 2.0, 'DAYS_SINCE_LAST_APPT': 400.0, 'RESOURCE_NOSHOW_RATE': 0.2,
+     'DAY_OF_WEEK': 'Saturday', 'HOUR_OF_DAY': 9, 'APPOINTMENT_TYPE': 'Exam', 'IS_WEEKEND': True},
+    {},
+]
+
+
+def train(seed):
+    """A forest, its columns and its scaler, like model_training_rf.py saves them."""
+    rng = np.random.default_rng(seed)
+    scaler = StandardScaler().fit(rng.normal(50, 20, (100, len(NUMERICAL_FEATURES))))
+    X = rng.random((300, len(MODEL_COLUMNS))).astype(np.float32)
+    y = (X[:, 0] + X[:, 6] > 1).astype(int)
+    model = RandomForestClassifier(n_estimators=5, max_depth=6, random_state=seed).fit(X, y)
+    return model, MODEL_COLUMNS, scaler
+
+
+def publish(models_dir, seed, activate=True):
+    model, columns, scaler = train(seed)
+    return publish_bundle(FlatForest.from_sklearn(model), columns, scaler, str(models_dir), activate=activate)
+
+
+def test_published_bundle_scores_like_the_saved_model(tmp_path):
+    model, columns, scaler = train(0)
+    manifest = publish_bundle(FlatForest.from_sklearn(model), columns, scaler, str(tmp_path))
+
+    forest, encoder, loaded = load_bundle(str(tmp_path / manifest['version']), verify=True)
+
+    assert loaded['version'] == manifest['version']
+    assert isinstance(forest.left, np.memmap)
+    X = FeatureEncoder(columns, scaler).transform_records(RECORDS)
+    np.testing.assert_array_equal(encoder.transform_records(RECORDS), X)
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), atol=1e-6)
+
+
+def test_publish_activate_rollback_round_trip(tmp_path):
+    first = publish(tmp_path, seed=0)['version']
+    second = publish(tmp_path, seed=1)['version']
+    assert first != second
+    assert read_current(str(tmp_path))['version'] == second
+    assert read_current(str(tmp_path))['previous'] == first
+    # The same model, columns and scaler publish the same version
+    assert publish(tmp_path, seed=0, activate=False)['version'] == first
+    assert {m['version'] for m in list_versions(str(tmp_path))} == {first, second}
+
+    set_current(first, str(tmp_path))
+    assert read_current(str(tmp_path))['version'] == first
+    assert read_current(str(tmp_path))['previous'] == second
+
+    # Rolling back makes the previously active version current again
+    current = set_current(read_current(str(tmp_path))['previous'], str(tmp_path))
+    assert (current['version'], current['previous']) == (second, first)
+    assert load_bundle(str(tmp_path / current['version']))[2]['version'] == second
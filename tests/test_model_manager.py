@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from feature_encoder import NUMERICAL_FEATURES
+from forest_engine import FlatForest
+from model_bundle import publish_bundle, read_current, set_current
+from model_manager import ModelManager
+
+MODEL_COLUMNS = NUMERICAL_FEATURES + ['DAY_OF_WEEK_Monday', 'HOUR_OF_DAY_10', 'IS_WEEKEND_True']
+
+
+def publish(models_dir, seed):
+    rng = np.random.default_rng(seed)
+    scaler = StandardScaler().fit(rng.normal(50, 20, (100, len(NUMERICAL_FEATURES))))
+    X = rng.random((200, len(MODEL_COLUMNS))).astype(np.float32)
+    model = RandomForestClassifier(n_estimators=3, max_depth=4, random_state=seed).fit(X, X[:, 0] > 0.5)
+    return publish_bundle(FlatForest.from_sklearn(model), MODEL_COLUMNS, scaler, str(models_dir))['version']
+
+
+def test_activate_and_rollback_round_trip(tmp_path):
+    first = publish(tmp_path, seed=0)
+    swaps = []
+    manager = ModelManager(str(tmp_path), on_swap=lambda loaded, reason: swaps.append((loaded.version, reason)))
+    with pytest.raises(LookupError):
+        manager.rollback()
+
+    assert manager.check()
+    assert manager.active.version == first
+    assert not manager.check()
+
+    # A newly published version is picked up from CURRENT and the old one kept in memory
+    second = publish(tmp_path, seed=1)
+    assert manager.check()
+    assert (manager.active.version, manager.previous.version) == (second, first)
+    kept = manager.previous
+
+    loaded = manager.rollback()
+    assert loaded is kept
+    assert (manager.active.version, manager.previous.version) == (first, second)
+    # CURRENT follows, so other workers and restarts serve the rolled back version
+    assert read_current(str(tmp_path))['version'] == first
+    assert not manager.check()
+
+    # When CURRENT names the previous version again, it is switched back from memory
+    previous = manager.previous
+    set_current(second, str(tmp_path))
+    assert manager.check()
+    assert manager.active is previous
+    X = np.zeros((2, len(MODEL_COLUMNS)), dtype=np.float32)
+    assert manager.active.model.predict_proba(X).shape == (2, 2)
+    assert swaps == [(first, 'swap'), (second, 'swap'), (first, 'rollback'), (second, 'rollback')]
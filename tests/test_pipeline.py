@@ -0,0 +1,13 @@
+from pipeline import build_stages, project_modules
+
+
+def test_stage_inputs_cover_the_modules_scripts_import():
+    stages = {stage.name: stage for stage in build_stages(eda=True)}
+
+    for name in ['analysis', 'features', 'train_logistic', 'train_rf']:
+        assert 'profiling.py' in stages[name].inputs
+    # model_training_rf.py -> model_bundle.py -> feature_encoder.py
+    assert 'feature_encoder.py' in stages['train_rf'].inputs
+    # feature_engineering_eda.py -> feature_index.py -> table_io.py
+    assert 'table_io.py' in project_modules('feature_index.py')
+    assert 'table_io.py' in stages['features'].inputs
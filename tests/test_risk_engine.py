@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from risk_engine import contribution_risk_factors, feature_group_matrix, risk_factor_labels, risk_factor_names
+
+COLUMN_FEATURES = ['PAST_NOSHOW_RATE', 'LEAD_TIME_HOURS', 'IS_WEEKEND', 'DAY_OF_WEEK', 'DAY_OF_WEEK']
+
+
+def explain(df, contributions):
+    features, groups = feature_group_matrix(COLUMN_FEATURES)
+    names = risk_factor_names(features)
+    labels = risk_factor_labels(df, features, names)
+    return names, contribution_risk_factors(np.asarray(contributions, dtype=float), groups, labels, names)
+
+
+def test_value_specific_labels_follow_the_row():
+    df = pd.DataFrame({
+        'PAST_NOSHOW_RATE': [0.5, np.nan, 0.0],
+        'IS_WEEKEND': [True, False, False],
+    })
+    # PAST_NOSHOW_RATE and IS_WEEKEND raise the probability on every row
+    contributions = [[0.3, -0.1, 0.2, 0.0, 0.0]] * 3
+    names, (flags, lists) = explain(df, contributions)
+
+    assert lists[0] == ["History of No-Shows", "Weekend Appointment"]
+    # A weekday row without history gets the neutral labels
+    assert lists[1] == ["Past Attendance", "Day of Week"]
+    assert lists[2] == ["Past Attendance", "Day of Week"]
+    assert flags[1, names.index("Weekend Appointment")] == False
+    assert flags[1, names.index("History of No-Shows")] == False
+
+
+def test_shared_neutral_label_is_listed_once():
+    df = pd.DataFrame({'PAST_NOSHOW_RATE': [0.0], 'IS_WEEKEND': [False]})
+    # IS_WEEKEND and both DAY_OF_WEEK columns raise the probability
+    names, (flags, lists) = explain(df, [[0.0, 0.0, 0.2, 0.1, 0.05]])
+
+    assert lists[0] == ["Day of Week"]
+    assert flags[0].sum() == 1
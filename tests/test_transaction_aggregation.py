@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from transaction_aggregation import aggregate_transactions, aggregate_transaction_chunks
+
+
+def transactions(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        # Some transactions repeat, so their rows land in different chunks
+        'TRANSACTION_ODU_ID': [f't{i}' for i in rng.integers(0, n // 2, n)],
+        'PATIENT_ODU_ID': [f'p{i}' for i in rng.integers(0, 40, n)],
+        'REPORTING_DATE': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 20, n), unit='D'),
+        'REPORTING_AMOUNT': rng.normal(50, 20, n),
+        'QUANTITY': rng.integers(1, 5, n),
+        'IS_INCLINIC': rng.random(n) < 0.5,
+        'IS_REVENUE': rng.random(n) < 0.5,
+    })
+
+
+def test_chunks_match_a_single_groupby():
+    txns = transactions()
+    expected = aggregate_transactions(txns.assign(TXN_DATE=txns['REPORTING_DATE'])).reset_index(drop=True)
+
+    chunks = (txns.iloc[start:start + 7].copy() for start in range(0, len(txns), 7))
+    result = aggregate_transaction_chunks(chunks)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+
+GROUP_KEYS = ['PATIENT_ODU_ID', 'TXN_DATE']
+
+# Patient-days are grouped and joined on one int64 key instead of a string id
+# plus a date: the patient's code in a dictionary of ids in the high 32 bits
+# and the day number (days since 1970-01-01, offset to stay positive) in the
+# low 32 bits, so the keys sort like (patient, day) pairs.
+DAY_OFFSET = 2**31
+DAY_MASK = 2**32 - 1
+MISSING_KEY = -1
+
+
+def to_day(dates):
+    """Dates or datetimes (or their text) truncated to midnight, as datetime64."""
+    return pd.to_datetime(dates).dt.normalize()
+
+
+def patient_day_keys(codes, dates):
+    """
+    The patient-day key of every row from the patient codes (-1 for a missing
+    id) and datetimes. Rows missing either get MISSING_KEY.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    codes = np.asarray(codes, dtype=np.int64)
+    keys = (codes << 32) | (dates.view(np.int64) + DAY_OFFSET)
+    keys[(codes < 0) | np.isnat(dates)] = MISSING_KEY
+    return keys
+
+
+def split_patient_day_keys(keys, patients):
+    """Turns keys back into a frame of GROUP_KEYS columns; `patients` is the dictionary (code -> id)."""
+    days = ((keys & DAY_MASK) - DAY_OFFSET).astype('datetime64[D]')
+    return pd.DataFrame({
+        'PATIENT_ODU_ID': pd.Index(patients).take(keys >> 32),
+        'TXN_DATE': days.astype('datetime64[us]'),
+    })
+
+
+def encode_patients(*columns):
+    """
+    Codes the patient ids of several columns with one shared dictionary,
+    numbered in sorted order of the ids. Returns (codes of each column, the
+    dictionary of ids).
+    """
+    codes, patients = pd.factorize(pd.concat(columns, ignore_index=True), sort=True)
+    return np.split(codes, np.cumsum([len(column) for column in columns])[:-1]), patients
+
+
+def aggregate_transactions(txns, codes=None, patients=None):
+    """
+    Aggregates transactions per patient and day: total amount and quantity,
+    whether any was in-clinic / revenue, and the number of distinct transactions.
+    `txns` needs a TXN_DATE column.
+
+    Rows are grouped on integer patient-day keys. `codes` and `patients` are
+    the patient ids already coded (see encode_patients); without them the ids
+    are coded here. The result is sorted by patient and day and indexed by
+    the patient-day keys.
+    """
+    if codes is None:
+        codes, patients = pd.factorize(txns['PATIENT_ODU_ID'], sort=True)
+    keys = patient_day_keys(codes, txns['TXN_DATE'])
+    valid = keys != MISSING_KEY
+
+    agg_txn = (
+        txns.loc[valid, ['REPORTING_AMOUNT', 'QUANTITY', 'IS_INCLINIC', 'IS_REVENUE', 'TRANSACTION_ODU_ID']]
+        .groupby(keys[valid])
+        .agg(
+            total_amount=('REPORTING_AMOUNT', 'sum'),
+            total_qty=('QUANTITY','sum'),
+            any_inclinic=('IS_INCLINIC','max'),
+            any_revenue=('IS_REVENUE','max'),
+            txn_count=('TRANSACTION_ODU_ID','nunique')
+        )
+    )
+    agg_txn['any_inclinic'] = agg_txn['any_inclinic'].astype(bool)
+    agg_txn['any_revenue'] = agg_txn['any_revenue'].astype(bool)
+    # The ids are only looked up again for the output
+    group_keys = split_patient_day_keys(agg_txn.index.to_numpy(), patients).astype(
+        {'PATIENT_ODU_ID': txns['PATIENT_ODU_ID'].dtype})
+    return pd.concat([group_keys.set_axis(agg_txn.index), agg_txn], axis=1)
+
+
+class SortedRuns:
+    """
+    A growing set of keys, optionally with an integer value per key, kept as
+    a few sorted runs whose lengths at least double from the newest to the
+    oldest, like the digits of a binary counter. Adding a run merges it with
+    the runs that are not much longer than it, so every key is copied
+    O(log n) times overall, instead of every known key being copied for
+    every chunk.
+    """
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        # (keys, values or None), oldest and longest first
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(keys) for keys, _ in self._runs)
+
+    def lookup(self, keys):
+        """The value of every key (0 in a set without values), -1 where the key is not in the set."""
+        values = np.full(len(keys), -1, dtype=np.intp)
+        for run_keys, run_values in self._runs:
+            at = np.searchsorted(run_keys, keys).clip(max=len(run_keys) - 1)
+            found = run_keys[at] == keys
+            values[found] = run_values[at[found]] if run_values is not None else 0
+        return values
+
+    def keys(self):
+        """All the keys as one sorted array; merges the runs into one."""
+        while len(self._runs) > 1:
+            self._merge_last()
+        return self._runs[0][0] if self._runs else np.empty(0, dtype=self.dtype)
+
+    def add(self, keys, values=None):
+        """Adds sorted, distinct keys that are not in the set yet."""
+        if not len(keys):
+            return
+        self._runs.append((np.asarray(keys, dtype=self.dtype),
+                           None if values is None else np.asarray(values, dtype=np.intp)))
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= 2 * len(self._runs[-1][0]):
+            self._merge_last()
+
+    def _merge_last(self):
+        """Merges the two newest runs in one linear pass."""
+        (old_keys, old_values), (new_keys, new_values) = self._runs[-2:]
+        # The new keys' positions in the merged run
+        at = np.searchsorted(old_keys, new_keys) + np.arange(len(new_keys))
+        is_new = np.zeros(len(old_keys) + len(new_keys), dtype=bool)
+        is_new[at] = True
+        keys = np.empty(len(is_new), dtype=self.dtype)
+        keys[at], keys[~is_new] = new_keys, old_keys
+        values = None
+        if old_values is not None:
+            values = np.empty(len(is_new), dtype=np.intp)
+            values[at], values[~is_new] = new_values, old_values
+        self._runs[-2:] = [(keys, values)]
+
+
+class TransactionAggregator:
+    """
+    Builds the same result as aggregate_transactions from a stream of chunks.
+
+    Only running aggregates are kept between chunks, never the rows, so memory
+    is O(distinct transactions) rather than O(file size):
+
+    - amounts and quantities are summed with the same compensated (Kahan)
+      summation pandas' groupby uses, and the compensation term is carried
+      over between chunks, so the totals are bit-for-bit identical to a
+      single groupby over the whole file;
+    - the in-clinic / revenue flags are running maxima;
+    - distinct transaction counts can't be summed across chunks (the same
+      transaction may be split over two chunks), so the aggregator also keeps
+      one 64-bit hash per distinct (patient, day, transaction) and only
+      counts hashes it has not seen before. That costs 8 bytes per distinct
+      transaction instead of a full row, and is the term that dominates
+      memory.
+
+    Patient-days are tracked by their integer key: patient ids are numbered
+    in a dictionary that grows as chunks bring new ones. The known keys and
+    the transaction hashes are kept in SortedRuns, so a chunk's keys are
+    matched with a few binary searches and adding them doesn't re-sort or
+    copy everything seen so far.
+    """
+
+    SUM_COLUMNS = {'total_amount': 'REPORTING_AMOUNT', 'total_qty': 'QUANTITY'}
+    MAX_COLUMNS = {'any_inclinic': 'IS_INCLINIC', 'any_revenue': 'IS_REVENUE'}
+
+    def __init__(self):
+        self._patients = None
+        self._known_keys = SortedRuns(np.int64)
+        self._slot_keys = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        self._sums = {name: np.zeros(0) for name in self.SUM_COLUMNS}
+        self._compensations = {name: np.zeros(0) for name in self.SUM_COLUMNS}
+        # Integer columns stay integers, as long as every chunk was read as integers
+        self._integer = {name: True for name in self.SUM_COLUMNS}
+        # -1 means no non-missing value seen yet
+        self._flags = {name: np.zeros(0, dtype=np.int8) for name in self.MAX_COLUMNS}
+        self._txn_count = np.zeros(0, dtype=np.int64)
+        self._seen = SortedRuns(np.uint64)
+        self._key_dtypes = None
+
+    def _grow(self, size):
+        capacity = len(self._txn_count)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+
+        def resized(array, fill):
+            out = np.full(capacity, fill, dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+
+        self._sums = {name: resized(a, 0.0) for name, a in self._sums.items()}
+        self._compensations = {name: resized(a, 0.0) for name, a in self._compensations.items()}
+        self._flags = {name: resized(a, -1) for name, a in self._flags.items()}
+        self._txn_count = resized(self._txn_count, 0)
+        self._slot_keys = resized(self._slot_keys, 0)
+
+    def _patient_codes(self, ids):
+        """Codes of the ids in the shared dictionary, adding the ones not seen yet."""
+        if self._patients is None:
+            self._patients = pd.Index(pd.unique(ids))
+        codes = self._patients.get_indexer(ids)
+        new = codes < 0
+        if new.any():
+            self._patients = self._patients.append(pd.Index(pd.unique(ids[new])))
+            codes[new] = self._patients.get_indexer(ids[new])
+        return codes
+
+    def _group_positions(self, keys):
+        """Maps every row's patient-day key to its slot, adding new ones."""
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        slots = self._known_keys.lookup(uniques)
+        new = slots < 0
+        slots[new] = np.arange(self._size, self._size + new.sum())
+        self._size += int(new.sum())
+        self._grow(self._size)
+        self._slot_keys[slots[new]] = uniques[new]
+        self._known_keys.add(uniques[new], slots[new])
+        return slots[inverse]
+
+    def _kahan_sum(self, name, positions, values):
+        total, compensation = self._sums[name], self._compensations[name]
+        valid = ~np.isnan(values)
+        positions, values = positions[valid], values[valid]
+
+        # Rows are added in file order within each group. Grouping rows by
+        # their rank inside the group lets every group advance in one step.
+        rank = pd.Series(positions).groupby(positions).cumcount().to_numpy()
+        order = np.argsort(rank, kind='stable')
+        bounds = np.cumsum(np.bincount(rank)) if len(rank) else []
+        start = 0
+        for stop in bounds:
+            rows = order[start:stop]
+            at, value = positions[rows], values[rows]
+            y = value - compensation[at]
+            t = total[at] + y
+            c = t - total[at] - y
+            c[np.isnan(c)] = 0
+            compensation[at] = c
+            total[at] = t
+            start = stop
+
+    def _new_transaction_counts(self, chunk, keys, positions):
+        has_id = chunk['TRANSACTION_ODU_ID'].notna().to_numpy()
+        ids = pd.DataFrame({'key': keys[has_id], 'id': chunk['TRANSACTION_ODU_ID'].to_numpy()[has_id]})
+        hashes = pd.util.hash_pandas_object(ids, index=False).to_numpy()
+
+        # One row per distinct transaction in this chunk ...
+        hashes, first = np.unique(hashes, return_index=True)
+        # ... that was not already counted in an earlier chunk
+        is_new = self._seen.lookup(hashes) < 0
+        self._seen.add(hashes[is_new])
+        np.add.at(self._txn_count, positions[has_id][first[is_new]], 1)
+
+    def update(self, chunk):
+        """Folds one chunk of transactions (with a TXN_DATE column) into the running aggregates."""
+        # groupby drops rows with a missing key, so do the same here
+        chunk = chunk.dropna(subset=GROUP_KEYS)
+        if self._key_dtypes is None:
+            self._key_dtypes = {'PATIENT_ODU_ID': chunk['PATIENT_ODU_ID'].dtype}
+        keys = patient_day_keys(self._patient_codes(chunk['PATIENT_ODU_ID']), chunk['TXN_DATE'])
+        positions = self._group_positions(keys)
+
+        for name, column in self.SUM_COLUMNS.items():
+            values = chunk[column]
+            self._integer[name] &= pd.api.types.is_integer_dtype(values.dtype)
+            self._kahan_sum(name, positions, values.to_numpy(dtype=np.float64, na_value=np.nan))
+
+        for name, column in self.MAX_COLUMNS.items():
+            values = chunk[column]
+            valid = values.notna().to_numpy()
+            np.maximum.at(self._flags[name], positions[valid], values[valid].to_numpy(dtype=np.int8))
+
+        self._new_transaction_counts(chunk, keys, positions)
+
+    def result(self):
+        size = self._size
+        agg_txn = split_patient_day_keys(self._slot_keys[:size], self._patients if size else [])
+        if self._key_dtypes is not None:
+            agg_txn = agg_txn.astype(self._key_dtypes)
+        for name in self.SUM_COLUMNS:
+            total = self._sums[name][:size]
+            agg_txn[name] = total.astype(np.int64) if self._integer[name] and size else total
+        for name in self.MAX_COLUMNS:
+            agg_txn[name] = self._flags[name][:size] == 1
+        agg_txn['txn_count'] = self._txn_count[:size]
+        return agg_txn.sort_values(GROUP_KEYS, ignore_index=True)
+
+
+def aggregate_transaction_chunks(chunks, date_column='REPORTING_DATE'):
+    """
+    Aggregates an iterable of transaction DataFrames (e.g. a pd.read_csv
+    reader opened with chunksize=...) per patient-day.
+    """
+    aggregator = TransactionAggregator()
+    for chunk in chunks:
+        chunk['TXN_DATE'] = to_day(chunk[date_column])
+        aggregator.update(chunk)
+    return aggregator.result()